@@ -0,0 +1,403 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Archetype clustering for portfolio studies: only a few representative buildings are analysed in full, the
+# others get the capacity curve of their representative, scaled to their own height and weight.
+#
+# 1. features: every building is imported (no script written) and described by storeys, plan dimensions, bay counts,
+#    weight, column section and tau factor (see get_features)
+# 2. cluster: the standardised features are clustered with k-means++ (within each typology folder); the member closest
+#    to the centroid of every cluster is its representative, and the member farthest from it is analysed as well
+#    (validation) to calibrate the error of the transfer
+# 3. main.py generates the buildings of the plan only (see archetype_plan in main.py), opensees runs them
+# 4. transfer: the capacity curve of every representative is transferred to the other members of its cluster as
+#    drift (displacement / height) vs base shear coefficient (base shear / weight); the error estimate of a member
+#    is its feature distance to the representative times the error per unit distance measured on the validation
+#    buildings (see calibrate_error)
+#
+# usage: python archetypes.py features buildings_folder features.jsonl
+#        python archetypes.py cluster features.jsonl plan.json [buildings_per_cluster]
+#        python archetypes.py transfer plan.json features.jsonl results_folder case_name output_folder [binary]
+#        (binary: the recorders of the analysed buildings were written with recorder_options binary True)
+#
+# features and clustering are plain python (IronPython too), the capacity curves need numpy
+
+import os
+import sys
+import json
+import math
+import random
+import logging
+
+import model_builder as mb
+import archive_inputs as ai
+import write_tcl_source as w
+
+try:
+    import numpy as np
+    import recorder_reader as rr
+except ImportError:
+    np = None # IronPython: no capacity curve transfer
+    rr = None
+
+
+logger = logging.getLogger(__name__)
+
+
+feature_names = ["storeys", "x_dim", "y_dim", "x_bays", "y_bays", "weight", "column_size", "tau_factor"]
+
+
+def get_bay_count(coords, tolerance = 0.01):
+    # distinct column lines (coordinates closer than tolerance are the same line) minus one
+    
+    lines = []
+    
+    for coord in sorted(coords):
+        if len(lines) == 0 or coord - lines[-1] > tolerance:
+            lines.append(coord)
+    
+    return max(len(lines) - 1, 0)
+
+
+def get_features(model, typology = None):
+    # json serialisable features of a model of model_builder.build_model
+    
+    summary = w.get_analysis_summary(model.nodes_dict, model.diaphragms)
+    
+    basal_nodes = [model.nodes_dict[str(node_id)] for node_id in summary["basal_node_ids"]]
+    
+    sections_scheme = model.config["sections_scheme"]
+    
+    if sections_scheme is None:
+        sections_scheme = mb.get_sections_scheme(model.max_storeys)
+    
+    return {"building_id": model.building_id,
+            "typology": typology,
+            "storeys": model.max_storeys,
+            "x_dim": max([storey["x_dim"] for storey in summary["storeys"]]),
+            "y_dim": max([storey["y_dim"] for storey in summary["storeys"]]),
+            "x_bays": get_bay_count([node.coords[0] for node in basal_nodes]),
+            "y_bays": get_bay_count([node.coords[1] for node in basal_nodes]),
+            "weight": sum([storey["weight"] for storey in summary["storeys"]]),
+            "column_size": sections_scheme["column"][0],
+            "tau_factor": model.tau_factor,
+            "height": summary["max_height"],
+            "num_basal_nodes": len(basal_nodes)}
+
+
+def get_building_features(import_json_obj, building_id, typology = None, cache = None):
+    # features of a building (imported only, no script written)
+    
+    model = mb.build_model(import_json_obj, {"dir": 'X'}, building_id, cache)
+    
+    return get_features(model, typology)
+
+
+def extract_features(base_folder, cache = None):
+    # features of every building of base_folder (folder or archive, see archive_inputs.iter_inputs)
+    
+    if cache is None:
+        cache = dict()
+    
+    features = []
+    
+    for typology, import_fname, import_json_obj in ai.iter_inputs(base_folder):
+        if import_json_obj is None:
+            import_file = open(import_fname)
+            import_json_obj = json.load(import_file)
+            import_file.close()
+        
+        building_features = get_building_features(import_json_obj, ai.get_building_id(import_fname), typology, cache)
+        building_features["import_fname"] = import_fname # as listed in an input_list of main.py
+        features.append(building_features)
+    
+    return features
+
+
+def standardise(features):
+    # feature vectors (feature_names) scaled to zero mean and unit standard deviation
+    
+    vectors = [[float(building[name]) for name in feature_names] for building in features]
+    
+    for j in range(len(feature_names)):
+        column = [vector[j] for vector in vectors]
+        mean = sum(column) / len(column)
+        std = math.sqrt(sum([(value - mean) ** 2 for value in column]) / len(column))
+        
+        for vector in vectors:
+            vector[j] = (vector[j] - mean) / std if std > 0 else 0.0
+    
+    return vectors
+
+
+def get_distance(a, b):
+    
+    return math.sqrt(sum([(a[j] - b[j]) ** 2 for j in range(len(a))]))
+
+
+def get_centroid(vectors):
+    
+    return [sum([vector[j] for vector in vectors]) / len(vectors) for j in range(len(vectors[0]))]
+
+
+def kmeans_plus_plus(vectors, num_clusters, rnd):
+    # initial centroids: the first at random, then each with probability proportional to its squared distance
+    # to the closest centroid already chosen
+    
+    centroids = [list(rnd.choice(vectors))]
+    
+    while len(centroids) < num_clusters:
+        weights = [min([get_distance(vector, centroid) for centroid in centroids]) ** 2 for vector in vectors]
+        total = sum(weights)
+        
+        if total == 0:
+            break # fewer distinct buildings than clusters
+        
+        threshold = rnd.random() * total
+        cumulative = 0.0
+        
+        for vector, weight in zip(vectors, weights):
+            cumulative += weight
+            
+            if cumulative >= threshold:
+                centroids.append(list(vector))
+                break
+    
+    return centroids
+
+
+def kmeans(vectors, num_clusters, num_init = 5, max_iterations = 100, seed = 1):
+    # (labels, centroids, inertia) of the best of num_init k-means++ runs
+    
+    rnd = random.Random(seed)
+    best = None
+    
+    for run in range(num_init):
+        centroids = kmeans_plus_plus(vectors, num_clusters, rnd)
+        labels = None
+        
+        for iteration in range(max_iterations):
+            new_labels = [min(range(len(centroids)), key = lambda k: get_distance(vector, centroids[k])) for vector in vectors]
+            
+            if new_labels == labels:
+                break
+            
+            labels = new_labels
+            
+            for k in range(len(centroids)):
+                members = [vectors[i] for i in range(len(vectors)) if labels[i] == k]
+                
+                if len(members) > 0:
+                    centroids[k] = get_centroid(members)
+        
+        inertia = sum([get_distance(vectors[i], centroids[labels[i]]) ** 2 for i in range(len(vectors))])
+        
+        if best is None or inertia < best[2]:
+            best = (labels, centroids, inertia)
+    
+    return best
+
+
+def cluster_buildings(features, buildings_per_cluster = 10, by_typology = True, seed = 1):
+    # plan: {"clusters": [{"id", "typology", "representative", "validation", "members": [{"building_id", "distance"}]}],
+    #        "analyse": [building ids run in full]}
+    # about one cluster per buildings_per_cluster buildings; distances are in the standardised feature space
+    
+    vectors = standardise(features)
+    
+    groups = dict()
+    
+    for i, building in enumerate(features):
+        groups.setdefault(building["typology"] if by_typology else None, []).append(i)
+    
+    clusters = []
+    
+    for typology in sorted(groups.keys(), key = str):
+        indices = groups[typology]
+        num_clusters = max(1, int(round(len(indices) / float(buildings_per_cluster))))
+        
+        labels, centroids, inertia = kmeans([vectors[i] for i in indices], num_clusters, seed = seed)
+        
+        for k in range(len(centroids)):
+            member_indices = [indices[m] for m in range(len(indices)) if labels[m] == k]
+            
+            if len(member_indices) == 0:
+                continue
+            
+            representative = min(member_indices, key = lambda i: get_distance(vectors[i], centroids[k]))
+            
+            members = [{"building_id": features[i]["building_id"], "distance": round(get_distance(vectors[i], vectors[representative]), 4)} for i in member_indices]
+            members.sort(key = lambda member: member["distance"])
+            
+            validation = None
+            
+            if len(members) >= 3:
+                validation = members[-1]["building_id"]
+            
+            clusters.append({"id": len(clusters) + 1,
+                             "typology": typology,
+                             "representative": features[representative]["building_id"],
+                             "validation": validation,
+                             "members": members})
+    
+    analyse = []
+    
+    for cluster in clusters:
+        analyse.append(cluster["representative"])
+        
+        if cluster["validation"] is not None:
+            analyse.append(cluster["validation"])
+    
+    return {"clusters": clusters, "analyse": analyse, "buildings": len(features)}
+
+
+def transfer_capacity_curve(curve, features, reference_features):
+    # capacity curve of the reference building scaled to the building: same drift and base shear coefficient
+    
+    displacement, base_shear = curve
+    
+    return (displacement * (features["height"] / reference_features["height"]),
+            base_shear * (features["weight"] / reference_features["weight"]))
+
+
+def calibrate_error(plan, features_by_id, load_curve):
+    # relative error of the transfer per unit of feature distance, least squares through the origin over the
+    # validation buildings (mean relative error of the transferred vs the analysed curve); None without validations
+    
+    sum_ed = 0.0
+    sum_dd = 0.0
+    samples = 0
+    
+    for cluster in plan["clusters"]:
+        if cluster["validation"] is None:
+            continue
+        
+        distance = [member["distance"] for member in cluster["members"] if member["building_id"] == cluster["validation"]][0]
+        
+        if distance == 0:
+            continue
+        
+        reference_curve = load_curve(cluster["representative"])
+        validation_curve = load_curve(cluster["validation"])
+        
+        transferred = transfer_capacity_curve(reference_curve, features_by_id[cluster["validation"]], features_by_id[cluster["representative"]])
+        error = rr.get_capacity_curve_error(transferred, validation_curve)["mean_relative_error"]
+        
+        sum_ed += error * distance
+        sum_dd += distance * distance
+        samples += 1
+    
+    if samples == 0:
+        return None, 0
+    
+    return sum_ed / sum_dd, samples
+
+
+def transfer_plan(plan, features, results_folder, case_name, output_folder, binary = False):
+    # writes <building_id>_<case_name>_capacity.csv (displacement,base_shear) for the buildings not analysed and
+    # returns one summary per building: representative, distance, estimated mean relative error
+    
+    if np is None:
+        raise ImportError("numpy is needed to transfer capacity curves")
+    
+    if not os.path.isdir(output_folder):
+        os.makedirs(output_folder)
+    
+    features_by_id = dict([(building["building_id"], building) for building in features])
+    
+    def load_curve(building_id):
+        building = features_by_id[building_id]
+        return rr.load_capacity_curve(results_folder, building_id, case_name, building["storeys"], building["num_basal_nodes"], binary)
+    
+    error_per_distance, samples = calibrate_error(plan, features_by_id, load_curve)
+    
+    analysed = set(plan["analyse"])
+    summaries = []
+    
+    for cluster in plan["clusters"]:
+        reference_curve = load_curve(cluster["representative"])
+        
+        for member in cluster["members"]:
+            building_id = member["building_id"]
+            
+            summary = {"building_id": building_id,
+                       "cluster": cluster["id"],
+                       "representative": cluster["representative"],
+                       "distance": member["distance"],
+                       "analysed": building_id in analysed,
+                       "estimated_error": None,
+                       "calibration_samples": samples}
+            
+            if building_id not in analysed:
+                displacement, base_shear = transfer_capacity_curve(reference_curve, features_by_id[building_id], features_by_id[cluster["representative"]])
+                
+                outf = open(output_folder + building_id + '_' + case_name + "_capacity.csv", 'w')
+                outf.write("displacement,base_shear" + '\n')
+                
+                for i in range(len(displacement)):
+                    outf.write(repr(float(displacement[i])) + ',' + repr(float(base_shear[i])) + '\n')
+                
+                outf.close()
+                
+                if error_per_distance is not None:
+                    summary["estimated_error"] = round(error_per_distance * member["distance"], 4)
+            
+            summaries.append(summary)
+    
+    return summaries
+
+
+def write_jsonl(fname, rows):
+    
+    outf = open(fname, 'w')
+    
+    for row in rows:
+        outf.write(json.dumps(row, sort_keys = True) + '\n')
+    
+    outf.close()
+
+
+def load_jsonl(fname):
+    
+    inf = open(fname)
+    rows = [json.loads(line) for line in inf if line.strip()]
+    inf.close()
+    
+    return rows
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) == 4 and sys.argv[1] == "features":
+        features = extract_features(sys.argv[2])
+        write_jsonl(sys.argv[3], features)
+        print(str(len(features)) + " buildings")
+    
+    elif len(sys.argv) in (4, 5) and sys.argv[1] == "cluster":
+        features = load_jsonl(sys.argv[2])
+        plan = cluster_buildings(features, int(sys.argv[4]) if len(sys.argv) == 5 else 10)
+        
+        outf = open(sys.argv[3], 'w')
+        json.dump(plan, outf, indent = 4)
+        outf.close()
+        
+        print(str(len(plan["clusters"])) + " clusters, " + str(len(plan["analyse"])) + " of " + str(plan["buildings"]) + " buildings analysed in full")
+    
+    elif len(sys.argv) in (7, 8) and sys.argv[1] == "transfer" and sys.argv[7:] in ([], ["binary"]):
+        inf = open(sys.argv[2])
+        plan = json.load(inf)
+        inf.close()
+        
+        output_folder = sys.argv[6] if sys.argv[6].endswith('/') else sys.argv[6] + '/'
+        
+        summaries = transfer_plan(plan, load_jsonl(sys.argv[3]), sys.argv[4], sys.argv[5], output_folder, len(sys.argv) == 8)
+        write_jsonl(output_folder + "transfer_summary.jsonl", summaries)
+        
+        print(str(len([s for s in summaries if not s["analysed"]])) + " capacity curves transferred")
+    
+    else:
+        print("usage: python archetypes.py features buildings_folder features.jsonl")
+        print("       python archetypes.py cluster features.jsonl plan.json [buildings_per_cluster]")
+        print("       python archetypes.py transfer plan.json features.jsonl results_folder case_name output_folder [binary]")
+        sys.exit(1)
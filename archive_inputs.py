@@ -0,0 +1,145 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Building inputs read straight from the archives delivered upstream (zip, tar, tar.gz / tgz, tar.bz2),
+# member by member, without extracting them: every <building_id>_structure.json member is parsed in memory
+# and handed to the import (see main.run_building, import_json_obj). tar archives are read as a stream
+# (no seeking), so compressed tars are decompressed only once, sequentially.
+#
+# The typology is the folder of the member, like the folders of building_structure_results:
+# building_structure_results/H-type/0605018TG4400N_181160562_structure.json --> H-type
+# (members at the root of an archive get the name of the archive, e.g. H-type.zip --> H-type)
+#
+# for typology, import_fname, import_json_obj in iter_inputs("building_structure_results.tar.gz"):
+#     ...
+#
+# iter_inputs also takes a folder: its typology folders are listed as before (import_json_obj is None, the file
+# is read by run_building) and the archives inside it are read member by member
+
+import os
+import json
+import zipfile
+import tarfile
+
+
+structure_suffix = "_structure.json"
+
+archive_extensions = [".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2"]
+
+
+def is_archive(fname):
+    
+    for extension in archive_extensions:
+        if fname.lower().endswith(extension):
+            return True
+    
+    return False
+
+
+def get_archive_name(fname):
+    # file name without folders and archive extension
+    
+    name = os.path.basename(fname)
+    
+    for extension in archive_extensions:
+        if name.lower().endswith(extension):
+            return name[:-len(extension)]
+    
+    return name
+
+
+def get_typology(member_name, default_typology = None):
+    # folder containing the member (the last one), default_typology for members at the root
+    
+    parts = [part for part in member_name.replace('\\', '/').split('/') if part]
+    
+    if len(parts) < 2:
+        return default_typology
+    
+    return parts[-2]
+
+
+def get_building_id(import_fname):
+    # building_structure_results/H-type/0605018TG4400N_181160562_structure.json --> 0605018TG4400N_181160562
+    
+    return import_fname.replace('\\', '/').split('/')[-1].split(structure_suffix)[0]
+
+
+def parse_member(data):
+    
+    return json.loads(data.decode("utf-8"))
+
+
+def iter_zip(archive_fname):
+    # (typology, member name, import_json_obj) of the zip members, in archive order
+    
+    default_typology = get_archive_name(archive_fname)
+    
+    archive = zipfile.ZipFile(archive_fname)
+    
+    try:
+        for info in archive.infolist():
+            if not info.filename.endswith(structure_suffix):
+                continue
+            
+            member = archive.open(info)
+            import_json_obj = parse_member(member.read())
+            member.close()
+            
+            yield get_typology(info.filename, default_typology), info.filename, import_json_obj
+    
+    finally:
+        archive.close()
+
+
+def iter_tar(archive_fname):
+    # (typology, member name, import_json_obj) of the tar members, read as a stream (any compression)
+    
+    default_typology = get_archive_name(archive_fname)
+    
+    archive = tarfile.open(archive_fname, "r|*")
+    
+    try:
+        for info in archive:
+            if not info.isfile() or not info.name.endswith(structure_suffix):
+                continue
+            
+            member = archive.extractfile(info)
+            import_json_obj = parse_member(member.read())
+            member.close()
+            
+            yield get_typology(info.name, default_typology), info.name, import_json_obj
+    
+    finally:
+        archive.close()
+
+
+def iter_archive(archive_fname):
+    
+    if archive_fname.lower().endswith(".zip"):
+        return iter_zip(archive_fname)
+    
+    return iter_tar(archive_fname)
+
+
+def iter_inputs(base):
+    # (typology, import_fname, import_json_obj) of every building of base: an archive or a folder of typology
+    # folders and / or archives; import_json_obj is None for plain files (read by run_building)
+    
+    if not os.path.isdir(base):
+        for building in iter_archive(base):
+            yield building
+        
+        return
+    
+    for fold_name in os.listdir(base):
+        path = base + '/' + fold_name
+        
+        if os.path.isdir(path):
+            for fname in os.listdir(path):
+                yield fold_name, path + '/' + fname, None
+        
+        elif is_archive(fold_name):
+            for building in iter_archive(path):
+                yield building
@@ -0,0 +1,405 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Pipeline mode of the batch (see main.py, pipeline settings): reader threads parse the building jsons,
+# compute workers build the models and emit the scripts in memory, writer threads write the scripts,
+# tau factors and metrics. Stages are joined by bounded queues: a full queue blocks the stage feeding it
+# (backpressure), so a slow writer cannot pile up scripts in memory.
+#
+# Every stage reports its utilisation (time busy / time of its threads), the time its threads waited for
+# input (starved) and for room in the next queue (blocked): the busiest stage is the bottleneck.
+# Note that CPython threads only overlap the I/O (the computation holds the GIL), while IronPython threads
+# also run the compute workers in parallel.
+#
+# A building failing in any stage is handed to the on_failure callback of the pipeline and the stage goes on with
+# the next item: run_batch_pipeline quarantines it and records it in the checkpoint (see checkpoint.py), as it
+# records every building once all its scripts are written.
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+try:
+    import Queue as queue # python 2 / IronPython
+except ImportError:
+    import queue
+
+import model_builder as mb
+import metrics as mt
+import archive_inputs as ai
+
+
+logger = logging.getLogger(__name__)
+
+
+end_of_stream = None # put into a queue once per thread of the next stage when a stage is done
+
+
+class PipelineStage:
+    def __init__(self, name, function, num_threads = 1, on_failure = None):
+        self.name = name
+        self.function = function # item --> list of items for the next stage
+        self.num_threads = num_threads
+        self.on_failure = on_failure # (stage name, item, error, traceback) called when the function raises
+        self.input_queue = None
+        self.source = None # iterator feeding the first stage (read by its threads under a lock)
+        self.next_stage = None
+        self.lock = threading.Lock()
+        self.running = 0 # threads not finished yet
+        self.items = 0
+        self.failures = []
+        self.busy_time = 0.0
+        self.wait_input_time = 0.0
+        self.wait_output_time = 0.0
+    
+    
+    def get_item(self):
+        # (item, seconds busy, seconds waiting)
+        
+        start = time.time()
+        
+        if self.source is not None:
+            with self.lock:
+                item = next(self.source, end_of_stream)
+            
+            return item, time.time() - start, 0.0 # reading the source is the work of the first stage
+        
+        item = self.input_queue.get()
+        
+        return item, 0.0, time.time() - start
+    
+    
+    def work(self):
+        
+        busy_time = 0.0
+        wait_input_time = 0.0
+        wait_output_time = 0.0
+        items = 0
+        
+        try:
+            while True:
+                item, busy, wait = self.get_item()
+                busy_time += busy
+                wait_input_time += wait
+                
+                if item is end_of_stream:
+                    break
+                
+                start = time.time()
+                
+                try:
+                    outputs = self.function(item)
+                except Exception as error: # errors.SimrisError on bad input, the other items go on
+                    error_traceback = sys.exc_info()[2]
+                    
+                    with self.lock:
+                        self.failures.append((str(item)[:200], repr(error)))
+                    
+                    if self.on_failure is None:
+                        logger.exception(self.name + " failed")
+                    
+                    else:
+                        try:
+                            self.on_failure(self.name, item, error, error_traceback)
+                        except Exception:
+                            logger.exception(self.name + " failure handling failed")
+                    
+                    outputs = []
+                
+                busy_time += time.time() - start
+                items += 1
+                
+                if self.next_stage is not None:
+                    start = time.time()
+                    
+                    for output in outputs:
+                        self.next_stage.input_queue.put(output)
+                    
+                    wait_output_time += time.time() - start
+        
+        finally:
+            with self.lock:
+                self.busy_time += busy_time
+                self.wait_input_time += wait_input_time
+                self.wait_output_time += wait_output_time
+                self.items += items
+                self.running -= 1
+                last_thread = self.running == 0
+            
+            # the last thread of the stage ends the stream of the next stage
+            if last_thread and self.next_stage is not None:
+                for i in range(self.next_stage.num_threads):
+                    self.next_stage.input_queue.put(end_of_stream)
+
+
+class Pipeline:
+    def __init__(self, queue_size = 16, on_failure = None):
+        self.queue_size = queue_size # items waiting between two stages
+        self.on_failure = on_failure # given to every stage
+        self.stages = []
+        self.wall_time = None
+    
+    
+    def add_stage(self, name, function, num_threads = 1):
+        
+        stage = PipelineStage(name, function, num_threads, self.on_failure)
+        
+        if len(self.stages) > 0:
+            self.stages[-1].next_stage = stage
+            stage.input_queue = queue.Queue(self.queue_size)
+        
+        self.stages.append(stage)
+        
+        return stage
+    
+    
+    def run(self, items):
+        # runs items (any iterable) through the stages, returns when everything has been processed
+        
+        self.stages[0].source = iter(items)
+        
+        threads = []
+        
+        for stage in self.stages:
+            stage.running = stage.num_threads
+            
+            for i in range(stage.num_threads):
+                thread = threading.Thread(target = stage.work, name = stage.name + '_' + str(i + 1))
+                thread.daemon = True
+                threads.append(thread)
+        
+        start = time.time()
+        
+        for thread in threads:
+            thread.start()
+        
+        for thread in threads:
+            thread.join()
+        
+        self.wall_time = time.time() - start
+    
+    
+    def get_utilisation(self):
+        # {stage name: {"threads", "items", "failures", "utilisation", "starved", "blocked"}}, fractions of the thread time
+        
+        report = dict()
+        
+        for stage in self.stages:
+            thread_time = max(stage.num_threads * self.wall_time, 1e-9)
+            
+            report[stage.name] = {"threads": stage.num_threads,
+                                  "items": stage.items,
+                                  "failures": len(stage.failures),
+                                  "utilisation": round(stage.busy_time / thread_time, 3),
+                                  "starved": round(stage.wait_input_time / thread_time, 3),
+                                  "blocked": round(stage.wait_output_time / thread_time, 3)}
+        
+        return report
+    
+    
+    def get_bottleneck(self):
+        
+        report = self.get_utilisation()
+        
+        return max(report.keys(), key = lambda name: report[name]["utilisation"])
+
+
+def format_utilisation(pipeline):
+    
+    report = pipeline.get_utilisation()
+    
+    lines = ["stage".ljust(10) + "threads".rjust(8) + "items".rjust(8) + "failed".rjust(8) + "busy %".rjust(8) + "starved %".rjust(11) + "blocked %".rjust(11)]
+    
+    for stage in pipeline.stages:
+        row = report[stage.name]
+        lines.append(stage.name.ljust(10) +
+                     str(row["threads"]).rjust(8) +
+                     str(row["items"]).rjust(8) +
+                     str(row["failures"]).rjust(8) +
+                     ('%.1f' % (100.0 * row["utilisation"])).rjust(8) +
+                     ('%.1f' % (100.0 * row["starved"])).rjust(11) +
+                     ('%.1f' % (100.0 * row["blocked"])).rjust(11))
+    
+    lines.append("wall time: " + ('%.2f' % pipeline.wall_time) + " s, bottleneck: " + pipeline.get_bottleneck())
+    
+    return '\n'.join(lines)
+
+
+def run_batch_pipeline(inputs,
+                       get_config,
+                       cases,
+                       tau_file,
+                       metrics_file = None,
+                       output_folder = "test-bed/bin/tcl_files/",
+                       backend = "tcl",
+                       archive = None,
+                       num_readers = 1,
+                       num_workers = 2,
+                       num_writers = 1,
+                       queue_size = 16,
+                       checkpoint = None,
+                       quarantine = None):
+    
+    # inputs: (typology, import_fname, import_json_obj) of archive_inputs.iter_inputs
+    # get_config: (dir, load_cases) --> config of model_builder.build_model (main.get_run_config)
+    # cases: [(dir, load_cases)] run for every building, e.g. [('X', None), ('Y', None)]
+    # archive: script_archive.ScriptArchive receiving the scripts instead of output_folder
+    # checkpoint: checkpoint.Checkpoint, the buildings already done are skipped and the finished ones recorded
+    # quarantine: checkpoint.Quarantine receiving the failing buildings
+    # returns (script file names, pipeline), scripts in order of completion
+    
+    model_cache = dict() # shared by the compute workers
+    output_lock = threading.Lock() # tau / metrics files and archive are shared by the writers
+    script_fnames = []
+    
+    if checkpoint is not None:
+        inputs = (building for building in inputs if not checkpoint.is_done(building[1]))
+    
+    def read(building):
+        typology, import_fname, import_json_obj = building
+        
+        if import_json_obj is None:
+            import_file = open(import_fname)
+            import_json_obj = json.load(import_file)
+            import_file.close()
+        
+        return [{"typology": typology,
+                 "import_fname": import_fname,
+                 "building_id": ai.get_building_id(import_fname),
+                 "import_json_obj": import_json_obj}]
+    
+    def compute(building):
+        typology = building["typology"]
+        building_id = building["building_id"]
+        import_json_obj = building["import_json_obj"]
+        
+        outputs = []
+        
+        for dir, load_cases in cases:
+            metrics = mt.Metrics(building_id, dir)
+            metrics.typology = typology
+            
+            # the metrics of an output are closed by write_output, the others here whether the case fails or not
+            try:
+                model = mb.build_model(import_json_obj, get_config(dir, load_cases), building_id, model_cache, metrics)
+            
+                if model.triage is not None and model.triage["skip"] and model.config["triage"].get("skip_flagged"):
+                    metrics.close()
+                    continue # no detailed analysis needed (see triage.py)
+            
+                with metrics.stage("emit"):
+                    text = mb.emit_to_string(model, backend = backend)
+            
+                metrics.update_counters(mb.get_model_counters(model))
+            
+            except BaseException:
+                metrics.close()
+                raise
+            
+            outputs.append({"building_id": building_id,
+                            "case": mb.get_case_name(model),
+                            "script_fname": mb.get_script_fname(model, backend = backend),
+                            "text": text,
+                            "tau_line": mb.get_tau_line(model),
+                            "metrics": metrics})
+        
+        # the cases of a building are written together: it is done (checkpoint) once all of them are
+        return [{"typology": typology,
+                 "import_fname": building["import_fname"],
+                 "building_id": building_id,
+                 "outputs": outputs}]
+    
+    def write_output(output):
+        metrics = output["metrics"]
+        
+        try:
+            with metrics.stage("write"):
+                if archive is None:
+                    outf = open(output_folder + output["script_fname"], 'w')
+                    outf.write(output["text"])
+                    outf.close()
+                
+                    bytes_written = mt.get_file_bytes(output_folder + output["script_fname"])
+            
+                else:
+                    with output_lock:
+                        bytes_written = archive.add(output["building_id"], output["case"], output["text"])
+        
+            metrics.count("bytes_written", bytes_written)
+        
+        finally:
+            metrics.close()
+        
+    def remove_outputs(outputs):
+        # scripts of a building failing half way (e.g. the X case written, the Y one failed): none left behind
+        
+        for output in outputs:
+            if archive is None:
+                if os.path.isfile(output_folder + output["script_fname"]):
+                    os.remove(output_folder + output["script_fname"])
+            
+            else:
+                with output_lock:
+                    archive.remove(output["building_id"], output["case"])
+    
+    def write(building):
+        
+        written_outputs = [] # before they are written: a script cut short is removed too
+        
+        try:
+            for output in building["outputs"]:
+                written_outputs.append(output)
+                write_output(output)
+        
+        except BaseException:
+            remove_outputs(written_outputs)
+            raise
+        
+        with output_lock:
+            for output in building["outputs"]:
+                tau_file.write(output["tau_line"] + '\n')
+                
+                if metrics_file is not None:
+                    output["metrics"].write(metrics_file)
+                
+                script_fnames.append(output["script_fname"])
+            
+            tau_file.flush()
+            
+            if metrics_file is not None:
+                metrics_file.flush()
+            
+            if checkpoint is not None:
+                checkpoint.done(building["import_fname"], building["building_id"], [output["script_fname"] for output in building["outputs"]])
+        
+        return []
+    
+    def isolate(stage_name, building, error, error_traceback):
+        # quarantines the building failing in stage_name (building: item of the stage)
+        
+        if not isinstance(building, dict):
+            typology, import_fname, import_json_obj = building
+            building = {"typology": typology, "import_fname": import_fname, "building_id": ai.get_building_id(import_fname), "import_json_obj": import_json_obj}
+        
+        with output_lock:
+            if quarantine is not None:
+                quarantine.add(building["building_id"], building["import_fname"], building.get("import_json_obj"), error, error_traceback, stage_name, building["typology"])
+            
+            else:
+                logger.error(building["building_id"] + " failed in " + stage_name + ": " + repr(error))
+            
+            if checkpoint is not None:
+                checkpoint.quarantined(building["import_fname"], building["building_id"])
+    
+    pipeline = Pipeline(queue_size, isolate)
+    pipeline.add_stage("read", read, num_readers)
+    pipeline.add_stage("compute", compute, num_workers)
+    pipeline.add_stage("write", write, num_writers)
+    
+    pipeline.run(inputs)
+    
+    return script_fnames, pipeline
@@ -0,0 +1,154 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Stage-level benchmark of the generator on synthetic buildings (headless, no Rhino needed)
+# Each run_building stage (sections, import, network, diaphragms, masses, write) is timed across
+# a size sweep, the results are stored as json and compared against a previous (baseline) run
+#
+# usage: python benchmark.py [results.json] [baseline.json]
+
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+import model_builder as mb
+import metrics as mt
+import synthetic_building as sb
+
+
+# (storeys, bays, spans)
+default_sizes = [(2, 2, 2), (3, 4, 2), (4, 6, 3), (6, 8, 4), (8, 10, 5), (12, 12, 6)]
+
+stage_names = ["sections", "import", "network", "diaphragms", "masses", "write"]
+
+
+def run_stages(import_json_obj, building_id, dir, output_folder):
+    # the stages of model_builder.build_model and the file writing, each one timed (seconds)
+    
+    metrics = mt.Metrics(building_id, dir)
+    
+    model = mb.build_model(import_json_obj, {"dir": dir}, building_id, metrics = metrics)
+    
+    with metrics.stage("write"):
+        mb.write_model_file(model, output_folder)
+    
+    return metrics.timings
+
+
+def run_benchmark(sizes = None, repeats = 3):
+    # best of repeats for every stage and size
+    
+    if sizes is None:
+        sizes = default_sizes
+    
+    output_folder = tempfile.mkdtemp() + '/'
+    
+    results = []
+    
+    for storeys, bays, spans in sizes:
+        import_json_obj = sb.generate_building(storeys, bays, spans)
+        building_id = sb.get_building_id(storeys, bays, spans)
+        
+        best_timings = None
+        
+        for i in range(repeats):
+            timings = run_stages(import_json_obj, building_id, 'X', output_folder)
+            
+            if best_timings is None:
+                best_timings = timings
+            else:
+                for stage in stage_names:
+                    best_timings[stage] = min(best_timings[stage], timings[stage])
+        
+        results.append({"building_id": building_id,
+                        "storeys": storeys,
+                        "bays": bays,
+                        "spans": spans,
+                        "nodes": len(import_json_obj[0]),
+                        "elements": len(import_json_obj[1]),
+                        "timings": best_timings})
+    
+    shutil.rmtree(output_folder)
+    
+    return results
+
+
+def save_results(results, fname):
+    
+    outf = open(fname, 'w')
+    json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0], "results": results}, outf, indent = 1)
+    outf.close()
+
+
+def load_results(fname):
+    
+    inf = open(fname)
+    results = json.load(inf)["results"]
+    inf.close()
+    
+    return results
+
+
+def compare_results(results, baseline_results, tolerance = 0.25, min_time = 0.005):
+    # regressions: stages slower than the baseline by more than tolerance (relative),
+    # stages faster than min_time (seconds) are ignored (timer noise)
+    
+    baseline_by_id = dict()
+    
+    for res in baseline_results:
+        baseline_by_id[res["building_id"]] = res
+    
+    regressions = []
+    
+    for res in results:
+        if res["building_id"] not in baseline_by_id:
+            continue
+        
+        baseline_timings = baseline_by_id[res["building_id"]]["timings"]
+        
+        for stage in stage_names:
+            current_time = res["timings"][stage]
+            baseline_time = baseline_timings[stage]
+            
+            if current_time < min_time:
+                continue
+            
+            if current_time > baseline_time * (1 + tolerance):
+                regressions.append({"building_id": res["building_id"],
+                                    "stage": stage,
+                                    "baseline": baseline_time,
+                                    "current": current_time,
+                                    "ratio": round(current_time / max(baseline_time, 1e-9), 2)})
+    
+    return regressions
+
+
+def print_results(results):
+    
+    print("building_id".ljust(16) + "elements".rjust(9) + ''.join([stage.rjust(12) for stage in stage_names]))
+    
+    for res in results:
+        print(res["building_id"].ljust(16) +
+              str(res["elements"]).rjust(9) +
+              ''.join([('%.4f' % res["timings"][stage]).rjust(12) for stage in stage_names]))
+
+
+if __name__ == "__main__":
+    
+    results = run_benchmark()
+    print_results(results)
+    
+    results_fname = sys.argv[1] if len(sys.argv) > 1 else "benchmark_results.json"
+    save_results(results, results_fname)
+    
+    if len(sys.argv) > 2:
+        regressions = compare_results(results, load_results(sys.argv[2]))
+        
+        for reg in regressions:
+            print("regression: " + str(reg))
+        
+        if len(regressions) > 0:
+            sys.exit(1)
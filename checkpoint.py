@@ -0,0 +1,270 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Fault tolerance of the batch (see main.py and batch_pipeline.py):
+#
+# Checkpoint: a json line is appended to checkpoint.jsonl as soon as a building is finished (scripts, tau factors
+# and metrics written) or quarantined. A batch interrupted (crash, killed job, ctrl-c) and started again skips
+# those buildings and resumes at the first unfinished one; its tau factors and metrics are appended to the files
+# of the interrupted run, once the lines of the unfinished buildings are dropped from them (see keep_done_lines: a
+# run interrupted after the outputs of a building but before its checkpoint line would write them twice). When the
+# whole batch is done a last line marks the checkpoint complete, so the next batch starts from scratch.
+#
+# Quarantine: a building failing (bad input raises errors.SimrisError, anything else is a bug of the generator)
+# is not retried: a copy of its structure json and <building_id>_diagnostics.json (error, traceback, stage)
+# are written into the quarantine folder and the batch carries on with the next building.
+#
+# checkpoint = Checkpoint("test-bed/bin/results/checkpoint.jsonl")
+# quarantine = Quarantine("test-bed/bin/results/quarantine/")
+#
+# for typology, import_fname, import_json_obj in archive_inputs.iter_inputs(base_folder):
+#     if checkpoint.is_done(import_fname):
+#         continue
+#     try:
+#         ...
+#     except Exception as error:
+#         quarantine.add(building_id, import_fname, import_json_obj, error, sys.exc_info()[2], "build", typology)
+#         checkpoint.quarantined(import_fname, building_id)
+#     else:
+#         checkpoint.done(import_fname, building_id, script_fnames)
+#
+# checkpoint.complete()
+
+# resuming:
+# checkpoint.keep_done_lines("test-bed/bin/results/tau_factors.csv", get_tau_building_id)
+# checkpoint.keep_done_lines("test-bed/bin/results/metrics.jsonl", get_metrics_building_id)
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+import traceback
+
+import errors as er
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_tau_building_id(line):
+    # line of tau_factors.csv (see model_builder.get_tau_line)
+    
+    return line.split(',')[0] if ',' in line else None
+
+
+def get_metrics_building_id(line):
+    # json line of metrics.jsonl (see metrics.Metrics.write)
+    
+    try:
+        return json.loads(line).get("building_id")
+    except ValueError:
+        return None
+
+
+class Checkpoint:
+    def __init__(self, fname):
+        
+        self.fname = fname
+        self.records = dict() # import_fname --> last record of the building
+        self.order = [] # import_fnames in order of completion
+        self.lock = threading.Lock() # shared by the writer threads of the pipeline
+        
+        complete = False
+        last_line_cut = False
+        
+        if os.path.isfile(fname):
+            inf = open(fname)
+            
+            for line in inf:
+                last_line_cut = not line.endswith('\n')
+                
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # line cut by the interruption: the building is run again
+                
+                if record.get("complete"):
+                    complete = True
+                    continue
+                
+                if record["import_fname"] not in self.records:
+                    self.order.append(record["import_fname"])
+                
+                self.records[record["import_fname"]] = record
+            
+            inf.close()
+        
+        if complete:
+            # the last batch finished: start a new one
+            self.records = dict()
+            self.order = []
+            self.outf = open(fname, 'w')
+        
+        else:
+            self.outf = open(fname, 'a')
+            
+            if last_line_cut:
+                self.outf.write('\n')
+        
+        if self.resuming():
+            logger.warning("resuming the batch of " + fname + ": " + str(len(self.records)) + " buildings already done")
+    
+    
+    def resuming(self):
+        # True when buildings of an interrupted batch are skipped (outputs have to be appended, not overwritten)
+        
+        return len(self.records) > 0
+    
+    
+    def is_done(self, import_fname):
+        # finished or quarantined
+        
+        return import_fname in self.records
+    
+    
+    def write(self, record):
+        
+        with self.lock:
+            if record.get("import_fname") is not None and record["import_fname"] not in self.records:
+                self.order.append(record["import_fname"])
+            
+            if record.get("import_fname") is not None:
+                self.records[record["import_fname"]] = record
+            
+            self.outf.write(json.dumps(record, sort_keys = True) + '\n')
+            self.outf.flush()
+            os.fsync(self.outf.fileno()) # on disk before the next building starts
+    
+    
+    def done(self, import_fname, building_id, script_fnames):
+        
+        self.write({"import_fname": import_fname, "building_id": building_id, "status": "done", "script_fnames": list(script_fnames)})
+    
+    
+    def quarantined(self, import_fname, building_id):
+        
+        self.write({"import_fname": import_fname, "building_id": building_id, "status": "quarantined", "script_fnames": []})
+    
+    
+    def get_script_fnames(self):
+        # scripts of the finished buildings, this run and the interrupted ones (e.g. for the batch drivers)
+        
+        script_fnames = []
+        
+        for import_fname in self.order:
+            script_fnames += self.records[import_fname]["script_fnames"]
+        
+        return script_fnames
+    
+    
+    def keep_done_lines(self, fname, get_building_id):
+        # drops from an output file of the interrupted run (tau factors, metrics) the lines of the buildings not done,
+        # i.e. run again now, and a line cut by the interruption; get_building_id: line --> building_id or None
+        # returns the number of lines dropped
+        
+        if not os.path.isfile(fname):
+            return 0
+        
+        done_ids = set([record["building_id"] for record in self.records.values() if record["status"] == "done"])
+        
+        inf = open(fname)
+        lines = inf.readlines()
+        inf.close()
+        
+        kept_lines = [line for line in lines if line.endswith('\n') and get_building_id(line) in done_ids]
+        
+        if len(kept_lines) < len(lines):
+            # written under a temporary name first: an interruption now leaves the file as it was
+            temp_fname = fname + ".tmp"
+            
+            outf = open(temp_fname, 'w')
+            outf.writelines(kept_lines)
+            outf.close()
+            
+            os.remove(fname) # os.replace: python 3 only
+            os.rename(temp_fname, fname)
+            
+            logger.warning(str(len(lines) - len(kept_lines)) + " lines of unfinished buildings dropped from " + fname)
+        
+        return len(lines) - len(kept_lines)
+    
+    
+    def get_quarantined(self):
+        
+        return [self.records[import_fname]["building_id"] for import_fname in self.order if self.records[import_fname]["status"] == "quarantined"]
+    
+    
+    def complete(self):
+        
+        self.write({"complete": True, "buildings": len(self.records), "quarantined": len(self.get_quarantined())})
+    
+    
+    def close(self):
+        
+        self.outf.close()
+
+
+class Quarantine:
+    def __init__(self, folder):
+        
+        if not folder.endswith('/'):
+            folder += '/'
+        
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        
+        self.folder = folder
+    
+    
+    def add(self, building_id, import_fname, import_json_obj, error, error_traceback = None, stage = None, typology = None):
+        # error_traceback: sys.exc_info()[2] in the except block; returns the file name of the diagnostics
+        
+        input_fname = self.folder + building_id + "_structure.json"
+        
+        if import_json_obj is not None:
+            outf = open(input_fname, 'w')
+            json.dump(import_json_obj, outf)
+            outf.close()
+        
+        elif os.path.isfile(import_fname):
+            shutil.copyfile(import_fname, input_fname)
+        
+        else:
+            input_fname = None # not readable (e.g. corrupt archive member)
+        
+        location = None
+        traceback_lines = []
+        
+        if error_traceback is not None:
+            frames = traceback.extract_tb(error_traceback)
+            
+            if len(frames) > 0:
+                fname, line_number, function_name = frames[-1][:3]
+                location = os.path.basename(fname) + ':' + str(line_number) + ' ' + function_name
+            
+            traceback_lines = traceback.format_exception(type(error), error, error_traceback)
+        
+        diagnostics = {"building_id": building_id,
+                       "import_fname": import_fname,
+                       "typology": typology,
+                       "stage": stage,
+                       "error_type": type(error).__name__,
+                       "error": str(error),
+                       "input_error": isinstance(error, er.SimrisError), # False: bug of the generator
+                       "location": location,
+                       "traceback": ''.join(traceback_lines),
+                       "input_copy": input_fname,
+                       "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+        
+        diagnostics_fname = self.folder + building_id + "_diagnostics.json"
+        
+        outf = open(diagnostics_fname, 'w')
+        json.dump(diagnostics, outf, indent = 4, sort_keys = True)
+        outf.close()
+        
+        logger.error("quarantined " + building_id + " (" + str(stage) + "): " + type(error).__name__ + ": " + str(error))
+        
+        return diagnostics_fname
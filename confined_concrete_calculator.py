@@ -10,8 +10,14 @@ Created on Thu Feb 29 17:40:01 2024
 @author: jaime
 """
 
-import rhinoscriptsyntax as rs
+try:
+    import rhinoscriptsyntax as rs
+except ImportError:
+    rs = None # headless run (outside Rhino): drawing is not available
 import math as m
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def get_bar_area(diam_mm):
@@ -108,7 +114,7 @@ def confined_stress_ratio(section, draw = False):
     
     f_1, f_2 = calculate_lateral_confining_stress(section)
     
-    print("\nf_1: " + str(f_1) + ", f_2: " + str(f_2) + "\n")
+    logger.debug("f_1: " + str(f_1) + ", f_2: " + str(f_2))
     
     # f_2 is always > f_1
     
@@ -146,7 +152,7 @@ def confined_stress_ratio(section, draw = False):
     
     cs_ratio = x_ln_intersect * top_xaxis_factor
     
-    print("cs_ratio: " + str(cs_ratio) + "\n")
+    logger.debug("cs_ratio: " + str(cs_ratio))
     
     return cs_ratio
 
@@ -227,7 +233,7 @@ def calculate_deformation_hoop_failure(section_values):
         error = get_energy_error(ecu, step, section_values)
         # print("error: " + str(error))
     
-    print("found ecu: " + str(last_ecu) + ", after " + str(iter) + " iterations, error: " + str(last_error))
+    logger.debug("found ecu: " + str(last_ecu) + ", after " + str(iter) + " iterations, error: " + str(last_error))
     
     # we return last ecu because the current ecu is larger than the last
     return last_ecu
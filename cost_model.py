@@ -0,0 +1,447 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Cost model of the batch: predicts the generation time (this generator) and the opensees runtime of every
+# building from its size, learned by least squares from past runs:
+# - generation: total_time of the metrics (see metrics.py) against nodes, elements and storeys, which are known
+#   from the structure json before the model is built (see get_input_counters)
+# - opensees: elapsed seconds of the status logs written by the batch drivers (see write_tcl_source.write_batch_driver)
+#   against fibers, elements, dofs and storeys of the metrics
+#
+# The predictions balance the work: jobs are partitioned longest-processing-time first (the next longest job goes
+# to the least loaded chunk), so a few tall buildings do not leave the other cores idle at the end of the batch.
+# The opensees chunks are written as batch drivers plus a job array manifest (one driver per line, for xargs -P /
+# GNU parallel) and an sbatch template (slurm job array, one task per driver), see write_job_array.
+#
+# usage: python cost_model.py fit metrics.jsonl status_folder cost_model.json
+#        python cost_model.py split-inputs buildings_folder num_parts cost_model.json output_folder
+#        (balanced lists of building files, one per generator process, see input_list in main.py)
+
+import os
+import sys
+import json
+import heapq
+import logging
+
+import functions as f
+import metrics as mt
+import archive_inputs as ai
+import write_tcl_source as w
+
+
+logger = logging.getLogger(__name__)
+
+
+targets = ["generation", "opensees"]
+
+# counters used by each target (generation: only what the structure json gives before the model is built)
+default_features = {"generation": ["nodes", "elements", "storeys"],
+                    "opensees": ["fibers", "elements", "dofs", "storeys"]}
+
+# fallback cost of an unfitted target (no history yet): relative, proportional to the model size
+fallback_features = {"generation": "elements", "opensees": "fibers"}
+
+min_seconds = 0.001 # predictions are clamped to this (a linear fit can go negative for tiny buildings)
+
+
+def solve_linear_system(a, b):
+    # gaussian elimination with partial pivoting, a: n x n list of rows (copied)
+    
+    n = len(b)
+    a = [list(row) + [b[i]] for i, row in enumerate(a)]
+    
+    for col in range(n):
+        pivot = max(range(col, n), key = lambda i: abs(a[i][col]))
+        
+        if abs(a[pivot][col]) < 1e-12:
+            return None # singular: not enough distinct buildings
+        
+        a[col], a[pivot] = a[pivot], a[col]
+        
+        for i in range(col + 1, n):
+            factor = a[i][col] / a[col][col]
+            
+            for j in range(col, n + 1):
+                a[i][j] -= factor * a[col][j]
+    
+    x = [0.0] * n
+    
+    for i in range(n - 1, -1, -1):
+        x[i] = (a[i][n] - sum([a[i][j] * x[j] for j in range(i + 1, n)])) / a[i][i]
+    
+    return x
+
+
+def least_squares(x_rows, y, ridge = 1e-6):
+    # coefficients (intercept first) minimising |X b - y|^2 + ridge |b|^2 (the intercept is not penalised),
+    # the columns are scaled to [-1, 1] so the ridge and the pivoting see comparable magnitudes
+    
+    num_columns = len(x_rows[0])
+    scales = []
+    
+    for j in range(num_columns):
+        scale = max([abs(row[j]) for row in x_rows])
+        scales.append(scale if scale > 0 else 1.0)
+    
+    scaled_rows = [[1.0] + [row[j] / scales[j] for j in range(num_columns)] for row in x_rows]
+    
+    n = num_columns + 1
+    xtx = [[sum([row[i] * row[j] for row in scaled_rows]) + (ridge if i == j and i > 0 else 0.0) for j in range(n)] for i in range(n)]
+    xty = [sum([row[i] * y[k] for k, row in enumerate(scaled_rows)]) for i in range(n)]
+    
+    solution = solve_linear_system(xtx, xty)
+    
+    if solution is None:
+        return None
+    
+    return [solution[0]] + [solution[j + 1] / scales[j] for j in range(num_columns)]
+
+
+class CostModel:
+    def __init__(self, features = None, ridge = 1e-6):
+        self.features = features if features is not None else default_features
+        self.ridge = ridge
+        self.coefficients = dict() # target --> [intercept, one per feature]
+        self.stats = dict() # target --> {"samples", "r2", "mean_abs_error", "mean_rel_error"}
+    
+    
+    def is_fitted(self, target):
+        
+        return target in self.coefficients
+    
+    
+    def fit(self, rows, target):
+        # rows: {"counters": {...}, target: seconds} (see get_training_rows); returns the stats of the fit
+        
+        features = self.features[target]
+        samples = [row for row in rows if row.get(target) is not None]
+        
+        if len(samples) < len(features) + 1:
+            logger.warning("not enough samples to fit " + target + ": " + str(len(samples)))
+            return None
+        
+        x_rows = [[float(row["counters"].get(name, 0)) for name in features] for row in samples]
+        y = [float(row[target]) for row in samples]
+        
+        coefficients = least_squares(x_rows, y, self.ridge)
+        
+        if coefficients is None:
+            logger.warning("singular fit of " + target + " (buildings all of the same size?)")
+            return None
+        
+        self.coefficients[target] = coefficients
+        
+        predictions = [self.predict(row["counters"], target) for row in samples]
+        mean_y = sum(y) / len(y)
+        ss_res = sum([(y[k] - predictions[k]) ** 2 for k in range(len(y))])
+        ss_tot = sum([(value - mean_y) ** 2 for value in y])
+        
+        self.stats[target] = {"samples": len(samples),
+                              "r2": round(1.0 - ss_res / ss_tot, 4) if ss_tot > 0 else None,
+                              "mean_abs_error": round(sum([abs(y[k] - predictions[k]) for k in range(len(y))]) / len(y), 4),
+                              "mean_rel_error": round(sum([abs(y[k] - predictions[k]) / max(y[k], min_seconds) for k in range(len(y))]) / len(y), 4)}
+        
+        return self.stats[target]
+    
+    
+    def predict(self, counters, target):
+        # seconds, or a relative cost (fallback_features) when the target has no fit yet
+        
+        if not self.is_fitted(target):
+            return float(max(counters.get(fallback_features[target], 0), 1))
+        
+        coefficients = self.coefficients[target]
+        prediction = coefficients[0]
+        
+        for j, name in enumerate(self.features[target]):
+            prediction += coefficients[j + 1] * counters.get(name, 0)
+        
+        return max(prediction, min_seconds)
+    
+    
+    def to_dict(self):
+        
+        return {"features": self.features, "ridge": self.ridge, "coefficients": self.coefficients, "stats": self.stats}
+    
+    
+    def save(self, fname):
+        
+        outf = open(fname, 'w')
+        json.dump(self.to_dict(), outf, indent = 4, sort_keys = True)
+        outf.close()
+
+
+def load_cost_model(fname):
+    # an unfitted model (relative costs) if the file does not exist yet
+    
+    if fname is None or not os.path.isfile(fname):
+        return CostModel()
+    
+    inf = open(fname)
+    cost_model_dict = json.load(inf)
+    inf.close()
+    
+    cost_model = CostModel(cost_model_dict["features"], cost_model_dict["ridge"])
+    cost_model.coefficients = cost_model_dict["coefficients"]
+    cost_model.stats = cost_model_dict["stats"]
+    
+    return cost_model
+
+
+def get_metrics_script_fname(metrics_dict, extension = ".tcl"):
+    # script written for a metrics line (see model_builder.get_script_fname)
+    
+    return metrics_dict["building_id"] + '_' + (metrics_dict["dir"] if metrics_dict["dir"] is not None else "cases") + extension
+
+
+def get_input_counters(import_json_obj):
+    # counters of default_features["generation"] from the structure json (the diaphragm master nodes are added
+    # like in metrics.get_model_counters)
+    
+    storeys = f.get_storeys(import_json_obj)
+    
+    return {"nodes": len(import_json_obj[0]) + storeys, "elements": len(import_json_obj[1]), "storeys": storeys}
+
+
+def load_status_logs(status_folder):
+    # {script file name: elapsed seconds} of the status logs of the batch drivers (model_file,OK|FAILED,elapsed,error);
+    # only the successful runs (a failed one stops early, its time is not the cost of the script); a script run more
+    # than once keeps its last time
+    
+    elapsed = dict()
+    
+    if not os.path.isdir(status_folder):
+        return elapsed
+    
+    for fname in sorted(os.listdir(status_folder)):
+        if not fname.endswith(".log"):
+            continue
+        
+        inf = open(os.path.join(status_folder, fname))
+        
+        for line in inf:
+            fields = line.strip().split(',', 3)
+            
+            if len(fields) < 3 or fields[1] != "OK":
+                continue
+            
+            try:
+                elapsed[os.path.basename(fields[0])] = float(fields[2])
+            except ValueError:
+                continue
+        
+        inf.close()
+    
+    return elapsed
+
+
+def get_training_rows(metrics_list, elapsed):
+    # one row per metrics line: its counters, the generation time and the opensees time (None if not run)
+    
+    rows = []
+    
+    for metrics_dict in metrics_list:
+        rows.append({"counters": metrics_dict["counters"],
+                     "generation": metrics_dict["total_time"],
+                     "opensees": elapsed.get(get_metrics_script_fname(metrics_dict))})
+    
+    return rows
+
+
+def fit_cost_model(metrics_fname, status_folder, features = None):
+    
+    cost_model = CostModel(features)
+    rows = get_training_rows(mt.load_metrics(metrics_fname), load_status_logs(status_folder))
+    
+    for target in targets:
+        cost_model.fit(rows, target)
+    
+    return cost_model
+
+
+def partition_lpt(jobs, num_chunks):
+    # jobs: [(name, cost)] --> chunks [{"jobs": [names, longest first], "cost": total}], longest processing time first:
+    # every job, longest first, goes to the least loaded chunk (within 4/3 of the optimal makespan)
+    
+    num_chunks = max(1, min(num_chunks, len(jobs)))
+    chunks = [{"jobs": [], "cost": 0.0} for i in range(num_chunks)]
+    heap = [(0.0, i) for i in range(num_chunks)]
+    
+    for name, cost in sorted(jobs, key = lambda job: -job[1]):
+        load, i = heapq.heappop(heap)
+        chunks[i]["jobs"].append(name)
+        chunks[i]["cost"] += cost
+        heapq.heappush(heap, (chunks[i]["cost"], i))
+    
+    chunks = [chunk for chunk in chunks if len(chunk["jobs"]) > 0]
+    chunks.sort(key = lambda chunk: -chunk["cost"]) # longest chunks are started first
+    
+    return chunks
+
+
+def get_num_chunks(total_cost, target_chunk_seconds, max_chunks = None):
+    
+    num_chunks = int(total_cost // target_chunk_seconds) + 1
+    
+    if max_chunks is not None:
+        num_chunks = min(num_chunks, max_chunks)
+    
+    return num_chunks
+
+
+def get_script_jobs(script_fnames, metrics_list, cost_model):
+    # [(script file name, predicted opensees seconds)]; scripts without metrics (e.g. written by another run)
+    # get the mean prediction
+    
+    counters_by_script = dict()
+    
+    for metrics_dict in metrics_list:
+        counters_by_script[get_metrics_script_fname(metrics_dict)] = metrics_dict["counters"]
+    
+    costs = dict()
+    
+    for script_fname in script_fnames:
+        if script_fname in counters_by_script:
+            costs[script_fname] = cost_model.predict(counters_by_script[script_fname], "opensees")
+    
+    mean_cost = sum(costs.values()) / len(costs) if len(costs) > 0 else 1.0
+    
+    return [(script_fname, costs.get(script_fname, mean_cost)) for script_fname in script_fnames]
+
+
+def write_job_array(chunks,
+                    output_folder = "test-bed/bin/tcl_files/",
+                    status_folder = "results/status/",
+                    job_name = "simris",
+                    opensees_command = "OpenSees",
+                    seconds = True,
+                    time_margin = 1.5):
+    # balanced batch drivers (batch_0001.tcl, ...), the manifest job_array.txt (driver paths relative to test-bed/bin,
+    # one per task, longest first), job_array.json (predicted cost of every task) and job_array.sbatch
+    # seconds: the chunk costs are predicted seconds (False: relative costs of an unfitted model, no time limit)
+    # run from test-bed/bin: xargs -P 8 -n 1 OpenSees < tcl_files/job_array.txt
+    #                        sbatch tcl_files/job_array.sbatch
+    
+    if len(chunks) == 0:
+        logger.warning("no scripts to run: no job array written")
+        return []
+    
+    driver_fnames = w.write_batch_driver_chunks([chunk["jobs"] for chunk in chunks], output_folder, status_folder)
+    model_folder = "tcl_files/"
+    
+    manifest = open(output_folder + "job_array.txt", 'w')
+    
+    for driver_fname in driver_fnames:
+        manifest.write(model_folder + driver_fname + '\n')
+    
+    manifest.close()
+    
+    tasks = []
+    
+    for i, chunk in enumerate(chunks):
+        tasks.append({"task": i + 1,
+                      "driver": model_folder + driver_fnames[i],
+                      "scripts": len(chunk["jobs"]),
+                      "predicted_cost": round(chunk["cost"], 3)})
+    
+    outf = open(output_folder + "job_array.json", 'w')
+    json.dump({"cost_unit": "seconds" if seconds else "relative", "tasks": tasks}, outf, indent = 4)
+    outf.close()
+    
+    outf = open(output_folder + "job_array.sbatch", 'w')
+    outf.write("#!/bin/bash" + '\n')
+    outf.write("#SBATCH --job-name=" + job_name + '\n')
+    outf.write("#SBATCH --array=1-" + str(len(driver_fnames)) + '\n')
+    outf.write("#SBATCH --ntasks=1" + '\n')
+    outf.write("#SBATCH --cpus-per-task=1" + '\n')
+    
+    if seconds:
+        # time limit of the longest task, with a margin for the prediction error
+        limit = int(max([chunk["cost"] for chunk in chunks]) * time_margin) + 60
+        outf.write("#SBATCH --time=" + str(limit // 3600).zfill(2) + ':' + str(limit % 3600 // 60).zfill(2) + ':' + str(limit % 60).zfill(2) + '\n')
+    
+    outf.write("#SBATCH --output=" + status_folder + "slurm_%A_%a.out" + '\n')
+    outf.write('\n')
+    outf.write("# submit from test-bed/bin: sbatch " + model_folder + "job_array.sbatch" + '\n')
+    outf.write("driver=$(sed -n \"${SLURM_ARRAY_TASK_ID}p\" " + model_folder + "job_array.txt)" + '\n')
+    outf.write(opensees_command + " $driver" + '\n')
+    outf.close()
+    
+    return driver_fnames
+
+
+def write_balanced_batch_drivers(script_fnames,
+                                 metrics_fname,
+                                 cost_model_fname = None,
+                                 num_chunks = None,
+                                 target_chunk_seconds = 600.0,
+                                 output_folder = "test-bed/bin/tcl_files/"):
+    # batch drivers of the scripts partitioned by their predicted opensees runtime, plus the job array files;
+    # num_chunks None: as many chunks as needed for target_chunk_seconds each (fitted model only)
+    
+    cost_model = load_cost_model(cost_model_fname)
+    fitted = cost_model.is_fitted("opensees")
+    
+    jobs = get_script_jobs(script_fnames, mt.load_metrics(metrics_fname), cost_model)
+    
+    if num_chunks is None:
+        if not fitted:
+            logger.warning("no opensees cost model yet (python cost_model.py fit ...): chunks of 20 scripts")
+            num_chunks = len(jobs) // 20 + 1
+        
+        else:
+            num_chunks = get_num_chunks(sum([cost for name, cost in jobs]), target_chunk_seconds)
+    
+    chunks = partition_lpt(jobs, num_chunks)
+    
+    return write_job_array(chunks, output_folder, seconds = fitted)
+
+
+def split_inputs(base_folder, num_parts, cost_model):
+    # [[import_fname]]: the buildings of base_folder partitioned by their predicted generation time
+    
+    jobs = []
+    
+    for typology, import_fname, import_json_obj in ai.iter_inputs(base_folder):
+        if import_json_obj is None:
+            import_file = open(import_fname)
+            import_json_obj = json.load(import_file)
+            import_file.close()
+        
+        jobs.append((import_fname, cost_model.predict(get_input_counters(import_json_obj), "generation")))
+    
+    return [chunk["jobs"] for chunk in partition_lpt(jobs, num_parts)]
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) == 5 and sys.argv[1] == "fit":
+        cost_model = fit_cost_model(sys.argv[2], sys.argv[3])
+        cost_model.save(sys.argv[4])
+        
+        for target in targets:
+            print(target.ljust(12) + str(cost_model.stats.get(target, "not fitted")))
+    
+    elif len(sys.argv) == 6 and sys.argv[1] == "split-inputs":
+        output_folder = sys.argv[5] if sys.argv[5].endswith('/') else sys.argv[5] + '/'
+        
+        if not os.path.isdir(output_folder):
+            os.makedirs(output_folder)
+        
+        parts = split_inputs(sys.argv[2], int(sys.argv[3]), load_cost_model(sys.argv[4]))
+        
+        for i, part in enumerate(parts):
+            outf = open(output_folder + "inputs_" + str(i + 1).zfill(4) + ".txt", 'w')
+            
+            for import_fname in part:
+                outf.write(import_fname + '\n')
+            
+            outf.close()
+        
+        print(str(len(parts)) + " input lists written to " + output_folder)
+    
+    else:
+        print("usage: python cost_model.py fit metrics.jsonl status_folder cost_model.json")
+        print("       python cost_model.py split-inputs buildings_folder num_parts cost_model.json output_folder")
+        sys.exit(1)
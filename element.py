@@ -3,7 +3,11 @@
 ###########################################
 
 
-import rhinoscriptsyntax as rs
+try:
+    import rhinoscriptsyntax as rs
+except ImportError:
+    rs = None # headless run (outside Rhino): drawing is not available
+import math as m
 
 class Element:
     def __init__(self, id, node1, node2, type, section):
@@ -12,7 +16,10 @@ class Element:
         self.node2 = node2 #object, node 2
         self.type = type # "column", "beam" or "auxbeam"
         self.section = section
-        self.length = abs(rs.Distance(self.node1.coords, self.node2.coords))
+        if rs is not None:
+            self.length = abs(rs.Distance(self.node1.coords, self.node2.coords))
+        else:
+            self.length = m.sqrt(sum([(c1 - c2) ** 2 for c1, c2 in zip(self.node1.coords, self.node2.coords)]))
         self.hinge_length = self.length * 10 / 100.0 # 10% of element's length
         self.uniform_load = None # self.assign_load() # uniform load vector
         self.isborder = False
@@ -37,6 +44,33 @@ class Element:
             return None
     
     
+    def generate_elastic_element_string(self, geomTransf_data):
+        
+        # element elasticBeamColumn $eleTag $iNode $jNode $secTag $transfTag
+        # the elastic properties are taken from the (initial stiffness of the) section
+        
+        elem_str = ("element elasticBeamColumn " + 
+                    str(self.id) + ' ' + 
+                    str(self.node1.id) + ' ' + 
+                    str(self.node2.id) + ' ' + 
+                    str(self.section.id) + ' ' + 
+                    str(geomTransf_data[self.type]["tag_id"])
+                   )
+        
+        return elem_str
+    
+    
+    def get_num_integ_pts(self, elem_model_type, num_integ_pts):
+        
+        # integration points of the forceBeamColumn of generate_element_string: the hinge integrations come with a
+        # prefixed number of points (HingeRadau: 2 per hinge + 2 interior), num_integ_pts applies to the others
+        
+        if elem_model_type == "hinge_integration":
+            return 6
+        
+        return num_integ_pts
+    
+    
     def generate_element_string(self, geomTransf_data, elem_model_type, num_integ_pts):
         
         # element forceBeamColumn $eleTag $iNode $jNode $transfTag $integration <-mass $massDens> <-iter $maxIters $tol>
@@ -0,0 +1,331 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Emitter backends of the opensees script (see model_builder.emit). write_tcl_source writes tcl commands
+# into a sink (any object with write / flush); an emitter is a sink translating them into another form:
+#
+# "tcl"        TclEmitter: the tcl commands as they are (.tcl files run with OpenSees)
+# "openseespy" OpenSeesPyEmitter: a python script calling openseespy (.py files run with python)
+# "commands"   CommandListEmitter: in memory list of openseespy command tuples, e.g. ("node", 1, 0.0, 0.0, 0.0),
+#              that can be replayed into openseespy (or any object with the same methods) without writing files
+#
+# emitter = get_emitter("openseespy", outf)
+# model_builder.emit(model, emitter)
+# emitter.close()
+#
+# The tcl subset written by write_tcl_source is translated as follows (everything else is passed through):
+# - element forceBeamColumn ... $transfTag $integration --> beamIntegration + element with the integration tag
+#   (element nonlinearBeamColumn: Lobatto integration, the opensees default of that element)
+# - section Fiber ... { patch / layer / fiber } --> section, then its patches / layers / fibers
+# - pattern Plain $tag Linear { load / eleLoad } --> timeSeries Linear $tag, pattern Plain $tag $tag, then the loads
+# - file mkdir $dir --> ("file", "mkdir", $dir): made by replay and by the openseespy script (os.makedirs)
+# so the three backends build the same model (checked by golden_outputs.check_backends)
+
+import os
+import re
+
+import errors as er
+
+
+backends = ["tcl", "openseespy", "commands"]
+
+script_extensions = {"tcl": ".tcl", "openseespy": ".py"}
+
+openseespy_import = "import openseespy.opensees as ops"
+
+int_pattern = re.compile(r"^[-+]?\d+$")
+float_pattern = re.compile(r"^[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$")
+
+
+def parse_value(token):
+    # tcl word --> int, float or str
+    
+    if int_pattern.match(token):
+        return int(token)
+    
+    if float_pattern.match(token):
+        return float(token)
+    
+    return token
+
+
+def format_value(value):
+    # python literal of a command argument
+    
+    if isinstance(value, float):
+        return repr(value)
+    
+    if isinstance(value, int):
+        return str(value)
+    
+    return "'" + value.replace('\\', '\\\\').replace('\'', '\\\'') + "'"
+
+
+class TclEmitter:
+    def __init__(self, outf):
+        self.outf = outf
+    
+    
+    def write(self, text):
+        
+        self.outf.write(text)
+    
+    
+    def flush(self):
+        
+        self.outf.flush()
+    
+    
+    def close(self):
+        # the output itself is closed by its owner
+        
+        self.outf.flush()
+
+
+class CommandEmitter:
+    # base of the backends translating the tcl commands: handle_command is called with every openseespy command tuple
+    
+    def __init__(self):
+        self.pending = "" # last (incomplete) line written
+        self.blocks = [] # open tcl blocks ("section" / "pattern")
+        self.integration_tags = dict() # beamIntegration arguments --> tag (one integration per distinct hinge scheme)
+    
+    
+    def write(self, text):
+        
+        self.pending += text
+        
+        if '\n' not in self.pending:
+            return
+        
+        lines = self.pending.split('\n')
+        self.pending = lines.pop()
+        
+        for line in lines:
+            self.parse_line(line)
+    
+    
+    def flush(self):
+        
+        pass
+    
+    
+    def close(self):
+        
+        if self.pending:
+            self.parse_line(self.pending)
+            self.pending = ""
+        
+        if len(self.blocks) > 0:
+            raise er.EmitterError("unclosed tcl block (" + self.blocks[-1] + ")")
+    
+    
+    def handle_command(self, command):
+        
+        pass
+    
+    
+    def handle_comment(self, line):
+        
+        pass
+    
+    
+    def parse_line(self, line):
+        
+        line = line.strip()
+        
+        if not line:
+            self.handle_comment("")
+        
+        elif line.startswith('#'):
+            self.handle_comment(line)
+        
+        elif line == '}':
+            if len(self.blocks) == 0:
+                raise er.EmitterError("unexpected end of tcl block")
+            
+            self.blocks.pop()
+        
+        elif line.endswith('{'):
+            values = [parse_value(token) for token in line[:-1].split()]
+            
+            for command in self.translate_block(values):
+                self.handle_command(command)
+        
+        else:
+            values = [parse_value(token) for token in line.split()]
+            
+            for command in self.translate_command(values):
+                self.handle_command(command)
+    
+    
+    def translate_block(self, values):
+        # commands opening a tcl block
+        
+        if values[0] == "section":
+            self.blocks.append("section")
+            return [tuple(values)]
+        
+        if values[0] == "pattern" and values[1] == "Plain":
+            # pattern Plain $tag $tsType <$tsArgs>: the time series gets the tag of the pattern
+            self.blocks.append("pattern")
+            tag = values[2]
+            return [("timeSeries", values[3], tag) + tuple(values[4:]), ("pattern", "Plain", tag, tag)]
+        
+        raise er.EmitterError("unsupported tcl block (" + str(values[0]) + ")")
+    
+    
+    def translate_command(self, values):
+        
+        if values[0] != "element":
+            return [tuple(values)]
+        
+        if values[1] == "nonlinearBeamColumn":
+            # element nonlinearBeamColumn $eleTag $iNode $jNode $numIntgrPts $secTag $transfTag
+            integration = ("Lobatto", values[5], values[4])
+            element = ["element", "forceBeamColumn"] + values[2:5] + [values[6]]
+        
+        elif values[1] in ("forceBeamColumn", "dispBeamColumn") and len(values) > 6 and not isinstance(values[6], (int, float)):
+            # element forceBeamColumn $eleTag $iNode $jNode $transfTag $integrationType $integrationArgs
+            integration = tuple(values[6:])
+            element = values[:6]
+        
+        else:
+            return [tuple(values)]
+        
+        commands = []
+        
+        if integration not in self.integration_tags:
+            self.integration_tags[integration] = len(self.integration_tags) + 1
+            commands.append(("beamIntegration", integration[0], self.integration_tags[integration]) + integration[1:])
+        
+        commands.append(tuple(element) + (self.integration_tags[integration],))
+        
+        return commands
+
+
+class CommandListEmitter(CommandEmitter):
+    def __init__(self):
+        CommandEmitter.__init__(self)
+        self.commands = [] # openseespy command tuples, in order
+    
+    
+    def handle_command(self, command):
+        
+        self.commands.append(command)
+
+
+class OpenSeesPyEmitter(CommandEmitter):
+    def __init__(self, outf):
+        CommandEmitter.__init__(self)
+        self.outf = outf
+        self.outf.write(openseespy_import + '\n')
+    
+    
+    def handle_command(self, command):
+        
+        if command[:2] == ("file", "mkdir"):
+            self.outf.write("import os" + '\n')
+            self.outf.write("if not os.path.isdir(" + format_value(command[2]) + "): os.makedirs(" + format_value(command[2]) + ")\n")
+            return
+        
+        self.outf.write("ops." + command[0] + '(' + ", ".join([format_value(value) for value in command[1:]]) + ")\n")
+    
+    
+    def handle_comment(self, line):
+        
+        self.outf.write(line + '\n')
+    
+    
+    def close(self):
+        
+        CommandEmitter.close(self)
+        self.outf.flush()
+
+
+class CommandRecorder:
+    # in process stand-in of openseespy: every call is recorded as a command tuple
+    
+    def __init__(self):
+        self.commands = []
+    
+    
+    def __getattr__(self, name):
+        
+        if name.startswith('_'):
+            raise AttributeError(name)
+        
+        def record(*args):
+            self.commands.append((name,) + args)
+        
+        return record
+
+
+class DirectoryRecorder:
+    # stand-in of the os module of an openseespy script run by run_script: directories are recorded as
+    # ("file", "mkdir", path) commands of the interpreter instead of being made
+    
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.path = self
+    
+    
+    def isdir(self, path):
+        
+        return False
+    
+    
+    def makedirs(self, path):
+        
+        getattr(self.interpreter, "file")("mkdir", path)
+
+
+def get_emitter(backend, outf = None):
+    # outf: output of the script backends ("tcl", "openseespy"), not used by "commands"
+    
+    if backend == "tcl":
+        return TclEmitter(outf)
+    
+    if backend == "openseespy":
+        return OpenSeesPyEmitter(outf)
+    
+    if backend == "commands":
+        return CommandListEmitter()
+    
+    raise er.EmitterError("unknown emitter backend (" + str(backend) + ")")
+
+
+def parse_tcl(text):
+    # openseespy command tuples of a tcl script written by write_tcl_source
+    
+    emitter = CommandListEmitter()
+    emitter.write(text)
+    emitter.close()
+    
+    return emitter.commands
+
+
+def replay(commands, interpreter):
+    # runs the command tuples, e.g. replay(commands, openseespy.opensees) or replay(commands, CommandRecorder())
+    
+    for command in commands:
+        if command[:2] == ("file", "mkdir") and not isinstance(interpreter, CommandRecorder):
+            # host command (not an opensees one), recorded as it is by CommandRecorder
+            if not os.path.isdir(command[2]):
+                os.makedirs(command[2])
+            continue
+        
+        getattr(interpreter, command[0])(*command[1:])
+    
+    return len(commands)
+
+
+def run_script(script_text, interpreter):
+    # runs an openseespy script (see OpenSeesPyEmitter) with interpreter in place of openseespy
+    
+    namespace = {"ops": interpreter, "os": DirectoryRecorder(interpreter)}
+    script_text = script_text.replace(openseespy_import, "pass", 1).replace("import os\n", "pass\n")
+    exec(compile(script_text, "<openseespy script>", "exec"), namespace)
+    
+    return interpreter
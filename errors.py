@@ -0,0 +1,45 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Errors raised by the generator. Everything raised on bad input derives from SimrisError, so the batch can
+# quarantine the building and carry on with the next one (see checkpoint.py), while a bug in the generator
+# (any other exception) is told apart in the diagnostics.
+#
+# SimrisError
+#   InputError           malformed building: unexpected levels, nodes off their diaphragm, ...
+#     RebarLayoutError   rebar layer that cannot be laid out in its section
+#   DirectionError       pushover direction other than 'X' or 'Y'
+#   EmitterError         tcl the emitter backends cannot translate (see emitters.py)
+#   ScriptArchiveError   script missing from a script archive (see script_archive.py)
+#   RecorderError        recorder file that cannot be read (see recorder_reader.py)
+
+
+class SimrisError(Exception):
+    pass
+
+
+class InputError(SimrisError):
+    pass
+
+
+class RebarLayoutError(InputError):
+    pass
+
+
+class DirectionError(SimrisError):
+    def __init__(self, dir):
+        SimrisError.__init__(self, "no valid direction ('X' or 'Y') was passed to the function: " + repr(dir))
+        self.dir = dir
+
+
+class EmitterError(SimrisError):
+    pass
+
+
+class ScriptArchiveError(SimrisError):
+    pass
+
+
+class RecorderError(SimrisError):
+    pass
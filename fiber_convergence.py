@@ -0,0 +1,290 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Fiber mesh convergence study: the moment - curvature response of each section is computed
+# with different patch discretisations (num_div_y, num_div_z, div_mult) and compared against a fine reference mesh.
+# The coarsest scheme within tolerance is returned so it can be passed to section.create_sections_dict
+# (every fiber is evaluated at every integration point of every element in every opensees step)
+#
+# The moment - curvature analysis is a monotonic one, done here in python (no opensees needed):
+# - concrete04: Popovics curve in compression (up to ecu), no tension
+# - other concretes: Hognestad parabola in compression, no tension
+# - steel02: bilinear envelope with strain hardening ratio b
+
+import logging
+import patch as pat
+import section as sec_module
+
+logger = logging.getLogger(__name__)
+
+
+def get_stress(material, strain):
+    
+    props = material.properties
+    
+    if "concrete" in material.type:
+        if strain >= 0:
+            return 0.0 # no tensile strength
+        
+        fc = -abs(props["fck"])
+        ec = -abs(props.get("ec", -0.002))
+        ecu = -abs(props.get("ecu", -0.0035))
+        
+        if strain < ecu:
+            return 0.0 # crushed
+        
+        x = strain / ec
+        
+        if material.type == "concrete04":
+            Ec = props["e_mod"]
+            n = Ec / (Ec - fc / ec)
+            return fc * x * n / (n - 1 + x ** n)
+        
+        if x <= 1:
+            return fc * (2 * x - x ** 2)
+        
+        return fc
+    
+    # steel
+    E0 = props["e_mod"]
+    fy = props["fy"]
+    b = props.get("b", 0.0)
+    
+    ey = fy / E0
+    
+    if abs(strain) <= ey:
+        return E0 * strain
+    
+    sign = 1.0 if strain > 0 else -1.0
+    
+    return sign * (fy + b * E0 * (abs(strain) - ey))
+
+
+def get_patch_fibers(patch):
+    # fibers (y, z, area, material) of a rectangular patch quad: one fiber at the centroid of every subdivision
+    
+    y_coords = [patch.i_coords[0], patch.j_coords[0], patch.k_coords[0], patch.l_coords[0]]
+    z_coords = [patch.i_coords[1], patch.j_coords[1], patch.k_coords[1], patch.l_coords[1]]
+    
+    y_min, y_max = min(y_coords), max(y_coords)
+    z_min, z_max = min(z_coords), max(z_coords)
+    
+    dy = (y_max - y_min) / patch.num_div_y
+    dz = (z_max - z_min) / patch.num_div_z
+    
+    fibers = []
+    
+    for i in range(patch.num_div_y):
+        for j in range(patch.num_div_z):
+            fibers.append((y_min + (i + 0.5) * dy, z_min + (j + 0.5) * dz, dy * dz, patch.material))
+    
+    return fibers
+
+
+def get_rebar_fibers(section):
+    # fibers of the straight rebar layers (bars evenly spaced from start to end) and of the single rebar fibers
+    
+    fibers = []
+    
+    for layer in section.rebar_layers:
+        (y_start, z_start), (y_end, z_end) = layer.start_coords, layer.end_coords
+        
+        for k in range(layer.num_bars):
+            t = 0.5 if layer.num_bars == 1 else k / (layer.num_bars - 1.0)
+            fibers.append((y_start + t * (y_end - y_start), z_start + t * (z_end - z_start), layer.area_bar, layer.material))
+    
+    for fiber in section.fibers:
+        fibers.append((fiber.coords[0], fiber.coords[1], fiber.area, fiber.material))
+    
+    return fibers
+
+
+def get_section_fibers(section, patches_scheme):
+    # all the fibers of the section if it were meshed with patches_scheme = (num_div_y, num_div_z, div_mult)
+    
+    num_div_y, num_div_z, div_mult = patches_scheme
+    
+    cover = section.rebar_layers[0].cover # we are assuming all covers in all layers are the same
+    
+    patches = [pat.create_core_patch(section, cover, section.materials["confined_concrete"], num_div_y, num_div_z, div_mult)]
+    patches.extend(pat.create_cover_patches(section, cover, section.materials["unconfined_concrete"], num_div_y, num_div_z, div_mult))
+    
+    fibers = []
+    
+    for patch in patches:
+        fibers.extend(get_patch_fibers(patch))
+    
+    return fibers + get_rebar_fibers(section)
+
+
+def get_section_forces(fibers, axis_index, strain_0, curvature):
+    # axial force and bending moment for strain = strain_0 - curvature * coord (compression is negative)
+    
+    axial_force = 0.0
+    moment = 0.0
+    
+    for fiber in fibers:
+        coord = fiber[axis_index]
+        stress = get_stress(fiber[3], strain_0 - curvature * coord)
+        force = stress * fiber[2]
+        
+        axial_force += force
+        moment -= force * coord
+    
+    return axial_force, moment
+
+
+def get_moment(fibers, axis_index, curvature, axial_load, max_iter = 60, tol = 1e-3):
+    # moment for a given curvature, finding the axial strain in equilibrium with axial_load by bisection
+    
+    strain_low, strain_high = -0.05, 0.05
+    
+    moment = 0.0
+    
+    for i in range(max_iter):
+        strain_0 = 0.5 * (strain_low + strain_high)
+        axial_force, moment = get_section_forces(fibers, axis_index, strain_0, curvature)
+        
+        if abs(axial_force - axial_load) < tol:
+            break
+        
+        # the axial force grows with the axial strain
+        if axial_force > axial_load:
+            strain_high = strain_0
+        else:
+            strain_low = strain_0
+    
+    return moment
+
+
+def get_moment_curvature(section, patches_scheme, axis_index, curvatures, axial_load = 0.0):
+    
+    fibers = get_section_fibers(section, patches_scheme)
+    
+    return [get_moment(fibers, axis_index, curv, axial_load) for curv in curvatures]
+
+
+def get_curvatures(section, axis_index, num_points = 20, max_ductility = 15.0):
+    # curvature grid up to max_ductility times the yield curvature (2.1 * ey / d, Priestley)
+    
+    steel = section.materials["steel"]
+    ey = steel.properties["fy"] / steel.properties["e_mod"]
+    
+    depth = section.width if axis_index == 0 else section.height
+    
+    yield_curvature = 2.1 * ey / depth
+    
+    return [yield_curvature * max_ductility * (i + 1) / float(num_points) for i in range(num_points)]
+
+
+def get_num_fibers(patches_scheme):
+    # core + 2 horizontal cover patches + 2 vertical cover patches (see patch.py)
+    
+    num_div_y, num_div_z, div_mult = patches_scheme
+    
+    return (num_div_y * num_div_z + 2 * num_div_y + 2 * num_div_z) * div_mult ** 2
+
+
+def get_candidate_schemes(max_div = 8, div_mults = (1, 2, 3)):
+    # all schemes, coarsest (fewest fibers) first
+    
+    schemes = []
+    
+    for div_mult in div_mults:
+        for num_div_y in range(1, max_div + 1):
+            for num_div_z in range(1, max_div + 1):
+                schemes.append((num_div_y, num_div_z, div_mult))
+    
+    schemes.sort(key = lambda s: (get_num_fibers(s), s[2]))
+    
+    return schemes
+
+
+def study_section(section, tolerance = 0.01, axial_load = 0.0, reference_scheme = (10, 10, 4), candidate_schemes = None):
+    # returns the coarsest scheme whose moment - curvature response (about both axes) is within
+    # tolerance (max error relative to the peak reference moment) of the reference mesh
+    
+    if candidate_schemes is None:
+        candidate_schemes = get_candidate_schemes()
+    
+    references = []
+    
+    for axis_index in (0, 1):
+        curvatures = get_curvatures(section, axis_index)
+        ref_moments = get_moment_curvature(section, reference_scheme, axis_index, curvatures, axial_load)
+        references.append((axis_index, curvatures, ref_moments))
+    
+    for scheme in candidate_schemes:
+        max_error = 0.0
+        
+        for axis_index, curvatures, ref_moments in references:
+            moments = get_moment_curvature(section, scheme, axis_index, curvatures, axial_load)
+            ref_peak = max([abs(mom) for mom in ref_moments])
+            
+            for mom, ref_mom in zip(moments, ref_moments):
+                max_error = max(max_error, abs(mom - ref_mom) / ref_peak)
+            
+            if max_error > tolerance:
+                break
+        
+        if max_error <= tolerance:
+            return scheme, max_error
+    
+    return reference_scheme, 0.0
+
+
+def optimise_patches_schemes(sections, tolerance = 0.01, axial_load_ratios = None):
+    # coarsest patches scheme of every section type, ready for section.create_sections_dict(..., patches_schemes)
+    # axial_load_ratios: {section type: N / (fck * area)} (compression), e.g. {"column": 0.1}
+    
+    if axial_load_ratios is None:
+        axial_load_ratios = {"column": 0.1}
+    
+    patches_schemes = dict()
+    report = dict()
+    
+    for sec_type, sec in sections.items():
+        fck = abs(sec.materials["unconfined_concrete"].properties["fck"])
+        axial_load = -axial_load_ratios.get(sec_type, 0.0) * fck * sec.area
+        
+        scheme, error = study_section(sec, tolerance, axial_load)
+        
+        current_fibers = sum([patch.num_div_y * patch.num_div_z for patch in sec.patches])
+        
+        patches_schemes[sec_type] = scheme
+        report[sec_type] = {"scheme": scheme,
+                            "error": round(error, 4),
+                            "fibers": get_num_fibers(scheme),
+                            "previous_fibers": current_fibers}
+    
+    return patches_schemes, report
+
+
+def get_materials_key(materials):
+    # the materials the sections are made of (name, opensees type and properties), as a cache key
+    
+    return str(sorted([(mat.name, mat.type, sorted(mat.properties.items())) for mat in materials.values()]))
+
+
+def get_patches_schemes(materials, sections_scheme, hinge_dist_percentage, tolerance = 0.01, cache = None):
+    # optimised patches schemes for a sections scheme (the study only depends on the sections, i.e. on the sections
+    # scheme, the materials and the hinge length, so the result can be cached and reused for every building with the
+    # same ones)
+    
+    cache_key = ("patches_" + str(sorted(sections_scheme.items())) + '_' + str(hinge_dist_percentage) + '_' +
+                 get_materials_key(materials) + '_' + str(tolerance))
+    
+    if cache is not None and cache_key in cache:
+        return cache[cache_key]
+    
+    default_sections, confined_concrete_materials = sec_module.create_sections_dict(materials, sections_scheme, hinge_dist_percentage)
+    
+    patches_schemes, report = optimise_patches_schemes(default_sections, tolerance)
+    
+    logger.info("fiber mesh convergence: " + str(report))
+    
+    if cache is not None:
+        cache[cache_key] = patches_schemes
+    
+    return patches_schemes
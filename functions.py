@@ -3,7 +3,11 @@
 ###########################################
 
 import math as m
-import rhinoscriptsyntax as rs
+import errors as er
+try:
+    import rhinoscriptsyntax as rs
+except ImportError:
+    rs = None # headless run (outside Rhino): drawing is not available
 
 
 def create_nodes_dict(nodes):
@@ -38,26 +42,25 @@ def extract_node_network(elements, nodes, levels):
             # maybe it is better to store the level in the element class at time of creation
             level = str(int(zcoord*1000)) # we use mm for indexing
             
-            if level not in levels_dict.keys():
+            if level not in levels_dict:
                 levels_dict[level] = dict()
                 levels_dict[level][str(elem.node1.id)] = {elem} # each node has a set of elements that connect to it
                 levels_dict[level][str(elem.node2.id)] = {elem}
                 
             else:
-                if str(elem.node1.id) not in levels_dict[level].keys():
+                if str(elem.node1.id) not in levels_dict[level]:
                     levels_dict[level][str(elem.node1.id)] = {elem}
                 else:
                     levels_dict[level][str(elem.node1.id)].add(elem)
                     
-                if str(elem.node2.id) not in levels_dict[level].keys():
+                if str(elem.node2.id) not in levels_dict[level]:
                     levels_dict[level][str(elem.node2.id)] = {elem}
                 else:
                     levels_dict[level][str(elem.node2.id)].add(elem)
             
     # now check that we got the right number of levels
-    if len(levels_dict.keys()) != levels:
-        print("Fatal error: more levels than expected. Raising BaseException now.")
-        raise BaseException
+    if len(levels_dict) != levels:
+        raise er.InputError("more levels than expected: " + str(len(levels_dict)) + " levels instead of " + str(levels))
     else:
         return levels_dict
 
@@ -119,8 +122,7 @@ def calculate_nodal_masses(nodes_dict, node_network_by_levels):
             
             # delta z should be zero
             if delta_z != 0:
-                print("Fatal error: delta Z not zero. Raising BaseException now.")
-                raise BaseException
+                raise er.InputError("delta Z not zero: node " + str(node.id) + " is off the plane of its diaphragm")
             
             dist_to_center = m.sqrt(delta_x ** 2 + delta_y ** 2)
             
@@ -151,7 +153,7 @@ def get_facade_nodes_by_level(plane_dir_index, nodes_dict, levels):
             
             level = str(int(n.coords[2]*1000)) # we use mm for indexing
             
-            if level not in facade_nodes_by_level.keys():
+            if level not in facade_nodes_by_level:
                 facade_nodes_by_level[level] = [n]
             else:
                 facade_nodes_by_level[level].append(n)
@@ -177,8 +179,7 @@ def get_side_nodes(nodes_list, side):
         coord_key1 = 1
         coord_key2 = 0
     else:
-        print('Fatal error: unrecognised xy_key. Raising BaseException now.')
-        raise BaseException
+        raise er.DirectionError(side)
     
     x_indexing = dict()
     y_indexing = dict()
@@ -230,7 +231,7 @@ def nodes_by_level(node_list, bool_draw):
     for node in node_list:
         level = str(int(node.coords[2]*1000)) # we use mm for indexing
             
-        if level not in nodes_by_level.keys():
+        if level not in nodes_by_level:
             
             nodes_by_level[level] = [node]
         else:
@@ -277,6 +278,18 @@ def get_control_node(diaphragms):
     return control_node_id, max_height
 
 
+def get_diaphragm_dimensions(diaph):
+    # plan dimensions (X and Y) of the slab, taken from the extents of its nodes
+    
+    x_coords = [node.coords[0] for node in diaph["nodes"]]
+    y_coords = [node.coords[1] for node in diaph["nodes"]]
+    
+    x_dim = max(x_coords) - min(x_coords)
+    y_dim = max(y_coords) - min(y_coords)
+    
+    return x_dim, y_dim
+
+
 
 def get_sdof_data(diaphragms, nodes_dict):
     
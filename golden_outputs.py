@@ -0,0 +1,614 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Golden output harness (headless, no Rhino needed): a corpus of reference buildings (synthetic ones
+# and, optionally, real building_structure_results jsons) is run through the current pipeline and the
+# canonicalised .tcl and tau outputs are stored with a sha1 manifest. Later versions of the code are
+# compared against them: files with the same hash are skipped, the rest are compared line by line,
+# numbers with a relative / absolute tolerance and everything else exactly.
+#
+# The same corpus checks the emitter backends (see emitters.py): the in memory command list, the openseespy script run
+# with emitters.CommandRecorder and the tcl script run by a real tcl interpreter (tkinter, skipped when not available)
+# must all define the model commands taken from the model itself (materials, sections with their patches and layers,
+# transformations, nodes, elements with their integration, fixes, masses, diaphragms and gravity loads), and the
+# command list and openseespy script must run every other command (loads, recorders, analysis) like tcl does, numbers
+# within a tolerance.
+#
+# usage: python golden_outputs.py record golden_folder [buildings_folder]
+#        python golden_outputs.py compare golden_folder [buildings_folder]
+#        python golden_outputs.py backends [buildings_folder]
+#
+# goldens should be compared with the interpreter family they were recorded with (python 2 / IronPython
+# and python 3 iterate the materials / sections dicts in a different order)
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+
+import write_tcl_source as w
+import model_builder as mb
+import emitters as em
+import synthetic_building as sb
+
+try:
+    import Tkinter as tk # python 2
+except ImportError:
+    try:
+        import tkinter as tk
+    except ImportError:
+        tk = None # no tcl interpreter (e.g. IronPython): the tcl scripts are not run by check_backends
+
+
+# (storeys, bays, spans): covers the 3 sections schemes of run_building (<= 4, <= 8 and > 8 storeys)
+default_synthetic_sizes = [(2, 2, 2), (3, 3, 2), (5, 4, 3), (9, 4, 3)]
+
+default_cases = ['X', 'Y', "cases"] # single direction files and the multi case file
+
+number_pattern = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def get_corpus(buildings_folder = None, synthetic_sizes = None):
+    # [(building_id, import_json_obj)], real buildings are read from buildings_folder/<typology>/<id>_structure.json
+    
+    if synthetic_sizes is None:
+        synthetic_sizes = default_synthetic_sizes
+    
+    corpus = []
+    
+    for storeys, bays, spans in synthetic_sizes:
+        corpus.append((sb.get_building_id(storeys, bays, spans), sb.generate_building(storeys, bays, spans)))
+    
+    if buildings_folder is not None:
+        for fold_name in sorted(os.listdir(buildings_folder)):
+            for fname in sorted(os.listdir(buildings_folder + '/' + fold_name)):
+                if not fname.endswith("_structure.json"):
+                    continue
+                
+                import_file = open(buildings_folder + '/' + fold_name + '/' + fname)
+                corpus.append((fname.split("_structure.json")[0], json.load(import_file)))
+                import_file.close()
+    
+    return corpus
+
+
+def get_case_config(case):
+    
+    if case == "cases":
+        return {"load_cases": w.get_default_load_cases()}
+    
+    return {"dir": case}
+
+
+def generate_outputs(building_id, import_json_obj, cases = None, model_cache = None):
+    # {case_id: (tcl text, tau line)} produced in memory with the defaults of model_builder (i.e. of main.run_building)
+    
+    if cases is None:
+        cases = default_cases
+    
+    outputs = dict()
+    
+    for case in cases:
+        model = mb.build_model(import_json_obj, get_case_config(case), building_id, model_cache)
+        
+        outputs[building_id + '_' + case] = (mb.emit_to_string(model), mb.get_tau_line(model))
+    
+    return outputs
+
+
+def canonicalise(text):
+    # unix line endings, no trailing whitespace, single spaces, no blank lines
+    
+    lines = []
+    
+    for line in text.replace('\r\n', '\n').split('\n'):
+        line = ' '.join(line.split())
+        
+        if line:
+            lines.append(line)
+    
+    return '\n'.join(lines) + '\n'
+
+
+def get_hash(text):
+    
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def is_close(a, b, rel_tol, abs_tol):
+    
+    return abs(a - b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
+
+
+def compare_lines(line, golden_line, rel_tol = 1e-6, abs_tol = 1e-9):
+    # same text between numbers and numbers within tolerance
+    
+    numbers = number_pattern.findall(line)
+    golden_numbers = number_pattern.findall(golden_line)
+    
+    if number_pattern.sub('#', line) != number_pattern.sub('#', golden_line):
+        return False
+    
+    if len(numbers) != len(golden_numbers):
+        return False
+    
+    for number, golden_number in zip(numbers, golden_numbers):
+        if number != golden_number and not is_close(float(number), float(golden_number), rel_tol, abs_tol):
+            return False
+    
+    return True
+
+
+def compare_texts(text, golden_text, rel_tol = 1e-6, abs_tol = 1e-9, max_differences = 10):
+    # [(line number, line, golden line)] of the first max_differences different lines of two canonical texts
+    
+    lines = text.split('\n')
+    golden_lines = golden_text.split('\n')
+    
+    differences = []
+    
+    for i in range(max(len(lines), len(golden_lines))):
+        line = lines[i] if i < len(lines) else None
+        golden_line = golden_lines[i] if i < len(golden_lines) else None
+        
+        if line is None or golden_line is None or not compare_lines(line, golden_line, rel_tol, abs_tol):
+            differences.append((i + 1, line, golden_line))
+            
+            if len(differences) >= max_differences:
+                break
+    
+    return differences
+
+
+def write_text(fname, text):
+    
+    outf = open(fname, 'wb')
+    outf.write(text.encode("utf-8"))
+    outf.close()
+
+
+def read_text(fname):
+    
+    inf = open(fname, 'rb')
+    text = inf.read().decode("utf-8")
+    inf.close()
+    
+    return text
+
+
+def run_corpus(corpus, cases = None):
+    # {case_id: (canonical tcl, canonical tau)}
+    
+    model_cache = dict() # sections are computed once per sections scheme
+    outputs = dict()
+    
+    for building_id, import_json_obj in corpus:
+        for case_id, (tcl_text, tau_line) in generate_outputs(building_id, import_json_obj, cases, model_cache).items():
+            outputs[case_id] = (canonicalise(tcl_text), canonicalise(tau_line))
+    
+    return outputs
+
+
+def record(golden_folder, corpus, cases = None):
+    # writes golden_folder/<case_id>.tcl, <case_id>.tau and manifest.json
+    
+    if not os.path.isdir(golden_folder):
+        os.makedirs(golden_folder)
+    
+    manifest = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0], "cases": dict()}
+    
+    for case_id, (tcl_text, tau_text) in run_corpus(corpus, cases).items():
+        write_text(golden_folder + '/' + case_id + ".tcl", tcl_text)
+        write_text(golden_folder + '/' + case_id + ".tau", tau_text)
+        
+        manifest["cases"][case_id] = {"tcl_sha1": get_hash(tcl_text), "tau_sha1": get_hash(tau_text)}
+    
+    outf = open(golden_folder + '/manifest.json', 'w')
+    json.dump(manifest, outf, indent = 1, sort_keys = True)
+    outf.close()
+    
+    return manifest
+
+
+def compare(golden_folder, corpus, cases = None, rel_tol = 1e-6, abs_tol = 1e-9):
+    # {case_id: {"status": "identical" / "equivalent" / "different" / "missing" / "new", "differences": [...]}}
+    # identical: same hash (no line by line comparison), equivalent: numbers within tolerance
+    
+    manifest_file = open(golden_folder + '/manifest.json')
+    manifest = json.load(manifest_file)
+    manifest_file.close()
+    
+    outputs = run_corpus(corpus, cases)
+    
+    report = dict()
+    
+    for case_id, (tcl_text, tau_text) in outputs.items():
+        if case_id not in manifest["cases"]:
+            report[case_id] = {"status": "new", "differences": []}
+            continue
+        
+        golden_hashes = manifest["cases"][case_id]
+        
+        if get_hash(tcl_text) == golden_hashes["tcl_sha1"] and get_hash(tau_text) == golden_hashes["tau_sha1"]:
+            report[case_id] = {"status": "identical", "differences": []}
+            continue
+        
+        differences = []
+        
+        for extension, text in ((".tcl", tcl_text), (".tau", tau_text)):
+            golden_text = read_text(golden_folder + '/' + case_id + extension)
+            
+            for line_number, line, golden_line in compare_texts(text, golden_text, rel_tol, abs_tol):
+                differences.append({"file": case_id + extension, "line": line_number, "current": line, "golden": golden_line})
+        
+        report[case_id] = {"status": "different" if len(differences) > 0 else "equivalent", "differences": differences}
+    
+    for case_id in manifest["cases"]:
+        if case_id not in outputs:
+            report[case_id] = {"status": "missing", "differences": []}
+    
+    return report
+
+
+# model commands checked against the reference taken from the model (get_model_reference); every other command
+# (loads, recorders, analysis) is checked against the tcl script run by a tcl interpreter (get_tcl_trace)
+reference_commands = ["uniaxialMaterial", "section", "patch", "layer", "fiber", "geomTransf", "node", "element", "fix",
+                      "mass", "rigidDiaphragm", "eleLoad"]
+
+# opensees commands taking a block of commands as last argument in tcl (a flat sequence in openseespy)
+block_commands = ["section", "pattern"]
+    
+    
+def format_values(values):
+    # numbers with the precision of the scripts (coordinates and masses are written with '%.2f')
+    
+    return tuple(['%.2f' % float(value) for value in values])
+
+
+def get_number(value):
+    # float of the numbers (numeric strings of tcl included), the other values unchanged
+    
+    if isinstance(value, str):
+        match = number_pattern.match(value)
+        
+        if match is None or match.end() != len(value):
+            return value
+    
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def get_values(values):
+    
+    return tuple([get_number(value) for value in values])
+
+
+def are_close(values, other_values, rel_tol = 1e-9, abs_tol = 1e-12):
+    # same length, numbers within tolerance and everything else the same
+    
+    if len(values) != len(other_values):
+        return False
+    
+    for value, other_value in zip(values, other_values):
+        if isinstance(value, float) and isinstance(other_value, float):
+            if not is_close(value, other_value, rel_tol, abs_tol):
+                return False
+        
+        elif value != other_value:
+            return False
+    
+    return True
+
+
+def get_model_reference(model):
+    # {command name: {key: values}} of the model itself, without going through any writer or emitter:
+    # uniaxialMaterial --> material definition, section --> GJ, patch / layer / fiber --> section contents,
+    # geomTransf --> vector, node --> coordinates, element --> type, nodes, transformation and integration,
+    # fix --> fixes, mass --> masses, rigidDiaphragm --> slave nodes, eleLoad --> uniform load
+    
+    reference = dict([(name, dict()) for name in reference_commands])
+    
+    for mat in model.materials.values():
+        tokens = mat.material_string.split()
+        reference["uniaxialMaterial"][int(tokens[2])] = get_values([tokens[1]] + tokens[3:])
+    
+    for sec in model.sections.values():
+        reference["section"][int(sec.id)] = ("Fiber", "-GJ", float(sec.g_mod * sec.j))
+        reference["patch"][int(sec.id)] = tuple([get_values(["quad", patch.material.id, patch.num_div_y, patch.num_div_z] +
+                                                            list(patch.i_coords) + list(patch.j_coords) +
+                                                            list(patch.k_coords) + list(patch.l_coords))
+                                                 for patch in sec.patches])
+        reference["layer"][int(sec.id)] = tuple([get_values(["straight", layer.material.id, layer.num_bars, layer.area_bar] +
+                                                            list(layer.start_coords) + list(layer.end_coords))
+                                                 for layer in sec.rebar_layers])
+        reference["fiber"][int(sec.id)] = tuple([get_values(fiber.generate_fiber_string().split()[1:]) for fiber in sec.fibers])
+    
+    for transf in w.geomTransf_data.values():
+        reference["geomTransf"][transf["tag_id"]] = get_values([w.transf_type] + transf["str_vec"].split())
+    
+    for node in model.nodes_dict.values():
+        reference["node"][int(node.id)] = get_values(format_values(node.coords))
+        reference["fix"][int(node.id)] = get_values(node.fixes)
+        reference["mass"][int(node.id)] = get_values(format_values(node.mass))
+    
+    for diaph in model.diaphragms.values():
+        reference["node"][int(diaph["id"])] = get_values(format_values(diaph["coords"]))
+        reference["fix"][int(diaph["id"])] = get_values([0, 0, 1, 1, 1, 0]) # master node: in plane dofs free
+        reference["rigidDiaphragm"][int(diaph["id"])] = get_values([3] + sorted([int(node.id) for node in diaph["nodes"]]))
+    
+    elastic_element_ids = model.elastic_element_ids if model.elastic_element_ids is not None else set()
+    
+    for elem in model.elements_dict.values():
+        transf_tag = w.geomTransf_data[elem.type]["tag_id"]
+        
+        if elem.id in elastic_element_ids:
+            values = ["elasticBeamColumn", elem.node1.id, elem.node2.id, elem.section.id, transf_tag]
+        elif w.elem_model_type == "hinge_integration":
+            values = (["forceBeamColumn", elem.node1.id, elem.node2.id, transf_tag, "HingeRadau"] +
+                      [elem.section.id, elem.hinge_length, elem.section.id, elem.hinge_length, elem.section.id])
+        else:
+            # other integrations: only the type, nodes and transformation are checked (see get_reference_differences)
+            values = ["forceBeamColumn", elem.node1.id, elem.node2.id, transf_tag, "..."]
+        
+        reference["element"][int(elem.id)] = get_values(values)
+        
+        if elem.uniform_load is not None:
+            reference["eleLoad"][int(elem.id)] = get_values(["-type", "-beamUniform", round(elem.uniform_load[1], 2), round(elem.uniform_load[2], 2)])
+    
+    return reference
+
+
+def get_canonical_commands(commands):
+    # commands of any backend in one form: numbers as floats, the blocks of tcl as flat sequences (header first),
+    # beamIntegration commands folded into their elements and timeSeries into their patterns (type name), as in tcl
+    
+    canonical = []
+    integrations = dict()
+    time_series = dict()
+    
+    for command in commands:
+        command = (command[0],) + get_values(command[1:])
+        name = command[0]
+        
+        if name == "beamIntegration": # beamIntegration $type $tag $args
+            integrations[command[2]] = (command[1],) + command[3:]
+            continue
+        
+        if name == "timeSeries": # timeSeries $type $tag
+            time_series[command[2]] = command[1]
+            continue
+        
+        if name == "element" and command[1] in ("forceBeamColumn", "dispBeamColumn") and len(command) == 7 and command[6] in integrations:
+            command = command[:6] + integrations[command[6]] # element $type $tag $iNode $jNode $transfTag $integTag
+        
+        elif name == "pattern" and len(command) == 4 and command[3] in time_series:
+            command = command[:3] + (time_series[command[3]],) # pattern Plain $tag $tsTag
+        
+        canonical.append(command)
+    
+    return canonical
+
+
+def get_commands_summary(commands):
+    # (summary like get_model_reference, [repeated definitions]) of canonical commands
+    
+    summary = dict([(name, dict()) for name in reference_commands])
+    repeated = []
+    section_id = None # patch, layer and fiber commands belong to the last section
+    
+    for command in commands:
+        name = command[0]
+        args = command[1:]
+        
+        if name in ("patch", "layer", "fiber"):
+            summary[name][section_id] = summary[name].get(section_id, ()) + (args,)
+            continue
+        
+        if name == "uniaxialMaterial": # uniaxialMaterial $type $tag $args
+            key, values = int(args[1]), (args[0],) + args[2:]
+        elif name == "section": # section Fiber $tag -GJ $GJ
+            section_id = int(args[1])
+            key, values = section_id, (args[0],) + args[2:]
+        elif name == "geomTransf": # geomTransf $type $tag $vecxz
+            key, values = int(args[1]), (args[0],) + args[2:]
+        elif name in ("node", "fix", "mass"):
+            key, values = int(args[0]), args[1:]
+        elif name == "element": # element $type $eleTag $iNode $jNode ...
+            key, values = int(args[1]), (args[0],) + args[2:]
+        elif name == "rigidDiaphragm": # rigidDiaphragm $perpDirn $masterNode $slaveNodes
+            key, values = int(args[1]), (args[0],) + tuple(sorted(args[2:]))
+        elif name == "eleLoad" and len(args) > 1 and args[0] == "-ele": # eleLoad -ele $eleTag -type -beamUniform ...
+            key, values = int(args[1]), args[2:]
+        else:
+            continue
+        
+        if key in summary[name]:
+            repeated.append(name + ' ' + str(key))
+        
+        summary[name][key] = values
+    
+    # sections without patches / layers / fibers
+    for name in ("patch", "layer", "fiber"):
+        for key in summary["section"].keys():
+            summary[name].setdefault(key, ())
+    
+    return summary, repeated
+
+
+def get_tcl_command(interpreter, commands, name):
+    # tcl callback recording the command; the blocks are run after their header (see block_commands)
+    
+    def record_command(*args):
+        
+        if name in block_commands:
+            commands.append((name,) + tuple(args[:-1]))
+            interpreter.eval(args[-1])
+        else:
+            commands.append((name,) + tuple(args))
+        
+        return ""
+    
+    return record_command
+
+
+def get_tcl_trace(text):
+    # every opensees command of a tcl script run by a tcl interpreter, in order: the opensees commands are the ones
+    # tcl does not know (unknown), plus the tcl built-ins opensees redefines (load, file: nothing is done)
+    
+    commands = []
+    interpreter = tk.Tcl()
+    
+    interpreter.createcommand("opensees_command", lambda *args: get_tcl_command(interpreter, commands, args[0])(*args[1:]))
+    
+    for name in block_commands + ["load", "file"]:
+        interpreter.createcommand(name, get_tcl_command(interpreter, commands, name))
+    
+    interpreter.eval("proc unknown args {opensees_command {*}$args}")
+    interpreter.eval(text)
+    
+    return commands
+
+
+def get_reference_differences(summary, reference, max_differences = 10):
+    # messages of the keys missing, extra or different in summary
+    
+    differences = []
+    
+    for name in reference_commands:
+        for key in sorted(set(reference[name].keys()) | set(summary[name].keys())):
+            if key not in summary[name]:
+                differences.append(name + ' ' + str(key) + ": missing")
+            
+            elif key not in reference[name]:
+                differences.append(name + ' ' + str(key) + ": not in the model")
+            
+            elif name == "element" and reference[name][key][-1] == "...": # the values of the reference are the first ones
+                if not are_close(summary[name][key][:len(reference[name][key]) - 1], reference[name][key][:-1]):
+                    differences.append(name + ' ' + str(key) + ": " + str(summary[name][key]) + " instead of " + str(reference[name][key]))
+            
+            elif name in ("patch", "layer", "fiber"):
+                if len(summary[name][key]) != len(reference[name][key]) or not all([are_close(values, reference_values) for values, reference_values in zip(summary[name][key], reference[name][key])]):
+                    differences.append(name + " commands of section " + str(key) + ": " + str(summary[name][key]) + " instead of " + str(reference[name][key]))
+            
+            elif not are_close(summary[name][key], reference[name][key]):
+                differences.append(name + ' ' + str(key) + ": " + str(summary[name][key]) + " instead of " + str(reference[name][key]))
+    
+    return differences[:max_differences]
+
+
+def get_trace_differences(commands, reference_commands, max_differences = 10):
+    # messages of the canonical commands different from the reference ones, in order
+    
+    differences = []
+    
+    for i in range(max(len(commands), len(reference_commands))):
+        command = commands[i] if i < len(commands) else None
+        reference_command = reference_commands[i] if i < len(reference_commands) else None
+        
+        if command is None or reference_command is None or not are_close(command, reference_command):
+            differences.append("command " + str(i) + ": " + str(command) + " instead of " + str(reference_command))
+        
+        if len(differences) >= max_differences:
+            break
+    
+    return differences
+
+
+def check_backends(corpus, cases = None):
+    # {case_id: [differences]} (empty lists when the backends agree), for the in memory command list, the openseespy
+    # script run with emitters.CommandRecorder and the tcl script run by a tcl interpreter:
+    # - the model commands (materials, sections with their patches / layers, transformations, nodes, elements with
+    #   their integration, fixes, masses, diaphragms and gravity loads) against the reference taken from the model
+    # - every command, in order (loads, recorders and analysis commands included, numbers with a tolerance), of the
+    #   command list and the openseespy script against the tcl script run by tcl (without tkinter: against each other)
+    
+    if cases is None:
+        cases = default_cases
+    
+    model_cache = dict()
+    report = dict()
+    
+    for building_id, import_json_obj in corpus:
+        for case in cases:
+            model = mb.build_model(import_json_obj, get_case_config(case), building_id, model_cache)
+            
+            reference = get_model_reference(model)
+            
+            backend_commands = [("commands", get_canonical_commands(mb.emit_commands(model))),
+                                ("openseespy", get_canonical_commands(em.run_script(mb.emit_to_string(model, backend = "openseespy"), em.CommandRecorder()).commands))]
+            
+            if tk is not None:
+                backend_commands.append(("tcl", get_canonical_commands(get_tcl_trace(mb.emit_to_string(model)))))
+            
+            differences = []
+            
+            for backend, commands in backend_commands:
+                summary, repeated = get_commands_summary(commands)
+                
+                for difference in get_reference_differences(summary, reference):
+                    differences.append(backend + ": " + difference)
+            
+                for definition in repeated:
+                    differences.append(backend + ": " + definition + " defined twice")
+            
+            trace_backend, trace = backend_commands[-1]
+            
+            for backend, commands in backend_commands[:-1]:
+                for difference in get_trace_differences(commands, trace):
+                    differences.append(backend + " / " + trace_backend + ": " + difference)
+            
+            report[building_id + '_' + case] = differences
+    
+    return report
+
+
+def print_report(report):
+    
+    for case_id in sorted(report.keys()):
+        print(case_id.ljust(40) + report[case_id]["status"])
+        
+        for diff in report[case_id]["differences"]:
+            print("    " + diff["file"] + ':' + str(diff["line"]))
+            print("        current: " + str(diff["current"]))
+            print("        golden:  " + str(diff["golden"]))
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "backends":
+        report = check_backends(get_corpus(sys.argv[2] if len(sys.argv) > 2 else None))
+        
+        if tk is None:
+            print("no tcl interpreter (tkinter): tcl scripts not checked")
+        
+        for case_id in sorted(report.keys()):
+            print(case_id.ljust(40) + ("different" if len(report[case_id]) > 0 else "equivalent"))
+            
+            for difference in report[case_id]:
+                print("    " + difference)
+        
+        sys.exit(1 if len([r for r in report.values() if len(r) > 0]) > 0 else 0)
+    
+    if len(sys.argv) < 3 or sys.argv[1] not in ("record", "compare"):
+        print("usage: python golden_outputs.py record|compare golden_folder [buildings_folder]")
+        print("       python golden_outputs.py backends [buildings_folder]")
+        sys.exit(1)
+    
+    buildings_folder = sys.argv[3] if len(sys.argv) > 3 else None
+    corpus = get_corpus(buildings_folder)
+    
+    if sys.argv[1] == "record":
+        manifest = record(sys.argv[2], corpus)
+        print("recorded " + str(len(manifest["cases"])) + " cases in " + sys.argv[2])
+    
+    else:
+        report = compare(sys.argv[2], corpus)
+        print_report(report)
+        
+        if len([r for r in report.values() if r["status"] in ("different", "missing")]) > 0:
+            sys.exit(1)
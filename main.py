@@ -2,19 +2,43 @@
 # All units to be input as KN, m, Kg, sec #
 ###########################################
 
-import rhinoscriptsyntax as rs
-from System.Drawing import Color
+try:
+    import rhinoscriptsyntax as rs
+    from System.Drawing import Color
+except ImportError:
+    rs = None # headless run (outside Rhino): run_building can still be imported and called
+    Color = None
 import re
 import math as m
-import processing_importer
 import write_tcl_source as w
-import functions as f
-import material
-import section
+import model_builder as mb
+import metrics as mt
+import memory_tracker as mem
+import sampling_profiler as sp
+import script_archive as sa
+import archive_inputs as ai
+import batch_pipeline as bp
+import checkpoint as cp
+import cost_model as cm
+import archetypes as at
 import element as e
 import node as n
 import os
+import sys
 import json
+import logging
+
+try:
+    import surrogate as sg
+except ImportError:
+    sg = None # numpy not available (IronPython): no surrogate routing
+
+try:
+    from StringIO import StringIO # python 2 / IronPython: takes str
+except ImportError:
+    from io import StringIO
+
+logger = logging.getLogger("main")
 
 # start of building functions
 
@@ -174,12 +198,13 @@ def build_3D_structure(sections, max_storeys = 2, floor_height = 4, spans_y = 2,
 # end of building functions
 
 # Viz & layers
-rs.AddLayer("columns", Color.DarkGreen)
-rs.AddLayer("beams", Color.Red)
-rs.AddLayer("auxbeams", Color.Blue)
-rs.AddLayer("border_beams", Color.Magenta)
-rs.AddLayer("border_auxbeams", Color.Cyan)
-rs.AddLayer("text_dots", Color.Gray, visible = False)
+def setup_layers():
+    rs.AddLayer("columns", Color.DarkGreen)
+    rs.AddLayer("beams", Color.Red)
+    rs.AddLayer("auxbeams", Color.Blue)
+    rs.AddLayer("border_beams", Color.Magenta)
+    rs.AddLayer("border_auxbeams", Color.Cyan)
+    rs.AddLayer("text_dots", Color.Gray, visible = False)
 
 
 # check print
@@ -197,97 +222,184 @@ def check_print(node_network_by_levels):
         print("-------------")
 
 
-def run_building(import_fname, dir, tau_file): 
+def write_script_files(model, output_folder, case_name = None, use_elastic_elements = True, backend = "tcl", written_models = None, archive = None, written_fnames = None):
+    # [(file name, bytes written)], the last one is the script to run
+    # written_models: see model_builder.write_model_files (None: single script file)
+    # archive: script_archive.ScriptArchive receiving the script instead of output_folder
+    # written_fnames: list receiving the names of the files of output_folder before they are written (removed with
+    # remove_written_files if the building fails)
+    
+    if written_fnames is not None and archive is None:
+        if written_models is None:
+            fnames = [mb.get_script_fname(model, case_name, backend)]
+        else:
+            model_fname = mb.get_model_fname(model, use_elastic_elements)
+            fnames = [model_fname, mb.get_sidecar_fname(model_fname), mb.get_script_fname(model, case_name)]
+        
+        written_fnames += [fname for fname in fnames if fname not in written_fnames]
     
-    # dir => 'X' or 'Y'
+    if archive is not None:
+        script_fname = mb.get_script_fname(model, case_name, backend)
+        bytes_written = archive.add(model.building_id, mb.get_case_name(model, case_name), mb.emit_to_string(model, case_name, use_elastic_elements, backend))
+        
+        return [(script_fname, bytes_written)]
+    
+    if written_models is None:
+        fnames = [mb.write_model_file(model, output_folder, case_name, use_elastic_elements, backend)]
+    
+    else:
+        num_models = len(written_models)
+        model_fname, analysis_fname = mb.write_model_files(model, output_folder, case_name, use_elastic_elements, written_models)
+    
+        if len(written_models) > num_models: # the model file was written now
+            fnames = [model_fname, analysis_fname]
+        else:
+            fnames = [analysis_fname]
     
-    num_integ_pts = 5
+    return [(fname, mt.get_file_bytes(output_folder + fname)) for fname in fnames]
+
+
+def remove_written_files(output_folder, fnames):
+    # scripts of a building failing half way (e.g. the X run written, the Y one failed): no orphan files left in
+    # output_folder (scripts already added to an archive stay in its shards, the drivers never reference them)
     
-    grav_total_steps = 40
-    pushover_max_displ = 1.0
-    pushover_increm = 0.001
+    for fname in fnames:
+        if os.path.isfile(output_folder + fname):
+            os.remove(output_folder + fname)
+
+
+def get_run_config(dir, load_cases = None):
+    # settings of the batch (see model_builder.get_default_config), shared by run_building and batch_pipeline.py
     
-    analysis_data = (grav_total_steps, pushover_max_displ, pushover_increm)
+    config = mb.get_default_config()
     
-    hinge_dist_percentage = 10.0 # value in % of hinge length
+    config["dir"] = dir
+    config["load_cases"] = load_cases
     
-    import_file = open(import_fname)
-    import_json_obj = json.load(import_file)
-    max_storeys = f.get_storeys(import_json_obj)
+    config["num_integ_pts"] = 5
     
-    sections_scheme = dict()
+    config["grav_total_steps"] = 40
+    config["pushover_max_displ"] = 1.0
+    config["pushover_increm"] = 0.001
     
-    if max_storeys <= 4:
-        sections_scheme['beam'] = (0.3, 0.5)
-        sections_scheme['auxbeam'] = (0.3, 0.3)
-        sections_scheme['column'] = (0.3, 0.3)
-        
-    elif max_storeys <= 8:
-        sections_scheme['beam'] = (0.36, 0.5)
-        sections_scheme['auxbeam'] = (0.36, 0.36)
-        sections_scheme['column'] = (0.36, 0.36)
+    # triage: pushover_max_displ / pushover_increm of every building from a quick estimate of its period, yield and
+    # ultimate displacements (see triage.py for the options); with skip_ag (design pga in g), buildings expected to stay
+    # elastic are flagged in the metrics, and get no script with skip_flagged
+    config["triage"] = {"enabled": False, "skip_ag": None, "skip_flagged": False}
     
-    else:
-        sections_scheme['beam'] = (0.4, 0.5)
-        sections_scheme['auxbeam'] = (0.4, 0.4)
-        sections_scheme['column'] = (0.4, 0.4)
+    # binary recorders are smaller and faster to read (see recorder_reader.py), dT decimates the records
+    config["recorder_options"] = {"binary": False, "dT": None}
     
+    # members expected to stay elastic are written as elastic elements (single direction files only)
+    # write_baseline: also write the all-fiber model (<id>_<dir>_fiber.tcl) to measure the error 
+    # with recorder_reader.get_capacity_curve_error
+    selective_nonlinearity = {"enabled": False, "dc_threshold": 0.5, "write_baseline": False}
+    config["selective_nonlinearity"] = selective_nonlinearity
     
-    materials = material.create_materials_dict(hinge_dist_percentage)
-    sections, confined_concrete_materials = section.create_sections_dict(materials, sections_scheme, hinge_dist_percentage)
-    print(materials)
+    # None keeps the default fiber meshes, otherwise the coarsest meshes whose moment - curvature 
+    # response is within this tolerance of a fine mesh are used (see fiber_convergence.py)
+    config["fiber_mesh_tolerance"] = None
     
-    materials.update(confined_concrete_materials) # extend the dictionary
-    print("")
-    print(materials)
+    config["hinge_dist_percentage"] = 10.0 # value in % of hinge length
     
-    # max_storeys = 2
+    return config
+
+
+def predict_with_surrogate(surrogate_model, import_fname, import_json_obj, typology, model_cache, predictions_file, max_uncertainty = 0.15):
+    # True if the surrogate (see surrogate.py) is confident enough to replace the analysis of the building:
+    # its bilinear capacity parameters are then written to predictions_file (one json line) and no script is written
+    
+    building_id = ai.get_building_id(import_fname)
+    
+    if import_json_obj is None:
+        import_file = open(import_fname)
+        import_json_obj = json.load(import_file)
+        import_file.close()
     
-    # build structure
-    # total_nodes, total_elements = build_3D_structure(sections, max_storeys, floor_height = 3, spans_y = 2, y_dim = 4)
+    use_surrogate, prediction = sg.route(surrogate_model, at.get_building_features(import_json_obj, building_id, typology, model_cache), max_uncertainty)
     
-    building_id = import_fname.split('/')[-1]
-    building_id = building_id.split('_structure.json')[0]
+    if use_surrogate:
+        prediction["building_id"] = building_id
+        predictions_file.write(json.dumps(prediction, sort_keys = True) + '\n')
+        predictions_file.flush()
     
-    print("\nbuilding id: " + building_id + '\n')
+    return use_surrogate
+
+
+def run_building(import_fname, dir, tau_file, load_cases = None, model_cache = None, metrics_file = None, memory_tracker = None, output_folder = "test-bed/bin/tcl_files/", backend = "tcl", written_models = None, archive = None, import_json_obj = None, typology = None, written_fnames = None): 
+    
+    # dir => 'X' or 'Y'
+    # load_cases => list of (case_name, dir, sign, eccentricity_sign): if given, all the cases are written 
+    # into a single file (one opensees run per building) and dir is ignored
+    # model_cache => dict shared among buildings to reuse the materials / sections and the fiber mesh convergence studies
+    # metrics_file => if given, stage timings and model counters are written as a json line (see metrics.py)
+    # memory_tracker => memory_tracker.MemoryTracker (opt-in): adds the peak memory of every stage to the metrics
+    # backend => "tcl" (OpenSees .tcl file) or "openseespy" (python script), see emitters.py
+    # written_models => dict shared by the runs of a building (tcl only): the model is written once into <id>_model.tcl
+    # and every run gets a small analysis file sourcing it (see model_builder.write_model_files)
+    # archive => script_archive.ScriptArchive: the script is packed into its shards instead of output_folder
+    # import_json_obj => building already parsed (e.g. an archive member, see archive_inputs.py), import_fname only gives its id
+    # typology => folder of the building (e.g. 'H-type'), recorded in the metrics
+    # written_fnames => list receiving the names of the files written into output_folder (see write_script_files)
+    # the model itself is built by model_builder.build_model (library API, see model_builder.py)
+    
+    config = get_run_config(dir, load_cases)
+    
+    building_id = ai.get_building_id(import_fname)
+    
+    logger.info("building id: " + building_id)
+    
+    metrics = mt.Metrics(building_id, dir, memory_tracker)
+    metrics.typology = typology
+    
+    # the metrics are closed (memory tracker sampler stopped) whether the building fails or not
+    try:
+        if import_json_obj is None:
+            with metrics.stage("read"):
+                import_file = open(import_fname)
+                import_json_obj = json.load(import_file)
+                import_file.close()
+    
+        if building_id == '7395302TG3379N_137023998' and dir == 'X' and rs is not None:
+            config["draw"] = True
+    
+        model = mb.build_model(import_json_obj, config, building_id, model_cache, metrics)
+        
+        if model.downgrade_report is not None:
+            logger.info("elastic elements: " + str(model.downgrade_report))
     
-    draw_struct = False
-    if building_id == '7395302TG3379N_137023998' and dir == 'X':
-        draw_struct = True
+        # buildings flagged by the triage as staying elastic need no detailed analysis
+        skip_analysis = model.triage is not None and model.triage["skip"] and config["triage"]["skip_flagged"]
     
-    # all elements are imported with their corresponding loads
-    nodes_dict, elements_dict = processing_importer.import_structure(import_json_obj, sections, max_storeys, draw_struct)
+        if skip_analysis:
+            logger.info(building_id + " flagged by the triage: no script written")
     
-    # get node / elements networks by level (slab)
-    node_network_by_levels = f.extract_node_network(elements_dict.values(), nodes_dict.values(), max_storeys)
+        # write all the data into a .tcl file for opensees
+        with metrics.stage("write"):
+            written_files = []
+        
+            if model.elastic_element_ids is not None and config["selective_nonlinearity"]["write_baseline"] and not skip_analysis:
+                written_files += write_script_files(model, output_folder, dir + "_fiber", False, backend, written_models, archive, written_fnames)
+        
+            if not skip_analysis:
+                written_files += write_script_files(model, output_folder, None, True, backend, written_models, archive, written_fnames)
     
-    # calculate diaphragms data and update nodes with their corresponding diaphragm center
-    diaphragms, nodes_dict = f.calculate_diaphragms(nodes_dict, node_network_by_levels)
+        tcl_fname = written_files[-1][0] if len(written_files) > 0 else None # None: skipped by the triage
     
-    # update nodes with their corresponding masses
-    nodes_dict = f.calculate_nodal_masses(nodes_dict, node_network_by_levels)
+        for fname, bytes_written in written_files:
+            metrics.count("bytes_written", bytes_written)
     
-    # write all the data into a .tcl file for opensees
-    w.write_opensees_file(materials, 
-                          sections, 
-                          nodes_dict, 
-                          elements_dict, 
-                          diaphragms, 
-                          dir, 
-                          num_integ_pts, 
-                          building_id, 
-                          analysis_data, 
-                          max_storeys,
-                          draw_struct)
+        # write tau factors in a separate file
+        tau_file.write(mb.get_tau_line(model) + '\n')
     
-    # only for debugging purposes
-    # check_print(node_network_by_levels)
+    finally:
+        metrics.close()
     
-    import_file.close()
+    if metrics_file is not None:
+        metrics.update_counters(mb.get_model_counters(model))
+        metrics.write(metrics_file)
     
-    # write tau factors in a separate file
-    tau_factor, equivalent_mass = f.get_sdof_data(diaphragms, nodes_dict)
-    tau_file.write(building_id + ",tau_factor:" + str(tau_factor) + ",equivalent_mass:" + str(equivalent_mass) + '\n')
+    return tcl_fname
 
 
 
@@ -298,29 +410,220 @@ def run_building(import_fname, dir, tau_file):
 #import_fname = 'building_structure_results/T-type/0137003TG4403N_137640836_structure.json'
 
 
-# list files in directory
-base_folder = 'building_structure_results'
-folder_names = os.listdir(base_folder)
+if __name__ == "__main__":
+
+    if rs is not None: # headless run: no rhino document to draw into
+        setup_layers()
+
+    # typology folders, or the archive(s) delivered upstream (zip / tar / tar.gz), read member by member
+    # without extracting them (see archive_inputs.py)
+    base_folder = 'building_structure_results'
+
+    # file listing the buildings to generate (one import file name per line), e.g. one of the lists balanced by
+    # predicted generation time of: python cost_model.py split-inputs building_structure_results 8 cost_model.json lists/
+    # (one generator process per list) or the buildings the surrogate is not confident about:
+    # python surrogate.py predict surrogate.pkl features.jsonl predictions.jsonl 0.15 analyse.txt
+    # (None: every building of base_folder)
+    input_list = None
+    
+    # archetype plan (python archetypes.py cluster ...): only its representative and validation buildings are generated,
+    # the other buildings get transferred capacity curves (python archetypes.py transfer ...); None: every building
+    archetype_plan = None
+    
+    # diagnostics (materials, sections, confined concrete) are only shown with logging.DEBUG
+    logging.basicConfig(level = logging.WARNING, format = "%(levelname)s %(name)s: %(message)s")
+
+    # fault tolerance: a failing building is quarantined (copy of its input and diagnostics) and the batch goes on
+    # with the next one; finished buildings are checkpointed, so an interrupted batch started again resumes where
+    # it stopped, appending to the tau factors and metrics of the interrupted run (see checkpoint.py)
+    checkpoint = cp.Checkpoint("test-bed/bin/results/checkpoint.jsonl")
+    quarantine = cp.Quarantine("test-bed/bin/results/quarantine/")
+    output_mode = 'a' if checkpoint.resuming() else 'w'
+
+    if checkpoint.resuming():
+        checkpoint.keep_done_lines("test-bed/bin/results/tau_factors.csv", cp.get_tau_building_id)
+        checkpoint.keep_done_lines("test-bed/bin/results/metrics.jsonl", cp.get_metrics_building_id)
 
-# setup tau_factor file
-tau_file = open("test-bed/bin/results/tau_factors.csv", 'w')
+    # setup tau_factor file
+    tau_file = open("test-bed/bin/results/tau_factors.csv", output_mode)
 
-for i,fold_name in enumerate(folder_names):
-    file_names = os.listdir(base_folder + '/' + fold_name)
+    # stage timings and model counters, one json line per building and direction
+    metrics_file = open("test-bed/bin/results/metrics.jsonl", output_mode)
+
+    # peak memory per stage in the metrics (slower): summarise with python memory_tracker.py metrics.jsonl [node_memory_mb]
+    memory_tracking = False
+    memory_tracker = mem.MemoryTracker() if memory_tracking else None
+
+    # sampling profiler on one of every sample_every buildings: collapsed stacks (flamegraph input) and the top functions
+    # are written to test-bed/bin/results/profile_<pid>.folded / _top.txt (merge several workers with sampling_profiler.py)
+    profiling = {"enabled": False, "sample_every": 50, "interval": 0.005}
+    profiler = sp.SamplingProfiler(profiling["interval"]) if profiling["enabled"] else None
+    building_index = 0
+
+    # "single_direction": one .tcl file per direction (X and Y)
+    # "multi_case": one .tcl file per building running +X, -X, +Y, -Y and accidental eccentricity pushovers
+    emission_mode = "single_direction"
+
+    # "tcl": .tcl files run with OpenSees, "openseespy": .py files run with python (see emitters.py)
+    # (the batch drivers below are only written for tcl files)
+    script_backend = "tcl"
+    
+    # tcl only: one model file per building shared by its analysis files, which are small and can be re-emitted alone
+    # after changing the analysis parameters with model_builder.rewrite_analysis_files (no model is rebuilt)
+    split_model_files = False
+    
+    # pack the scripts into indexed tar shards (deduplicated by content) instead of one file per building and direction;
+    # the runner streams them with: python script_archive.py extract test-bed/bin/tcl_archive/ building_id X | OpenSees
+    # (single script files only, no batch drivers)
+    archive_scripts = False
+    archive = sa.ScriptArchive("test-bed/bin/tcl_archive/") if archive_scripts else None
+    
+    # pipeline mode: reader threads, compute workers and writer threads joined by bounded queues (see batch_pipeline.py),
+    # the utilisation of every stage is printed at the end to find the bottleneck
+    pipeline = {"enabled": False, "readers": 1, "workers": 2, "writers": 1, "queue_size": 16}
+    
+    # surrogate routing (serial loop, headless python with numpy only): buildings predicted by the surrogate with a relative
+    # uncertainty below max_uncertainty are not generated, their bilinear capacity parameters go to
+    # surrogate_predictions.jsonl instead; from Rhino, route with the input_list of surrogate.py predict (see above);
+    # train the surrogate on completed pushovers: python surrogate.py train features.jsonl results_folder X surrogate.pkl
+    surrogate_routing = {"enabled": False, "model": "test-bed/bin/results/surrogate.pkl", "max_uncertainty": 0.15}
+    
+    if surrogate_routing["enabled"] and sg is None:
+        raise ImportError("surrogate routing needs numpy (surrogate.py), not available in this interpreter: "
+                          "use the input_list written by python surrogate.py predict instead")
+    
+    surrogate_model = sg.load_surrogate(surrogate_routing["model"]) if surrogate_routing["enabled"] else None
+    predictions_file = open("test-bed/bin/results/surrogate_predictions.jsonl", output_mode) if surrogate_model is not None else None
+    
+    # number of buildings run by each batch driver (i.e. by each opensees process)
+    batch_chunk_size = 20
+
+    # balanced batch drivers instead of chunks of batch_chunk_size: the scripts are partitioned by their opensees runtime
+    # predicted by the cost model (longest first), with a job array manifest and an sbatch template (see cost_model.py);
+    # fit the model on past runs: python cost_model.py fit metrics.jsonl test-bed/bin/results/status/ cost_model.json
+    # num_chunks None: chunks of about target_chunk_seconds
+    load_balancing = {"enabled": False, "cost_model": "test-bed/bin/results/cost_model.json", "num_chunks": None, "target_chunk_seconds": 600.0}
+    
+    tcl_fnames = []
+    
+    # materials / sections and fiber mesh studies shared among buildings with the same sections scheme
+    model_cache = dict()
+        
+    inputs = ai.iter_inputs(base_folder)
     
-    for j,fname in enumerate(file_names):
-        if i <30000000000 and j<30000000000:
-            dir = 'X' # 'X' or 'Y'
-            run_building(base_folder + '/' + fold_name + '/' + fname, dir, tau_file)
-            tau_file.flush()
+    if input_list is not None:
+        input_file = open(input_list)
+        listed_fnames = set([line.strip() for line in input_file if line.strip()])
+        input_file.close()
+        
+        inputs = (building for building in inputs if building[1] in listed_fnames)
+    
+    if archetype_plan is not None:
+        plan_file = open(archetype_plan)
+        analysed_ids = set(json.load(plan_file)["analyse"])
+        plan_file.close()
+        
+        inputs = (building for building in inputs if ai.get_building_id(building[1]) in analysed_ids)
+    
+    if pipeline["enabled"]:
+        # reader threads --> compute workers --> writer threads (no profiling / split model files / baselines)
+        cases = [(None, w.get_default_load_cases())] if emission_mode == "multi_case" else [('X', None), ('Y', None)]
+        
+        tcl_fnames, batch_pipeline = bp.run_batch_pipeline(inputs, get_run_config, cases, tau_file, metrics_file,
+                                                           backend = script_backend, archive = archive,
+                                                           num_readers = pipeline["readers"], num_workers = pipeline["workers"],
+                                                           num_writers = pipeline["writers"], queue_size = pipeline["queue_size"],
+                                                           checkpoint = checkpoint, quarantine = quarantine)
+        
+        print(bp.format_utilisation(batch_pipeline))
+    
+    else:
+        for typology, import_fname, import_json_obj in inputs:
+            if checkpoint.is_done(import_fname):
+                continue
             
-            dir = 'Y'
-            run_building(base_folder + '/' + fold_name + '/' + fname, dir, tau_file)
-            tau_file.flush()
+            profile_building = profiler is not None and building_index % profiling["sample_every"] == 0
+            building_index += 1
             
-tau_file.close()
+            if profile_building:
+                profiler.start()
+            
+            written_models = dict() if split_model_files else None
+
+            # the tau factors and metrics of the building are kept until all its runs are done: a building failing
+            # half way leaves nothing behind but its quarantine files
+            building_tau_file = StringIO()
+            building_metrics_file = StringIO()
+            building_fnames = []
+            building_written_fnames = [] # every file of the building, removed if it fails
+            
+            try:
+                if surrogate_model is not None and predict_with_surrogate(surrogate_model, import_fname, import_json_obj, typology, model_cache, predictions_file, surrogate_routing["max_uncertainty"]):
+                    logger.info(ai.get_building_id(import_fname) + " routed to the surrogate")
+                
+                elif emission_mode == "multi_case":
+                    building_fnames.append(run_building(import_fname, None, building_tau_file, w.get_default_load_cases(), model_cache, building_metrics_file, memory_tracker, backend = script_backend, written_models = written_models, archive = archive, import_json_obj = import_json_obj, typology = typology, written_fnames = building_written_fnames))
+                
+                else:
+                    dir = 'X' # 'X' or 'Y'
+                    building_fnames.append(run_building(import_fname, dir, building_tau_file, None, model_cache, building_metrics_file, memory_tracker, backend = script_backend, written_models = written_models, archive = archive, import_json_obj = import_json_obj, typology = typology, written_fnames = building_written_fnames))
+                    
+                    dir = 'Y'
+                    building_fnames.append(run_building(import_fname, dir, building_tau_file, None, model_cache, building_metrics_file, memory_tracker, backend = script_backend, written_models = written_models, archive = archive, import_json_obj = import_json_obj, typology = typology, written_fnames = building_written_fnames))
+            
+            except Exception as error: # errors.SimrisError on bad input, anything else is a bug: quarantined alike
+                quarantine.add(ai.get_building_id(import_fname), import_fname, import_json_obj, error, sys.exc_info()[2], "build", typology)
+                remove_written_files("test-bed/bin/tcl_files/", building_written_fnames)
+                checkpoint.quarantined(import_fname, ai.get_building_id(import_fname))
+            
+            else:
+                tau_file.write(building_tau_file.getvalue())
+                tau_file.flush()
+                metrics_file.write(building_metrics_file.getvalue())
+                metrics_file.flush()
+                
+                building_fnames = [fname for fname in building_fnames if fname is not None] # skipped by the triage
+                checkpoint.done(import_fname, ai.get_building_id(import_fname), building_fnames)
+                tcl_fnames += building_fnames
+            
+            finally:
+                if profile_building:
+                    profiler.stop()
+    
+    tau_file.close()
+    metrics_file.close()
+    
+    if predictions_file is not None:
+        predictions_file.close()
+    
+    # every building done: the next batch starts from scratch
+    quarantined = checkpoint.get_quarantined()
+    tcl_fnames = checkpoint.get_script_fnames() # including the buildings of the interrupted runs
+    checkpoint.complete()
+    checkpoint.close()
+    
+    if len(quarantined) > 0:
+        print(str(len(quarantined)) + " buildings quarantined, see " + quarantine.folder + " (*_diagnostics.json)")
+    
+    if archive is not None:
+        archive.close()
 
-rs.EnableRedraw(True)
+    if profiler is not None:
+        profile_fname = "test-bed/bin/results/profile_" + str(os.getpid())
+        profiler.write_collapsed(profile_fname + ".folded")
 
+        top_file = open(profile_fname + "_top.txt", 'w')
+        top_file.write(sp.format_top_functions(profiler.stacks) + '\n')
+        top_file.close()
 
+    # write the batch drivers (run them from test-bed/bin: OpenSees tcl_files/batch_0001.tcl)
+    if script_backend == "tcl" and archive is None:
+        if load_balancing["enabled"]:
+            cm.write_balanced_batch_drivers(tcl_fnames, "test-bed/bin/results/metrics.jsonl", load_balancing["cost_model"],
+                                            load_balancing["num_chunks"], load_balancing["target_chunk_seconds"])
+        
+        else:
+            w.write_batch_drivers(tcl_fnames, batch_chunk_size)
 
+    if rs is not None:
+        rs.EnableRedraw(True)
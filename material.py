@@ -3,11 +3,14 @@
 ###########################################
 
 import sys
+import logging
 sys.path.append(r"materials")
 import steel02_A400S_corrugated, steel02_A400S_non_corrugated
 import concrete01_HA175, concrete01_HA25, concrete04_HA175, concrete04_HA25
 import confined_concrete_calculator as ccc
 
+logger = logging.getLogger(__name__)
+
 class Material:
     def __init__(self, id, name, description, type, properties, material_string):
         self.id = id
@@ -88,7 +91,7 @@ def create_confined_concrete_material(section, material_id, hinge_dist_percentag
     confined_concrete_material.properties["ec"] = -ecc # minus sign to be consistent with criteria
     
     Esec = abs(f_cc / ecc) # Mander (secant E mod)
-    print("Esec: " + str(Esec))
+    logger.debug("Esec: " + str(Esec))
     
     Asx = 2 * section.hoop_scheme["area_bar"] # (m2) total area of transverse reinforcement bar in X direction (we assume 2 bars in each direction)
     Asy = Asx # (m2) we assume same transverse reinforcement in X and Y
@@ -108,8 +111,7 @@ def create_confined_concrete_material(section, material_id, hinge_dist_percentag
     Ec = unconfined_concrete_material.properties["e_mod"] / 1000.0 # Mander's equations are in MPa
     E0 = section.materials["steel"].properties["e_mod"] / 1000.0 # Mander's equations are in MPa
     
-    print("Ec: " + str(Ec))
-    print("E0: " + str(E0))
+    logger.debug("Ec: " + str(Ec) + ", E0: " + str(E0))
     
     section_values = Ec, E0, eco, ecc, f_cc, f_co, Esec, ro_s, ro_cc
     
@@ -122,8 +124,7 @@ def create_confined_concrete_material(section, material_id, hinge_dist_percentag
     # thus, it is better to specify ecu as a percentage of the hinge distance because in reality, 
     # it is as though we were modeling 2 short beams, and this ecu is the ecu value for each of them.
     
-    print("base fck: " + str(unconfined_concrete_material.properties["fck"]))
-    print("f_cc: " + str(f_cc) + "\n")
+    logger.debug("base fck: " + str(unconfined_concrete_material.properties["fck"]) + ", f_cc: " + str(f_cc))
     
     if confined_concrete_material.type == "concrete04":
         confined_concrete_material.material_string = rewrite_concrete04_string(confined_concrete_material)
@@ -48,7 +48,7 @@ def load_material(material_id):
                                                 "steel02_A400S_non_corrugated",
                                                 "uniaxial Giuffre-Menegotto-Pinto steel material object with isotropic strain hardening",
                                                 "steel02",
-                                                {"fy": fy, "fu": fu, "e_mod": E0},
+                                                {"fy": fy, "fu": fu, "e_mod": E0, "b": b},
                                                 material_string
                                                )
     
@@ -0,0 +1,219 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Opt-in memory tracking of run_building (see metrics.Metrics):
+# - python heap traced with tracemalloc (python 3 only, slows down allocation heavy stages)
+# - process resident memory (RSS) sampled by a background thread (linux /proc, IronPython working set)
+# peaks are recorded per stage and per building, and summarised by element count to size the batch workers
+#
+# usage: python memory_tracker.py metrics.jsonl [node_memory_mb]
+
+import os
+import sys
+import threading
+
+try:
+    import tracemalloc # python 3 only
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource # unix only
+except ImportError:
+    resource = None
+
+import metrics as mt
+
+
+MB = 1024.0 * 1024.0
+
+
+def get_rss_mb():
+    # current resident memory of the process (MB), None if it cannot be measured
+    
+    if os.path.isfile("/proc/self/statm"):
+        statm = open("/proc/self/statm")
+        resident_pages = int(statm.read().split()[1])
+        statm.close()
+        
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / MB
+    
+    if sys.platform == "cli":
+        import System # IronPython
+        return System.Diagnostics.Process.GetCurrentProcess().WorkingSet64 / MB
+    
+    if resource is not None:
+        # peak (not current) resident memory: KB on linux, bytes on mac
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / MB if sys.platform == "darwin" else max_rss / 1024.0
+    
+    return None
+
+
+class MemoryTracker:
+    def __init__(self, trace_python = True, sample_interval = 0.05):
+        self.trace_python = trace_python and tracemalloc is not None
+        self.sample_interval = sample_interval # seconds between RSS samples
+        self.peak_rss_mb = None # peak of the current stage
+        self.started_tracing = False
+        self.sampler = None
+        self.stop_event = None
+    
+    
+    def start(self):
+        # called at the start of a building
+        
+        if self.trace_python and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        
+        self.peak_rss_mb = get_rss_mb()
+        
+        if self.peak_rss_mb is not None:
+            self.stop_event = threading.Event()
+            self.sampler = threading.Thread(target = self.sample_rss)
+            self.sampler.daemon = True
+            self.sampler.start()
+    
+    
+    def stop(self):
+        # called at the end of a building
+        
+        if self.sampler is not None:
+            self.stop_event.set()
+            self.sampler.join()
+            self.sampler = None
+        
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+    
+    
+    def sample_rss(self):
+        
+        while not self.stop_event.wait(self.sample_interval):
+            rss_mb = get_rss_mb()
+            
+            if rss_mb > self.peak_rss_mb:
+                self.peak_rss_mb = rss_mb
+    
+    
+    def begin_stage(self):
+        
+        if self.trace_python and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak() # python >= 3.9, otherwise peaks are cumulative within the building
+        
+        self.peak_rss_mb = get_rss_mb()
+    
+    
+    def end_stage(self):
+        # {"traced_peak_mb", "traced_mb", "rss_peak_mb"} of the stage (None when not measured)
+        
+        stage_memory = {"traced_peak_mb": None, "traced_mb": None, "rss_peak_mb": None}
+        
+        if self.trace_python:
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            stage_memory["traced_mb"] = round(traced / MB, 3)
+            stage_memory["traced_peak_mb"] = round(traced_peak / MB, 3)
+        
+        rss_mb = get_rss_mb()
+        
+        if rss_mb is not None:
+            stage_memory["rss_peak_mb"] = round(max(rss_mb, self.peak_rss_mb), 3)
+        
+        return stage_memory
+
+
+def get_building_peaks(metrics_dict):
+    # (traced peak, rss peak) of a building over all its stages (MB)
+    
+    traced_peaks = []
+    rss_peaks = []
+    
+    for stage_memory in metrics_dict.get("memory", dict()).values():
+        if stage_memory["traced_peak_mb"] is not None:
+            traced_peaks.append(stage_memory["traced_peak_mb"])
+        
+        if stage_memory["rss_peak_mb"] is not None:
+            rss_peaks.append(stage_memory["rss_peak_mb"])
+    
+    traced_peak = max(traced_peaks) if len(traced_peaks) > 0 else None
+    rss_peak = max(rss_peaks) if len(rss_peaks) > 0 else None
+    
+    return traced_peak, rss_peak
+
+
+def summarise_memory(metrics_list, top = 10):
+    # worst offenders (largest peak first) and the peak per 1000 elements, from metrics json lines
+    # (see metrics.load_metrics) written with memory tracking enabled
+    
+    rows = []
+    
+    for metrics_dict in metrics_list:
+        traced_peak, rss_peak = get_building_peaks(metrics_dict)
+        
+        if traced_peak is None and rss_peak is None:
+            continue
+        
+        elements = metrics_dict["counters"].get("elements", 0)
+        peak = traced_peak if traced_peak is not None else rss_peak
+        
+        worst_stage = None
+        worst_stage_peak = None
+        
+        for stage_name, stage_memory in metrics_dict["memory"].items():
+            stage_peak = stage_memory["traced_peak_mb"] if traced_peak is not None else stage_memory["rss_peak_mb"]
+            
+            if worst_stage_peak is None or stage_peak > worst_stage_peak:
+                worst_stage, worst_stage_peak = stage_name, stage_peak
+        
+        rows.append({"building_id": metrics_dict["building_id"],
+                     "dir": metrics_dict["dir"],
+                     "elements": elements,
+                     "traced_peak_mb": traced_peak,
+                     "rss_peak_mb": rss_peak,
+                     "worst_stage": worst_stage,
+                     "mb_per_1000_elements": round(1000.0 * peak / max(elements, 1), 3)})
+    
+    rows.sort(key = lambda row: row["traced_peak_mb"] if row["traced_peak_mb"] is not None else row["rss_peak_mb"], reverse = True)
+    
+    return rows[:top]
+
+
+def get_max_workers(metrics_list, node_memory_mb, safety_factor = 1.5):
+    # number of batch workers fitting in node_memory_mb, assuming every worker may get the worst building
+    # (rss peaks include the interpreter itself; traced peaks are used when no rss was sampled)
+    
+    worst_peak = 0.0
+    
+    for metrics_dict in metrics_list:
+        traced_peak, rss_peak = get_building_peaks(metrics_dict)
+        peak = rss_peak if rss_peak is not None else traced_peak
+        
+        if peak is not None:
+            worst_peak = max(worst_peak, peak)
+    
+    if worst_peak == 0:
+        return None
+    
+    return max(1, int(node_memory_mb / (worst_peak * safety_factor)))
+
+
+if __name__ == "__main__":
+    
+    metrics_list = mt.load_metrics(sys.argv[1])
+    
+    print("building_id".ljust(30) + "dir".rjust(5) + "elements".rjust(10) + "traced MB".rjust(11) + "rss MB".rjust(10) + "MB/1k el".rjust(10) + "  worst stage")
+    
+    for row in summarise_memory(metrics_list):
+        print(row["building_id"].ljust(30) +
+              str(row["dir"]).rjust(5) +
+              str(row["elements"]).rjust(10) +
+              str(row["traced_peak_mb"]).rjust(11) +
+              str(row["rss_peak_mb"]).rjust(10) +
+              str(row["mb_per_1000_elements"]).rjust(10) + '  ' +
+              str(row["worst_stage"]))
+    
+    if len(sys.argv) > 2:
+        print("max workers per node: " + str(get_max_workers(metrics_list, float(sys.argv[2]))))
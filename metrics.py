@@ -0,0 +1,172 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Per building metrics: stage timers and model counters (nodes, elements, fibers, dofs, bytes written),
+# exported as one json line per building / direction, e.g.
+#
+# metrics = Metrics(building_id, 'X')
+# with metrics.stage("import"):
+#     ...
+# metrics.count("elements", len(elements_dict))
+# metrics.close()
+# metrics.write(metrics_file)
+#
+# with a memory_tracker.MemoryTracker the peak memory of every stage is recorded as well
+
+import os
+import json
+import time
+import contextlib
+
+
+class Metrics:
+    def __init__(self, building_id, dir = None, memory_tracker = None):
+        self.building_id = building_id
+        self.dir = dir # 'X', 'Y' or None (multi case files)
+        self.typology = None # e.g. 'H-type' (folder of the building), recorded when known
+        self.triage = None # period, yield / ultimate displacements and pushover range (see triage.py), when run
+        self.stage_names = [] # in order of execution
+        self.timings = dict() # stage name --> seconds
+        self.counters = dict() # counter name --> value
+        self.memory = dict() # stage name --> peak memory (only with a memory tracker)
+        self.memory_tracker = memory_tracker
+        self.start_time = time.time()
+        self.end_time = None
+        
+        if self.memory_tracker is not None:
+            self.memory_tracker.start()
+    
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        # times the block; a stage run more than once is accumulated
+        
+        if name not in self.timings:
+            self.stage_names.append(name)
+            self.timings[name] = 0.0
+        
+        if self.memory_tracker is not None:
+            self.memory_tracker.begin_stage()
+        
+        start = time.time()
+        
+        try:
+            yield self
+        finally:
+            self.timings[name] += time.time() - start
+            
+            if self.memory_tracker is not None:
+                self.record_stage_memory(name, self.memory_tracker.end_stage())
+    
+    
+    def record_stage_memory(self, name, stage_memory):
+        # a stage run more than once keeps the largest values
+        
+        if name not in self.memory:
+            self.memory[name] = stage_memory
+            return
+        
+        for key, value in stage_memory.items():
+            if value is not None and (self.memory[name][key] is None or value > self.memory[name][key]):
+                self.memory[name][key] = value
+    
+    
+    def close(self):
+        # end of the building: stops the total timer and the memory tracker
+        
+        self.end_time = time.time()
+        
+        if self.memory_tracker is not None:
+            self.memory_tracker.stop()
+    
+    
+    def count(self, name, value = 1):
+        
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    
+    def update_counters(self, counters):
+        
+        for name, value in counters.items():
+            self.count(name, value)
+    
+    
+    def to_dict(self):
+        
+        end_time = self.end_time if self.end_time is not None else time.time()
+        
+        metrics_dict = {"building_id": self.building_id,
+                        "dir": self.dir,
+                        "total_time": round(end_time - self.start_time, 6),
+                        "timings": dict([(name, round(self.timings[name], 6)) for name in self.stage_names]),
+                        "counters": self.counters}
+        
+        if self.typology is not None:
+            metrics_dict["typology"] = self.typology
+        
+        if self.triage is not None:
+            metrics_dict["triage"] = self.triage
+        
+        if self.memory_tracker is not None:
+            metrics_dict["memory"] = self.memory
+        
+        return metrics_dict
+    
+    
+    def write(self, outf):
+        # one json line
+        
+        outf.write(json.dumps(self.to_dict(), sort_keys = True) + '\n')
+
+
+def get_model_counters(nodes_dict, elements_dict, diaphragms, num_integ_pts, elastic_element_ids = None, elem_model_type = "hinge_integration"):
+    # size of the opensees model: nodes (diaphragm master nodes included), elements,
+    # fibers (fibers of every integration point of the nonlinear elements) and free dofs
+    # elem_model_type: as written by write_tcl_source.write_elements (sets the integration points per element)
+    
+    if elastic_element_ids is None:
+        elastic_element_ids = set()
+    
+    dofs = 0
+    
+    for node in nodes_dict.values():
+        dofs += 6 - sum(node.fixes)
+    
+    dofs += 3 * len(diaphragms) # master nodes: fix 0 0 1 1 1 0
+    
+    fibers = 0
+    
+    for elem in elements_dict.values():
+        if elem.id not in elastic_element_ids:
+            fibers += elem.section.get_num_fibers() * elem.get_num_integ_pts(elem_model_type, num_integ_pts)
+    
+    return {"nodes": len(nodes_dict) + len(diaphragms),
+            "elements": len(elements_dict),
+            "elastic_elements": len(elastic_element_ids),
+            "fibers": fibers,
+            "dofs": dofs}
+
+
+def get_file_bytes(fname):
+    
+    if not os.path.isfile(fname):
+        return 0
+    
+    return os.path.getsize(fname)
+
+
+def load_metrics(fname):
+    # list of dicts (see Metrics.to_dict), one per line of the file
+    
+    metrics = []
+    
+    inf = open(fname)
+    
+    for line in inf:
+        if line.strip():
+            metrics.append(json.loads(line))
+    
+    inf.close()
+    
+    return metrics
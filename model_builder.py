@@ -0,0 +1,495 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Library API of the generator (headless, no Rhino needed unless config["draw"] is True):
+#
+# model = build_model(import_json_obj, {"dir": 'X'}, building_id)  # in memory, nothing is written
+# emit(model, sink)                                                # sink: any object with write / flush
+# commands = emit_commands(model)                                  # openseespy command tuples (see emitters.py)
+# tcl_fname = write_model_file(model, output_folder)               # only when a file is wanted (backend "tcl" or "openseespy")
+#
+# or split into a model file shared by all the analyses of the building and small analysis files sourcing it:
+#
+# model_fname, tcl_fname = write_model_files(model, output_folder, written_models = written_models)
+# rewrite_analysis_files(output_folder, {"pushover_increm": 0.002})  # new analysis parameters, models untouched
+#
+# There is no global state: models can be built concurrently from threads or processes. The optional cache
+# dict (materials / sections and fiber mesh studies per sections scheme) can be shared among builds
+
+import os
+import json
+
+import processing_importer
+import write_tcl_source as w
+import selective_nonlinearity as sn
+import triage as tr
+import fiber_convergence as fc
+import functions as f
+import material
+import section
+import metrics as mt
+import emitters as em
+
+try:
+    from StringIO import StringIO # python 2 / IronPython: accepts str
+except ImportError:
+    from io import StringIO
+
+
+class Model:
+    def __init__(self, building_id, config, max_storeys, materials, sections, nodes_dict, elements_dict, diaphragms):
+        self.building_id = building_id
+        self.config = config # see get_default_config
+        self.max_storeys = max_storeys
+        self.materials = materials
+        self.sections = sections
+        self.nodes_dict = nodes_dict
+        self.elements_dict = elements_dict
+        self.diaphragms = diaphragms
+        self.elastic_element_ids = None # ids of the elements written as elastic (see selective_nonlinearity.py)
+        self.downgrade_report = None
+        self.triage = None # see triage.triage_model
+        self.tau_factor = None
+        self.equivalent_mass = None
+    
+    
+    def get_analysis_data(self):
+        
+        return get_analysis_data(self.config)
+
+
+def get_analysis_data(config):
+    
+    return (config["grav_total_steps"], config["pushover_max_displ"], config["pushover_increm"])
+
+
+def get_default_config():
+    # same defaults as the batch (main.run_building)
+    
+    return {"dir": 'X', # 'X' or 'Y'
+            "load_cases": None, # list of (case_name, dir, sign, eccentricity_sign): one multi case script, dir is ignored
+            "num_integ_pts": 5,
+            "grav_total_steps": 40,
+            "pushover_max_displ": 1.0,
+            "pushover_increm": 0.001,
+            "hinge_dist_percentage": 10.0, # value in % of hinge length
+            "sections_scheme": None, # {section type: (width, height)}, None: depends on the number of storeys
+            "recorder_options": {"binary": False, "dT": None}, # see write_tcl_source.get_recorder_output_string
+            "selective_nonlinearity": {"enabled": False, "dc_threshold": 0.5}, # see selective_nonlinearity.py
+            "fiber_mesh_tolerance": None, # see fiber_convergence.py
+            "triage": {"enabled": False}, # pushover range per building, see triage.py
+            "draw": False} # draw the structure and the loads in Rhino
+
+
+def get_sections_scheme(max_storeys):
+    
+    sections_scheme = dict()
+    
+    if max_storeys <= 4:
+        sections_scheme['beam'] = (0.3, 0.5)
+        sections_scheme['auxbeam'] = (0.3, 0.3)
+        sections_scheme['column'] = (0.3, 0.3)
+    
+    elif max_storeys <= 8:
+        sections_scheme['beam'] = (0.36, 0.5)
+        sections_scheme['auxbeam'] = (0.36, 0.36)
+        sections_scheme['column'] = (0.36, 0.36)
+    
+    else:
+        sections_scheme['beam'] = (0.4, 0.5)
+        sections_scheme['auxbeam'] = (0.4, 0.4)
+        sections_scheme['column'] = (0.4, 0.4)
+    
+    return sections_scheme
+
+
+def get_materials_and_sections(sections_scheme, hinge_dist_percentage, fiber_mesh_tolerance = None, cache = None):
+    # materials (confined concretes included) and sections, reused from cache when given
+    # (they are not modified by the rest of the pipeline, so they can be shared among models)
+    
+    cache_key = "sections_" + str(sorted(sections_scheme.items())) + '_' + str(hinge_dist_percentage) + '_' + str(fiber_mesh_tolerance)
+    
+    if cache is not None and cache_key in cache:
+        return cache[cache_key]
+    
+    materials = material.create_materials_dict(hinge_dist_percentage)
+    
+    patches_schemes = None
+    if fiber_mesh_tolerance is not None:
+        patches_schemes = fc.get_patches_schemes(materials, sections_scheme, hinge_dist_percentage, fiber_mesh_tolerance, cache)
+    
+    sections, confined_concrete_materials = section.create_sections_dict(materials, sections_scheme, hinge_dist_percentage, patches_schemes)
+    
+    materials.update(confined_concrete_materials) # extend the dictionary
+    
+    if cache is not None:
+        cache[cache_key] = (materials, sections)
+    
+    return materials, sections
+
+
+def build_model(import_json_obj, config = None, building_id = "building", cache = None, metrics = None):
+    # import_json_obj: [nodes, elements] (see processing_importer.import_structure)
+    # config: overrides of get_default_config
+    # metrics: optional metrics.Metrics timing every stage
+    
+    full_config = get_default_config()
+    
+    if config is not None:
+        full_config.update(config)
+    
+    config = full_config
+    
+    if metrics is None:
+        metrics = mt.Metrics(building_id, config["dir"])
+    
+    max_storeys = f.get_storeys(import_json_obj)
+    
+    sections_scheme = config["sections_scheme"]
+    
+    if sections_scheme is None:
+        sections_scheme = get_sections_scheme(max_storeys)
+    
+    with metrics.stage("sections"):
+        materials, sections = get_materials_and_sections(sections_scheme, config["hinge_dist_percentage"], config["fiber_mesh_tolerance"], cache)
+    
+    # all elements are imported with their corresponding loads
+    with metrics.stage("import"):
+        nodes_dict, elements_dict = processing_importer.import_structure(import_json_obj, sections, max_storeys, config["draw"])
+    
+    # get node / elements networks by level (slab)
+    with metrics.stage("network"):
+        node_network_by_levels = f.extract_node_network(elements_dict.values(), nodes_dict.values(), max_storeys)
+    
+    # calculate diaphragms data and update nodes with their corresponding diaphragm center
+    with metrics.stage("diaphragms"):
+        diaphragms, nodes_dict = f.calculate_diaphragms(nodes_dict, node_network_by_levels)
+    
+    # update nodes with their corresponding masses
+    with metrics.stage("masses"):
+        nodes_dict = f.calculate_nodal_masses(nodes_dict, node_network_by_levels)
+    
+    model = Model(building_id, config, max_storeys, materials, sections, nodes_dict, elements_dict, diaphragms)
+    
+    # members expected to stay elastic (single direction scripts only)
+    if config["selective_nonlinearity"]["enabled"] and config["load_cases"] is None:
+        with metrics.stage("selection"):
+            model.elastic_element_ids, model.downgrade_report = sn.select_elastic_elements(elements_dict.values(), config["dir"], config["selective_nonlinearity"]["dc_threshold"])
+    
+    with metrics.stage("tau"):
+        model.tau_factor, model.equivalent_mass = f.get_sdof_data(diaphragms, nodes_dict)
+    
+    # pushover target displacement and step of this building instead of the fixed ones
+    if config["triage"]["enabled"]:
+        with metrics.stage("triage"):
+            model.triage = tr.triage_model(model, config["triage"])
+        
+        config["pushover_max_displ"] = model.triage["pushover_max_displ"]
+        config["pushover_increm"] = model.triage["pushover_increm"]
+        metrics.triage = model.triage
+    
+    return model
+
+
+def get_case_name(model, case_name = None):
+    
+    return get_config_case_name(model.config, case_name)
+
+
+def get_config_case_name(config, case_name = None):
+    
+    if config["load_cases"] is not None:
+        return "cases"
+    
+    if case_name is None:
+        return config["dir"]
+    
+    return case_name
+
+
+def get_tcl_fname(model, case_name = None):
+    
+    return get_script_fname(model, case_name, "tcl")
+
+
+def get_script_fname(model, case_name = None, backend = "tcl"):
+    
+    return model.building_id + '_' + get_case_name(model, case_name) + em.script_extensions[backend]
+
+
+def emit(model, sink, case_name = None, use_elastic_elements = True):
+    # writes the opensees script of the model into sink (any object with write / flush, e.g. an emitter of emitters.py)
+    # case_name: tag of the recorder names (single direction scripts, defaults to the direction)
+    # use_elastic_elements: False writes every element as a fiber element (e.g. a baseline for selective nonlinearity)
+    
+    config = model.config
+    
+    if config["load_cases"] is not None:
+        w.write_opensees_multicase_script(sink,
+                                          model.materials,
+                                          model.sections,
+                                          model.nodes_dict,
+                                          model.elements_dict,
+                                          model.diaphragms,
+                                          config["load_cases"],
+                                          config["num_integ_pts"],
+                                          model.building_id,
+                                          model.get_analysis_data(),
+                                          model.max_storeys,
+                                          config["recorder_options"])
+        return
+    
+    w.write_opensees_script(sink,
+                            model.materials,
+                            model.sections,
+                            model.nodes_dict,
+                            model.elements_dict,
+                            model.diaphragms,
+                            config["dir"],
+                            config["num_integ_pts"],
+                            model.building_id,
+                            model.get_analysis_data(),
+                            model.max_storeys,
+                            config["draw"],
+                            config["recorder_options"],
+                            model.elastic_element_ids if use_elastic_elements else None,
+                            get_case_name(model, case_name))
+
+
+def emit_to_string(model, case_name = None, use_elastic_elements = True, backend = "tcl"):
+    # backend: "tcl" or "openseespy" script
+    
+    sink = StringIO()
+    
+    emitter = em.get_emitter(backend, sink)
+    emit(model, emitter, case_name, use_elastic_elements)
+    emitter.close()
+    
+    return sink.getvalue()
+
+
+def emit_commands(model, case_name = None, use_elastic_elements = True):
+    # in memory openseespy command tuples of the script, to be replayed with emitters.replay (no file round trip)
+    
+    emitter = em.CommandListEmitter()
+    emit(model, emitter, case_name, use_elastic_elements)
+    emitter.close()
+    
+    return emitter.commands
+
+
+def write_model_file(model, output_folder, case_name = None, use_elastic_elements = True, backend = "tcl"):
+    # writes output_folder/<building_id>_<case>.tcl (.py with backend "openseespy") and returns the file name
+    
+    script_fname = get_script_fname(model, case_name, backend)
+    
+    outf = open(output_folder + script_fname, 'w')
+    
+    emitter = em.get_emitter(backend, outf)
+    emit(model, emitter, case_name, use_elastic_elements)
+    emitter.close()
+    
+    outf.close()
+    
+    return script_fname
+
+
+def get_model_fname(model, use_elastic_elements = True):
+    # the model file is shared by all the analyses of the building, except when it has elastic elements (they depend on the direction)
+    
+    if use_elastic_elements and model.elastic_element_ids is not None:
+        return model.building_id + '_' + model.config["dir"] + "_elastic_model.tcl"
+    
+    return model.building_id + "_model.tcl"
+
+
+def get_sidecar_fname(model_fname):
+    
+    return model_fname[:-len(".tcl")] + ".json"
+
+
+def get_sidecar(model, model_fname):
+    # what the analysis files of a model file need (see write_analysis_file), written next to it as json
+    
+    return {"building_id": model.building_id,
+            "max_storeys": model.max_storeys,
+            "model_fname": model_fname,
+            "analysis_summary": w.get_analysis_summary(model.nodes_dict, model.diaphragms),
+            "analyses": dict()} # analysis file name --> {"case_name", "dir", "load_cases", "analysis_params"}
+
+
+def write_sidecar(sidecar, output_folder):
+    
+    outf = open(output_folder + get_sidecar_fname(sidecar["model_fname"]), 'w')
+    json.dump(sidecar, outf, sort_keys = True)
+    outf.close()
+
+
+def load_sidecar(fname):
+    
+    inf = open(fname)
+    sidecar = json.load(inf)
+    inf.close()
+    
+    return sidecar
+
+
+def emit_analysis(sidecar, sink, config = None, case_name = None):
+    # analysis script sourcing the model file of the sidecar: recorders, gravitational analysis and pushover(s)
+    # config: overrides of get_default_config (dir / load_cases and the analysis parameters)
+    
+    full_config = get_default_config()
+    
+    if config is not None:
+        full_config.update(config)
+    
+    config = full_config
+    
+    w.write_source_command(sink, sidecar["model_fname"])
+    
+    if config["load_cases"] is not None:
+        w.write_multicase_analysis_script(sink,
+                                          sidecar["building_id"],
+                                          sidecar["analysis_summary"],
+                                          config["load_cases"],
+                                          get_analysis_data(config),
+                                          sidecar["max_storeys"],
+                                          config["recorder_options"])
+        return
+    
+    w.write_analysis_script(sink,
+                            sidecar["building_id"],
+                            sidecar["analysis_summary"],
+                            config["dir"],
+                            get_analysis_data(config),
+                            sidecar["max_storeys"],
+                            config["draw"],
+                            config["recorder_options"],
+                            get_config_case_name(config, case_name))
+
+
+def write_analysis_file(sidecar, output_folder, config = None, case_name = None):
+    # writes output_folder/<building_id>_<case>.tcl (same name as the single file scripts) and returns the file name
+    
+    full_config = get_default_config()
+    
+    if config is not None:
+        full_config.update(config)
+    
+    case_name = get_config_case_name(full_config, case_name)
+    analysis_fname = sidecar["building_id"] + '_' + case_name + ".tcl"
+    
+    outf = open(output_folder + analysis_fname, 'w')
+    emit_analysis(sidecar, outf, full_config, case_name)
+    outf.close()
+    
+    # analysis_params: the parameters of get_analysis_data and the recorder options the file was written with, which
+    # can be per building (e.g. the pushover range of the triage), reapplied by rewrite_analysis_files
+    sidecar["analyses"][analysis_fname] = {"case_name": case_name,
+                                           "dir": full_config["dir"],
+                                           "load_cases": full_config["load_cases"],
+                                           "analysis_params": {"grav_total_steps": full_config["grav_total_steps"],
+                                                               "pushover_max_displ": full_config["pushover_max_displ"],
+                                                               "pushover_increm": full_config["pushover_increm"],
+                                                               "recorder_options": full_config["recorder_options"]}}
+    
+    return analysis_fname
+
+
+def write_model_files(model, output_folder, case_name = None, use_elastic_elements = True, written_models = None):
+    # split output (tcl only): output_folder/<model file> with its json sidecar, written once per building
+    # (see get_model_fname), and the small analysis file output_folder/<building_id>_<case>.tcl sourcing it
+    # written_models: dict shared by the calls of a batch (model file name --> sidecar), so that the other direction
+    # of a building reuses the model file and is added to its sidecar
+    # returns (model file name, analysis file name)
+    
+    if written_models is None:
+        written_models = dict()
+    
+    model_fname = get_model_fname(model, use_elastic_elements)
+    
+    if model_fname not in written_models:
+        outf = open(output_folder + model_fname, 'w')
+        w.write_model_script(outf,
+                             model.materials,
+                             model.sections,
+                             model.nodes_dict,
+                             model.elements_dict,
+                             model.diaphragms,
+                             model.config["num_integ_pts"],
+                             model.elastic_element_ids if use_elastic_elements else None)
+        outf.close()
+        
+        written_models[model_fname] = get_sidecar(model, model_fname)
+    
+    sidecar = written_models[model_fname]
+    
+    analysis_fname = write_analysis_file(sidecar, output_folder, model.config, case_name)
+    write_sidecar(sidecar, output_folder)
+    
+    # the analysis file may have sourced the other model file of the building before (with / without elastic elements)
+    for other_fname in (get_model_fname(model, True), get_model_fname(model, False)):
+        if other_fname != model_fname and other_fname in written_models and analysis_fname in written_models[other_fname]["analyses"]:
+            del written_models[other_fname]["analyses"][analysis_fname]
+            write_sidecar(written_models[other_fname], output_folder)
+    
+    return model_fname, analysis_fname
+
+
+def rewrite_analysis_files(output_folder, config = None):
+    # re-emits every analysis file of output_folder from the sidecars of the model files (e.g. after changing
+    # pushover_increm, grav_total_steps or the recorder options), without rebuilding or rewriting the models
+    # config: analysis parameters (see get_default_config), the directions / load cases are kept from the sidecars and
+    # the parameters not given keep the values each file was written with (analysis_params, e.g. the triage ones)
+    
+    analysis_fnames = []
+    
+    for fname in sorted(os.listdir(output_folder)):
+        if not fname.endswith("_model.json"):
+            continue
+        
+        sidecar = load_sidecar(output_folder + fname)
+        
+        for analysis in list(sidecar["analyses"].values()):
+            case_config = dict(analysis.get("analysis_params", dict())) # sidecars written before analysis_params: defaults
+            
+            if config is not None:
+                case_config.update(config)
+            
+            case_config["dir"] = analysis["dir"]
+            case_config["load_cases"] = analysis["load_cases"]
+            case_config["draw"] = False
+            
+            analysis_fnames.append(write_analysis_file(sidecar, output_folder, case_config, analysis["case_name"]))
+        
+        write_sidecar(sidecar, output_folder)
+    
+    return analysis_fnames
+
+
+def get_tau_line(model):
+    # line of the tau_factors.csv file
+    
+    return model.building_id + ",tau_factor:" + str(model.tau_factor) + ",equivalent_mass:" + str(model.equivalent_mass)
+
+
+def get_model_counters(model):
+    
+    counters = mt.get_model_counters(model.nodes_dict, model.elements_dict, model.diaphragms, model.config["num_integ_pts"], model.elastic_element_ids, w.elem_model_type)
+    counters["storeys"] = model.max_storeys # feature of the cost model (see cost_model.py)
+    
+    return counters
+
+
+def load_building(import_fname):
+    # (building_id, import_json_obj) of a <building_id>_structure.json file
+    
+    building_id = import_fname.replace('\\', '/').split('/')[-1]
+    building_id = building_id.split('_structure.json')[0]
+    
+    import_file = open(import_fname)
+    import_json_obj = json.load(import_file)
+    import_file.close()
+    
+    return building_id, import_json_obj
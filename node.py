@@ -3,7 +3,10 @@
 ###########################################
 
 
-import rhinoscriptsyntax as rs
+try:
+    import rhinoscriptsyntax as rs
+except ImportError:
+    rs = None # headless run (outside Rhino): drawing is not available
 
 class Node:
     def __init__(self, id, coords, fixes, mass):
@@ -1,11 +1,14 @@
-import rhinoscriptsyntax as rs
+try:
+    import rhinoscriptsyntax as rs
+except ImportError:
+    rs = None # headless run (outside Rhino): drawing is not available
 import json
 import node as n
 import element as e
 
 
 def import_structure(json_obj, sections, max_level, bool_draw):
-    rs.EnableRedraw(False)
+    if bool_draw: rs.EnableRedraw(False)
     levels_array = []
     
     nodes = json_obj[0]
@@ -2,6 +2,9 @@
 # All units to be input as KN, m, Kg, sec #
 ###########################################
 
+import errors as er
+
+
 class Rebar_Layer:
     def __init__(self, material, section, num_bars, area_bar, cover, location):
         self.material = material
@@ -32,8 +35,7 @@ class Rebar_Layer:
             
         elif(location == "RIGHT"):
             if self.num_bars < 2:
-                print("Right rebar layer must have at least 2 bars")
-                raise BaseException
+                raise er.RebarLayoutError("Right rebar layer must have at least 2 bars")
             
             y_offset = (self.section.height - 2 * cover) / (self.num_bars + 1)
             
@@ -42,8 +44,7 @@ class Rebar_Layer:
             
         elif(location == "LEFT"):
             if self.num_bars < 2:
-                print("Left rebar layer must have at least 2 bars")
-                raise BaseException
+                raise er.RebarLayoutError("Left rebar layer must have at least 2 bars")
             
             y_offset = (self.section.height - 2 * cover) / (self.num_bars + 1)
             
@@ -0,0 +1,151 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Post-processing of the opensees recorder files (runs outside Rhino, requires numpy)
+# Binary recorders (-binary) are raw little-endian doubles, one row per recorded step and no header, every row ended
+# by a '\n' byte (opensees BinaryFileStream): they are mapped with np.memmap so reading them costs no parsing and no copy
+#
+# Decimation every N steps (every): opensees recorders can only be thinned by -dT, which during the pushover is an
+# interval of load factor, so the step stride is applied when reading (a strided view of the binary files, no copy)
+#
+# usage: python recorder_reader.py check recorder.bin recorder.out num_columns
+#        (round trip of the binary reader against the text file of the same recorder of an opensees run)
+
+import os
+import sys
+import numpy as np
+
+import errors as er
+
+
+def get_recorder_num_columns(num_nodes, num_dofs = 1, time = True):
+    # number of columns of a Node recorder: optional time column + one column per node and dof
+    
+    return int(time) + num_nodes * num_dofs
+
+
+def get_binary_row_dtype(num_columns):
+    # one row of a binary recorder: the doubles, then the '\n' written by opensees after every record
+    
+    return np.dtype([('v', '<f8', (num_columns,)), ('nl', 'S1')])
+
+
+def load_binary_recorder(fname, num_columns, mode = 'r', every = 1):
+    # zero-copy view (num_steps x num_columns) of a binary recorder file, one row out of every steps
+    
+    row_dtype = get_binary_row_dtype(num_columns)
+    num_steps = os.path.getsize(fname) // row_dtype.itemsize # a crashed run may leave an incomplete last row
+    
+    if num_steps == 0:
+        return np.zeros((0, num_columns))
+    
+    rows = np.memmap(fname, dtype = row_dtype, mode = mode, shape = (num_steps,))
+    
+    # a wrong number of columns puts the separators off the end of the rows
+    if rows['nl'][0] != b'\n' or rows['nl'][-1] != b'\n':
+        raise er.RecorderError("not a binary recorder of " + str(num_columns) + " columns: " + fname)
+    
+    return rows['v'][::every]
+
+
+def load_text_recorder(fname, every = 1):
+    
+    data = np.loadtxt(fname, ndmin = 2)
+    
+    return data[::every]
+
+
+def load_recorder(fname, num_columns = None, every = 1):
+    # .bin files need the number of columns (see get_recorder_num_columns), .out files are parsed as text
+    # every: one step out of every steps (the first one always kept)
+    
+    if fname.endswith(".bin"):
+        if num_columns is None:
+            raise er.RecorderError("the number of columns is needed to read a binary recorder: " + fname)
+        
+        return load_binary_recorder(fname, num_columns, every = every)
+    
+    return load_text_recorder(fname, every)
+
+
+def get_recorder_fname(results_folder, recorder_type, building_id, case_name, max_storeys, binary = False):
+    # recorder_type: "control_node", "slabs" or "basal_nodes" (see write_tcl_source.write_recorders)
+    
+    sub_folders = {"control_node": "displacement", "slabs": "slabs_displacement", "basal_nodes": "shear"}
+    
+    extension = ".bin" if binary else ".out"
+    
+    return (results_folder + sub_folders[recorder_type] + '/' +
+            building_id + '_' + case_name + '_L' + str(max_storeys) +
+            '_' + recorder_type + extension)
+
+
+def load_capacity_curve(results_folder, building_id, case_name, max_storeys, num_basal_nodes, binary = False, every = 1):
+    # capacity curve of a pushover: control node displacement vs base shear (sum of the basal reactions)
+    
+    displ_fname = get_recorder_fname(results_folder, "control_node", building_id, case_name, max_storeys, binary)
+    shear_fname = get_recorder_fname(results_folder, "basal_nodes", building_id, case_name, max_storeys, binary)
+    
+    displ_data = load_recorder(displ_fname, get_recorder_num_columns(1), every)
+    shear_data = load_recorder(shear_fname, get_recorder_num_columns(num_basal_nodes), every)
+    
+    # both recorders write the same steps, but a crashed run may leave one of them a row shorter
+    num_steps = min(displ_data.shape[0], shear_data.shape[0])
+    
+    displacement = np.abs(displ_data[:num_steps, 1])
+    base_shear = np.abs(shear_data[:num_steps, 1:].sum(axis = 1)) # reactions oppose the pushover loads
+    
+    return displacement, base_shear
+
+
+
+def get_capacity_curve_error(curve, reference_curve):
+    # relative error of a capacity curve against a reference one (e.g. selective nonlinearity vs all-fiber model):
+    # max and mean base shear differences over the common displacement range, relative to the reference peak shear
+    
+    displacement, base_shear = curve
+    ref_displacement, ref_base_shear = reference_curve
+    
+    max_common_displ = min(displacement.max(), ref_displacement.max())
+    
+    mask = ref_displacement <= max_common_displ
+    
+    order = np.argsort(displacement)
+    interp_shear = np.interp(ref_displacement[mask], displacement[order], base_shear[order])
+    
+    abs_error = np.abs(interp_shear - ref_base_shear[mask])
+    ref_peak = ref_base_shear.max()
+    
+    error = {"max_relative_error": float(abs_error.max() / ref_peak), 
+             "mean_relative_error": float(abs_error.mean() / ref_peak), 
+             "peak_shear_error": float((base_shear.max() - ref_peak) / ref_peak)}
+    
+    return error
+
+
+def check_binary_recorder(binary_fname, text_fname, num_columns):
+    # largest relative difference between the binary and the text file of the same recorder (text files have about
+    # 6 significant digits)
+    
+    binary_data = load_binary_recorder(binary_fname, num_columns)
+    text_data = load_text_recorder(text_fname)
+    
+    if binary_data.shape != text_data.shape:
+        raise er.RecorderError("binary recorder of " + str(binary_data.shape) + " values, text recorder of " + str(text_data.shape))
+    
+    scale = max(np.abs(text_data).max(), 1e-12)
+    
+    return float(np.abs(binary_data - text_data).max() / scale)
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) == 5 and sys.argv[1] == "check":
+        difference = check_binary_recorder(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        print("max relative difference: " + repr(difference))
+        sys.exit(0 if difference < 1e-5 else 1)
+    
+    else:
+        print("usage: python recorder_reader.py check recorder.bin recorder.out num_columns")
+        sys.exit(1)
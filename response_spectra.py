@@ -0,0 +1,440 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Response spectra of ground-motion record libraries (dynamic and N2 based workflows):
+#
+# - records: PEER NGA .AT2 files (4 header lines, NPTS / DT on the fourth) or plain text files of two columns
+#   (time, acceleration) or one column (acceleration, the time step given); accelerations in g
+# - processing: resampling to a common time step (linear interpolation), baseline correction (a polynomial fitted to
+#   the velocity is removed, its derivative taken off the acceleration)
+# - elastic spectra: exact solution for piecewise linear excitation (Nigam - Jennings) of the linear oscillators of
+#   every period, all records and periods stepped together as records x periods arrays
+# - inelastic (constant strength) spectra: for every strength reduction factor R the bilinear oscillators of
+#   sdof_engine.integrate_bilinear with yield force PSA / R, giving the inelastic displacement and ductility demand
+# - cache: the spectra of a record are saved in cache_folder/<key>.npz, key: sha1 of the record file contents, of how
+#   it was read (time step and units factor) and of the settings, so a library is only computed once for the same
+#   settings (renamed or moved files included)
+#
+# spectra = compute_spectra(load_records("records/"), cache = SpectrumCache("records/cache/"))
+# spectra["RSN6_IMPVALL.I_I-ELC180"]["psa"]  # pseudo-acceleration (g) at spectra[...]["periods"]
+#
+# usage: python response_spectra.py compute records_folder output_folder [cache_folder] [dt] [record_dt]
+#
+# (dt: common time step the records are resampled to, record_dt: time step of the one column record files; files that
+#  cannot be read are skipped with a warning)
+
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+
+import numpy as np
+
+import sdof_engine as se
+import errors as er
+
+
+logger = logging.getLogger(__name__)
+
+
+default_settings = {"dt": 0.005, # common time step of the processed records (s)
+                    "baseline_order": 2, # polynomial of the velocity removed, None: no correction
+                    "min_period": 0.02,
+                    "max_period": 4.0,
+                    "num_periods": 100, # log spaced
+                    "damping_ratio": 0.05,
+                    "reduction_factors": [], # strength reduction factors R of the inelastic spectra, e.g. [2, 4, 6]
+                    "hardening_ratio": 0.02, # inelastic spectra
+                    "free_vibration": True} # records extended by max_period of zeros (peaks after the end)
+
+gravity = 9.81
+
+at2_header_pattern = re.compile(r"NPTS\s*=\s*(\d+)\s*,\s*DT\s*=\s*([-+.\dEe]+)", re.IGNORECASE)
+
+
+def get_settings(settings = None):
+    
+    full_settings = dict(default_settings)
+    
+    if settings is not None:
+        full_settings.update(settings)
+    
+    return full_settings
+
+
+def get_file_hash(fname):
+    
+    inf = open(fname, 'rb')
+    file_hash = hashlib.sha1(inf.read()).hexdigest()
+    inf.close()
+    
+    return file_hash
+
+
+def parse_at2(lines, fname):
+    # (dt, accelerations) of a PEER NGA record: NPTS= 5000, DT= .0050 SEC on the fourth line
+    # (older files: "5000    0.0050    NPTS, DT")
+    
+    if len(lines) < 5:
+        raise er.InputError("AT2 record too short: " + fname)
+    
+    match = at2_header_pattern.search(lines[3])
+    
+    if match is not None:
+        num_points = int(match.group(1))
+        dt = float(match.group(2))
+    else:
+        try:
+            tokens = lines[3].replace(',', ' ').split()
+            num_points = int(float(tokens[0]))
+            dt = float(tokens[1])
+        except (IndexError, ValueError):
+            raise er.InputError("no NPTS / DT in the header of the AT2 record " + fname + ": " + lines[3].strip())
+    
+    values = ' '.join(lines[4:]).split()
+    
+    try:
+        accelerations = np.array([float(value) for value in values[:num_points]])
+    except ValueError:
+        raise er.InputError("non numeric acceleration in the AT2 record " + fname)
+    
+    return dt, accelerations
+
+
+def parse_columns(lines, fname, dt = None):
+    # (dt, accelerations) of a text record: time and acceleration columns, or accelerations only (dt needed);
+    # lines not starting with a number are taken as header
+    
+    rows = []
+    
+    for line in lines:
+        tokens = line.replace(',', ' ').split()
+        
+        try:
+            rows.append([float(token) for token in tokens])
+        except ValueError:
+            if len(rows) == 0:
+                continue # header
+            raise er.InputError("non numeric line in the record " + fname + ": " + line.strip())
+    
+    rows = [row for row in rows if len(row) > 0]
+    
+    if len(rows) == 0:
+        raise er.InputError("empty record " + fname)
+    
+    if len(rows[0]) == 2:
+        data = np.array(rows)
+        time = data[:, 0]
+        steps = np.diff(time)
+        
+        if len(steps) == 0 or steps.min() <= 0:
+            raise er.InputError("time column not increasing in the record " + fname)
+        
+        record_dt = float(np.median(steps))
+        
+        if steps.max() - steps.min() > 1e-6 * record_dt:
+            # irregular sampling: put on a uniform grid
+            uniform_time = np.arange(time[0], time[-1] + 0.5 * record_dt, record_dt)
+            return record_dt, np.interp(uniform_time, time, data[:, 1])
+        
+        return record_dt, data[:, 1]
+    
+    if dt is None:
+        raise er.InputError("one column record without time step: " + fname)
+    
+    return dt, np.array([value for row in rows for value in row])
+
+
+def load_record(fname, dt = None, units_factor = 1.0):
+    # {"name", "fname", "hash", "dt", "units_factor", "accelerations" (g)}; units_factor: accelerations of the file to g
+    # dt: time step of one column files
+    
+    inf = open(fname)
+    lines = inf.readlines()
+    inf.close()
+    
+    name = os.path.basename(fname).rsplit('.', 1)[0]
+    
+    if fname.upper().endswith(".AT2") or (len(lines) > 3 and at2_header_pattern.search(lines[3]) is not None):
+        record_dt, accelerations = parse_at2(lines, fname)
+    else:
+        record_dt, accelerations = parse_columns(lines, fname, dt)
+    
+    return {"name": name,
+            "fname": fname,
+            "hash": get_file_hash(fname),
+            "dt": record_dt,
+            "units_factor": units_factor,
+            "accelerations": accelerations * units_factor}
+
+
+def load_records(records_folder, dt = None, units_factor = 1.0):
+    # every record file of the folder, sorted by name (subfolders, e.g. the cache, are skipped); a file that cannot
+    # be read is skipped with a warning, the rest of the library goes on
+    
+    records = []
+    
+    for fname in sorted(os.listdir(records_folder)):
+        full_fname = os.path.join(records_folder, fname)
+        
+        if not os.path.isfile(full_fname) or fname.startswith('.'):
+            continue
+        
+        try:
+            records.append(load_record(full_fname, dt, units_factor))
+        except (er.InputError, IOError, ValueError) as error: # ValueError: e.g. not a text file
+            logger.warning("record " + fname + " skipped: " + str(error))
+    
+    return records
+
+
+def resample(accelerations, dt, new_dt):
+    # linear interpolation on a grid of new_dt (same duration)
+    
+    if abs(new_dt - dt) <= 1e-9 * dt:
+        return accelerations
+    
+    time = np.arange(len(accelerations)) * dt
+    new_time = np.arange(0.0, time[-1] + 0.5 * new_dt, new_dt)
+    
+    return np.interp(new_time, time, accelerations)
+
+
+def baseline_correct(accelerations, dt, order = 2):
+    # removes the polynomial of order fitted (least squares) to the velocity: its derivative is taken off the
+    # acceleration, so the velocity has no drift and the displacement no spurious trend
+    
+    if order is None:
+        return accelerations
+    
+    time = np.arange(len(accelerations)) * dt
+    velocity = np.concatenate([[0.0], np.cumsum((accelerations[1:] + accelerations[:-1]) * dt / 2.0)])
+    
+    coefficients = np.polyfit(time, velocity, order)
+    
+    return accelerations - np.polyval(np.polyder(coefficients), time)
+
+
+def process_record(record, settings):
+    # accelerations (g) at the common time step, baseline corrected
+    
+    accelerations = resample(record["accelerations"], record["dt"], settings["dt"])
+    
+    return baseline_correct(accelerations, settings["dt"], settings["baseline_order"])
+
+
+def get_periods(settings):
+    
+    return np.logspace(np.log10(settings["min_period"]), np.log10(settings["max_period"]), settings["num_periods"])
+
+
+def get_piecewise_exact_coefficients(periods, damping_ratio, dt):
+    # (A, B, C, D, A', B', C', D') of u(i+1) = A u + B v + C p(i) + D p(i + 1), v(i+1) = A' u + B' v + C' p(i) + D' p(i + 1)
+    # for unit mass linear oscillators (Nigam - Jennings, exact for a linear variation of the load within the step)
+    
+    omega = 2.0 * np.pi / periods
+    stiffness = omega ** 2
+    root = np.sqrt(1.0 - damping_ratio ** 2)
+    omega_d = omega * root
+    
+    e = np.exp(-damping_ratio * omega * dt)
+    s = np.sin(omega_d * dt)
+    c = np.cos(omega_d * dt)
+    z = damping_ratio / root
+    
+    a = e * (z * s + c)
+    b = e * s / omega_d
+    c_p = (2.0 * damping_ratio / (omega * dt) + e * (((1.0 - 2.0 * damping_ratio ** 2) / (omega_d * dt) - z) * s - (1.0 + 2.0 * damping_ratio / (omega * dt)) * c)) / stiffness
+    d_p = (1.0 - 2.0 * damping_ratio / (omega * dt) + e * ((2.0 * damping_ratio ** 2 - 1.0) / (omega_d * dt) * s + 2.0 * damping_ratio / (omega * dt) * c)) / stiffness
+    
+    a_v = -e * omega / root * s
+    b_v = e * (c - z * s)
+    c_v = (-1.0 / dt + e * ((omega / root + z / dt) * s + c / dt)) / stiffness
+    d_v = (1.0 - e * (z * s + c)) / (stiffness * dt)
+    
+    return a, b, c_p, d_p, a_v, b_v, c_v, d_v
+
+
+def get_elastic_displacements(ground, dt, periods, damping_ratio = 0.05):
+    # peak relative displacements (m), records x periods; ground: records x steps accelerations (m/s2)
+    
+    a, b, c_p, d_p, a_v, b_v, c_v, d_v = get_piecewise_exact_coefficients(periods, damping_ratio, dt)
+    
+    shape = (ground.shape[0], len(periods))
+    u = np.zeros(shape)
+    v = np.zeros(shape)
+    peaks = np.zeros(shape)
+    
+    loads = -ground[:, :, np.newaxis] # unit mass: p = - ground acceleration, broadcast over the periods
+    
+    for step in range(ground.shape[1] - 1):
+        p = loads[:, step]
+        next_p = loads[:, step + 1]
+        
+        u, v = (a * u + b * v + c_p * p + d_p * next_p,
+                a_v * u + b_v * v + c_v * p + d_v * next_p)
+        
+        np.maximum(peaks, np.abs(u), out = peaks)
+    
+    return peaks
+
+
+def get_settings_key(settings):
+    # settings affecting the spectra (json, sorted)
+    
+    return json.dumps(settings, sort_keys = True)
+
+
+def get_cache_key(record, settings):
+    # the same file read with another time step (one column records) or units factor gives other accelerations
+    
+    reading = json.dumps({"dt": record["dt"], "units_factor": record.get("units_factor", 1.0)}, sort_keys = True)
+    
+    return hashlib.sha1((record["hash"] + reading + get_settings_key(settings)).encode("utf-8")).hexdigest()
+
+
+class SpectrumCache:
+    def __init__(self, folder):
+        
+        if not folder.endswith('/'):
+            folder += '/'
+        
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+    
+    
+    def get(self, key):
+        # dict of arrays, None when not cached
+        
+        fname = self.folder + key + ".npz"
+        
+        if not os.path.isfile(fname):
+            self.misses += 1
+            return None
+        
+        try:
+            data = np.load(fname)
+            spectra = dict([(name, data[name]) for name in data.files])
+            data.close()
+        except (IOError, OSError, ValueError):
+            logger.warning("unreadable cached spectra " + fname + ": computed again")
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        
+        return spectra
+    
+    
+    def put(self, key, spectra):
+        
+        # written under a temporary name first: an interrupted run leaves no truncated file behind
+        temp_fname = self.folder + key + ".tmp.npz"
+        
+        np.savez(temp_fname, **spectra)
+        os.rename(temp_fname, self.folder + key + ".npz") # os.replace: python 3 only
+
+
+def compute_spectra(records, settings = None, cache = None):
+    # record name --> {"periods", "sd" (m), "psa" (g), "psv" (m/s), "pga" (g), ["sdi_R<R>", "ductility_R<R>"]}
+    # records of load_record; only the ones missing from the cache are integrated, all together
+    
+    settings = get_settings(settings)
+    periods = get_periods(settings)
+    omega = 2.0 * np.pi / periods
+    
+    spectra = dict()
+    pending = []
+    
+    for record in records:
+        key = get_cache_key(record, settings)
+        cached = cache.get(key) if cache is not None else None
+        
+        if cached is not None:
+            spectra[record["name"]] = cached
+        else:
+            pending.append((key, record))
+    
+    if len(pending) == 0:
+        return spectra
+    
+    processed = [process_record(record, settings) for key, record in pending]
+    
+    extra_steps = int(round(settings["max_period"] / settings["dt"])) if settings["free_vibration"] else 0
+    ground = se.stack_records([list(accelerations) + [0.0] * extra_steps for accelerations in processed]) * gravity
+    
+    sd = get_elastic_displacements(ground, settings["dt"], periods, settings["damping_ratio"])
+    psa = sd * omega ** 2 / gravity
+    
+    inelastic = dict()
+    
+    for reduction_factor in settings["reduction_factors"]:
+        # oscillators (periods) x records, yield force of every period and record: elastic force / R
+        stiffness = (omega ** 2).reshape(-1, 1)
+        yield_force = sd.T * stiffness / reduction_factor
+        
+        peaks = se.integrate_bilinear(stiffness, yield_force, ground, settings["dt"],
+                                      {"damping_ratio": settings["damping_ratio"], "hardening_ratio": settings["hardening_ratio"]})
+        
+        inelastic[reduction_factor] = (peaks.T, peaks.T / (sd / reduction_factor))
+    
+    for i, (key, record) in enumerate(pending):
+        record_spectra = {"periods": periods,
+                          "sd": sd[i],
+                          "psa": psa[i],
+                          "psv": sd[i] * omega,
+                          "pga": np.array(np.abs(processed[i]).max())}
+        
+        for reduction_factor in settings["reduction_factors"]:
+            label = ('%g' % reduction_factor)
+            record_spectra["sdi_R" + label] = inelastic[reduction_factor][0][i]
+            record_spectra["ductility_R" + label] = inelastic[reduction_factor][1][i]
+        
+        if cache is not None:
+            cache.put(key, record_spectra)
+        
+        spectra[record["name"]] = record_spectra
+    
+    return spectra
+
+
+def write_spectra_csv(fname, spectra):
+    # period,sd,psa,psv[,sdi_R<R>,ductility_R<R>]
+    
+    columns = ["sd", "psa", "psv"] + sorted([name for name in spectra.keys() if name.startswith("sdi_") or name.startswith("ductility_")])
+    
+    outf = open(fname, 'w')
+    outf.write(','.join(["period"] + columns) + '\n')
+    
+    for i, period in enumerate(spectra["periods"]):
+        outf.write(','.join([repr(float(period))] + [repr(float(spectra[column][i])) for column in columns]) + '\n')
+    
+    outf.close()
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) in (4, 5, 6, 7) and sys.argv[1] == "compute":
+        output_folder = sys.argv[3] if sys.argv[3].endswith('/') else sys.argv[3] + '/'
+        cache = SpectrumCache(sys.argv[4]) if len(sys.argv) >= 5 else None
+        settings = {"dt": float(sys.argv[5])} if len(sys.argv) >= 6 else None
+        record_dt = float(sys.argv[6]) if len(sys.argv) == 7 else None
+        
+        records = load_records(sys.argv[2], record_dt)
+        spectra = compute_spectra(records, settings, cache)
+        
+        for name in sorted(spectra.keys()):
+            write_spectra_csv(output_folder + name + "_spectra.csv", spectra[name])
+        
+        print(str(len(spectra)) + " records" + (" (" + str(cache.hits) + " from the cache)" if cache is not None else ""))
+    
+    else:
+        print("usage: python response_spectra.py compute records_folder output_folder [cache_folder] [dt] [record_dt]")
+        sys.exit(1)
@@ -0,0 +1,217 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Sampling profiler for the batch (see main.py, profiling settings): a background thread samples the
+# stack of the profiled thread every interval seconds, without tracing every call like cProfile does,
+# so it can be left on for a sample of the buildings of a long batch.
+#
+# Stacks are stored in the collapsed format ("module:function;module:function count" per line,
+# root first) read by flamegraph.pl and speedscope. Files written by several workers are merged with
+#
+# python sampling_profiler.py merged.folded profile_1234.folded profile_5678.folded ...
+#
+# which also prints the top functions by self time (samples where the function is on top of the stack).
+# IronPython only exposes frames when run with -X:Frames (or -X:FullFrames).
+
+import os
+import sys
+import threading
+
+
+class SamplingProfiler:
+    def __init__(self, interval = 0.005, thread_id = None):
+        self.interval = interval # seconds between samples
+        self.thread_id = thread_id # thread to profile (defaults to the thread calling start)
+        self.stacks = dict() # collapsed stack --> number of samples
+        self.num_samples = 0
+        self.sampler = None
+        self.stop_event = None
+    
+    
+    def start(self):
+        
+        if self.thread_id is None:
+            self.thread_id = get_thread_id()
+        
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target = self.sample)
+        self.sampler.daemon = True
+        self.sampler.start()
+    
+    
+    def stop(self):
+        # samples are kept: start / stop can be called again to profile several buildings
+        
+        if self.sampler is not None:
+            self.stop_event.set()
+            self.sampler.join()
+            self.sampler = None
+    
+    
+    def sample(self):
+        
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            
+            if frame is None:
+                continue
+            
+            stack = get_collapsed_stack(frame)
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.num_samples += 1
+    
+    
+    def write_collapsed(self, fname):
+        
+        write_collapsed(self.stacks, fname)
+
+
+def get_thread_id():
+    
+    if hasattr(threading, "get_ident"):
+        return threading.get_ident()
+    
+    import thread # python 2
+    return thread.get_ident()
+
+
+def get_frame_name(frame):
+    # module:function
+    
+    module_name = frame.f_globals.get("__name__")
+    
+    if module_name is None or module_name == "__main__":
+        module_name = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    
+    return module_name + ':' + frame.f_code.co_name
+
+
+def get_collapsed_stack(frame):
+    # frame names from the root of the stack to the sampled frame, joined with ';'
+    
+    names = []
+    
+    while frame is not None:
+        names.append(get_frame_name(frame))
+        frame = frame.f_back
+    
+    names.reverse()
+    
+    return ';'.join(names)
+
+
+def write_collapsed(stacks, fname):
+    
+    outf = open(fname, 'w')
+    
+    for stack in sorted(stacks.keys()):
+        outf.write(stack + ' ' + str(stacks[stack]) + '\n')
+    
+    outf.close()
+
+
+def load_collapsed(fname):
+    
+    stacks = dict()
+    
+    inf = open(fname)
+    
+    for line in inf:
+        line = line.rstrip('\n')
+        
+        if not line:
+            continue
+        
+        stack, count = line.rsplit(' ', 1)
+        stacks[stack] = stacks.get(stack, 0) + int(count)
+    
+    inf.close()
+    
+    return stacks
+
+
+def merge_collapsed(stacks_list):
+    # sum of the samples of several profiles (e.g. one per worker)
+    
+    merged = dict()
+    
+    for stacks in stacks_list:
+        for stack, count in stacks.items():
+            merged[stack] = merged.get(stack, 0) + count
+    
+    return merged
+
+
+def get_top_functions(stacks, top = 20, module_names = None):
+    # [(module:function, self samples, total samples)] sorted by self samples
+    # self: the function is on top of the stack, total: the function is anywhere in the stack (counted once)
+    # module_names: only functions of these modules, e.g. ["confined_concrete_calculator", "functions", "write_tcl_source"]
+    
+    self_samples = dict()
+    total_samples = dict()
+    
+    for stack, count in stacks.items():
+        names = stack.split(';')
+        
+        self_samples[names[-1]] = self_samples.get(names[-1], 0) + count
+        
+        for name in set(names):
+            total_samples[name] = total_samples.get(name, 0) + count
+    
+    rows = []
+    
+    for name, total in total_samples.items():
+        if module_names is not None and name.split(':')[0] not in module_names:
+            continue
+        
+        rows.append((name, self_samples.get(name, 0), total))
+    
+    rows.sort(key = lambda row: (row[1], row[2]), reverse = True)
+    
+    return rows[:top]
+
+
+def get_module_self_samples(stacks):
+    # {module: self samples}
+    
+    module_samples = dict()
+    
+    for stack, count in stacks.items():
+        module_name = stack.split(';')[-1].split(':')[0]
+        module_samples[module_name] = module_samples.get(module_name, 0) + count
+    
+    return module_samples
+
+
+def format_top_functions(stacks, top = 20, module_names = None):
+    
+    num_samples = max(sum(stacks.values()), 1)
+    
+    lines = ["self %".rjust(7) + "total %".rjust(9) + "  function"]
+    
+    for name, self_count, total_count in get_top_functions(stacks, top, module_names):
+        lines.append(('%.1f' % (100.0 * self_count / num_samples)).rjust(7) +
+                     ('%.1f' % (100.0 * total_count / num_samples)).rjust(9) + '  ' + name)
+    
+    lines.append("")
+    lines.append("self %".rjust(7) + "  module")
+    
+    module_samples = get_module_self_samples(stacks)
+    
+    for module_name in sorted(module_samples.keys(), key = lambda k: module_samples[k], reverse = True)[:top]:
+        lines.append(('%.1f' % (100.0 * module_samples[module_name] / num_samples)).rjust(7) + '  ' + module_name)
+    
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) < 3:
+        print("usage: python sampling_profiler.py merged.folded profile_1.folded [profile_2.folded ...]")
+        sys.exit(1)
+    
+    merged = merge_collapsed([load_collapsed(fname) for fname in sys.argv[2:]])
+    write_collapsed(merged, sys.argv[1])
+    
+    print(format_top_functions(merged))
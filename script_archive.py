@@ -0,0 +1,235 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Packed output of the generated scripts: instead of one file per building and direction, the scripts are
+# appended to tar shards (scripts_0001.tar, scripts_0002.tar, ...) and an index.jsonl records, per script,
+# the shard and the offset / size of its data. Scripts are stored by content (sha1): a script identical to
+# one already stored only gets an index line. Shards are plain tar files (tar -tf works), but scripts are
+# read by seeking to their offset, without unpacking the shard. A script removed from the archive (building failing
+# half way) gets a "removed" index line: the reader no longer finds it, its data stays in the shard.
+#
+# archive = ScriptArchive("test-bed/bin/tcl_archive/")
+# archive.add(building_id, 'X', tcl_text)
+# archive.close()
+#
+# reader = ScriptArchiveReader("test-bed/bin/tcl_archive/")
+# tcl_text = reader.read(building_id, 'X')
+#
+# usage: python script_archive.py extract archive_folder building_id case > script.tcl
+#        python script_archive.py extract archive_folder building_id case | OpenSees
+#        python script_archive.py list archive_folder
+
+import os
+import sys
+import json
+import time
+import tarfile
+import hashlib
+
+from io import BytesIO
+
+import errors as er
+
+
+index_fname = "index.jsonl"
+
+
+def get_shard_fname(shard_number):
+    
+    return "scripts_" + str(shard_number).zfill(4) + ".tar"
+
+
+def load_index(folder):
+    # {(building_id, case): index record}, later records replace earlier ones ("removed" records drop them)
+    
+    entries = dict()
+    
+    if not os.path.isfile(folder + index_fname):
+        return entries
+    
+    inf = open(folder + index_fname)
+    
+    for line in inf:
+        if line.strip():
+            record = json.loads(line)
+            
+            if record.get("removed"):
+                entries.pop((record["building_id"], record["case"]), None)
+            else:
+                entries[(record["building_id"], record["case"])] = record
+    
+    inf.close()
+    
+    return entries
+
+
+class ScriptArchive:
+    def __init__(self, folder, max_shard_mb = 1024.0, extension = ".tcl"):
+        # an existing archive is extended: its scripts are kept (and deduplicated against), new ones go into new shards
+        
+        if not folder.endswith('/'):
+            folder += '/'
+        
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        
+        self.folder = folder
+        self.max_shard_bytes = max_shard_mb * 1024 * 1024
+        self.extension = extension
+        self.stored = dict() # sha1 --> (shard, offset, size) of the stored scripts
+        self.shard_number = 0
+        self.shard = None # tarfile of the current shard
+        
+        for record in load_index(folder).values():
+            self.stored[record["sha1"]] = (record["shard"], record["offset"], record["size"])
+        
+        while os.path.isfile(folder + get_shard_fname(self.shard_number + 1)):
+            self.shard_number += 1
+        
+        self.index_file = open(folder + index_fname, 'a')
+    
+    
+    def open_shard(self):
+        
+        self.shard_number += 1
+        self.shard = tarfile.open(self.folder + get_shard_fname(self.shard_number), 'w', format = tarfile.USTAR_FORMAT)
+    
+    
+    def close_shard(self):
+        
+        if self.shard is not None:
+            self.shard.close()
+            self.shard = None
+    
+    
+    def add(self, building_id, case, text):
+        # stores the script of (building_id, case) and returns the number of bytes added to the shards (0 if deduplicated)
+        
+        data = text.encode("utf-8")
+        sha1 = hashlib.sha1(data).hexdigest()
+        
+        bytes_added = 0
+        
+        if sha1 not in self.stored:
+            if self.shard is None or self.shard.offset >= self.max_shard_bytes:
+                self.close_shard()
+                self.open_shard()
+            
+            tarinfo = tarfile.TarInfo(sha1 + self.extension)
+            tarinfo.size = len(data)
+            tarinfo.mtime = int(time.time())
+            
+            offset = self.shard.offset
+            self.shard.addfile(tarinfo, BytesIO(data))
+            self.shard.fileobj.flush() # readable as soon as it is indexed
+            
+            # the data is written after the header and padded to whole blocks
+            padded_size = (len(data) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+            data_offset = self.shard.offset - padded_size
+            
+            self.stored[sha1] = (get_shard_fname(self.shard_number), data_offset, len(data))
+            bytes_added = self.shard.offset - offset
+        
+        shard_fname, data_offset, size = self.stored[sha1]
+        
+        record = {"building_id": building_id,
+                  "case": case,
+                  "fname": building_id + '_' + case + self.extension,
+                  "sha1": sha1,
+                  "shard": shard_fname,
+                  "offset": data_offset,
+                  "size": size}
+        
+        self.index_file.write(json.dumps(record, sort_keys = True) + '\n')
+        self.index_file.flush()
+        
+        return bytes_added
+    
+    
+    def remove(self, building_id, case):
+        # drops the script of (building_id, case) from the index (the shards are append only: its data is kept)
+        
+        self.index_file.write(json.dumps({"building_id": building_id, "case": case, "removed": True}, sort_keys = True) + '\n')
+        self.index_file.flush()
+    
+    
+    def close(self):
+        
+        self.close_shard()
+        self.index_file.close()
+
+
+class ScriptArchiveReader:
+    def __init__(self, folder):
+        
+        if not folder.endswith('/'):
+            folder += '/'
+        
+        self.folder = folder
+        self.entries = load_index(folder)
+    
+    
+    def get_record(self, building_id, case):
+        
+        record = self.entries.get((building_id, case))
+        
+        if record is None:
+            raise er.ScriptArchiveError("no script of " + building_id + ' ' + case + " in " + self.folder)
+        
+        return record
+    
+    
+    def read_bytes(self, building_id, case):
+        
+        record = self.get_record(building_id, case)
+        
+        shard = open(self.folder + record["shard"], 'rb')
+        shard.seek(record["offset"])
+        data = shard.read(record["size"])
+        shard.close()
+        
+        return data
+    
+    
+    def read(self, building_id, case):
+        
+        return self.read_bytes(building_id, case).decode("utf-8")
+    
+    
+    def stream(self, building_id, case, outf, chunk_size = 1024 * 1024):
+        # copies the script into outf (a binary file, e.g. the stdin of an opensees process) without loading it whole
+        
+        record = self.get_record(building_id, case)
+        
+        shard = open(self.folder + record["shard"], 'rb')
+        shard.seek(record["offset"])
+        
+        remaining = record["size"]
+        
+        while remaining > 0:
+            chunk = shard.read(min(chunk_size, remaining))
+            outf.write(chunk)
+            remaining -= len(chunk)
+        
+        shard.close()
+        outf.flush()
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) == 5 and sys.argv[1] == "extract":
+        reader = ScriptArchiveReader(sys.argv[2])
+        reader.stream(sys.argv[3], sys.argv[4], sys.stdout.buffer if hasattr(sys.stdout, "buffer") else sys.stdout)
+    
+    elif len(sys.argv) == 3 and sys.argv[1] == "list":
+        reader = ScriptArchiveReader(sys.argv[2])
+        
+        for building_id, case in sorted(reader.entries.keys()):
+            record = reader.entries[(building_id, case)]
+            print(record["fname"].ljust(40) + record["shard"].rjust(18) + str(record["size"]).rjust(12) + '  ' + record["sha1"])
+    
+    else:
+        print("usage: python script_archive.py extract archive_folder building_id case")
+        print("       python script_archive.py list archive_folder")
+        sys.exit(1)
@@ -0,0 +1,328 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Equivalent SDOF time-history engine: the peak displacements of every building under every ground-motion record in
+# one numpy run (arrays of buildings x records integrated together), instead of one opensees analysis per record.
+#
+# - equivalent SDOF of a building (EC8 N2 method): transformation factor tau_factor and mass equivalent_mass of
+#   functions.get_sdof_data, yield force and displacement of the bilinear capacity curve divided by tau_factor
+# - capacity curve (bilinear): surrogate predictions (surrogate.py predict), the pushover recorders of the building
+#   (surrogate.bilinearise) or, when none is given, the estimate of the section data (triage.get_yield_point)
+# - oscillators: bilinear kinematic hysteresis (hardening_ratio of the post yield stiffness), viscous damping
+#   proportional to the initial stiffness
+# - integration: Newmark average acceleration (unconditionally stable), Newton iterations on the piecewise linear
+#   restoring force, all the oscillators of the batch at once; the records are padded with zeros to the longest one
+#   (free vibration after the end of the shorter records)
+#
+# peaks = run_sdofs(sdofs, records, dt)  # sdof displacements: buildings x records
+# summaries = summarise(sdofs, peaks)  # roof displacement distribution per building
+#
+# usage: python sdof_engine.py run buildings_folder records_folder dt summary.jsonl [capacity] [dir]
+#
+# (records_folder: one file per record, ground accelerations in g as read by stick_model.load_accelerations, all of
+#  them with the same time step dt; capacity: predictions.jsonl of surrogate.py or a folder of pushover recorders)
+
+import os
+import sys
+import json
+import math
+import logging
+
+import numpy as np
+
+import model_builder as mb
+import archive_inputs as ai
+import triage as tr
+import stick_model as st
+import errors as er
+
+
+logger = logging.getLogger(__name__)
+
+
+default_options = {"cracked_stiffness_factor": 0.5, # section data estimate (no capacity curve)
+                   "hardening_ratio": 0.02, # post yield / elastic stiffness
+                   "damping_ratio": 0.05,
+                   "gravity": 9.81, # accelerations of the records in g
+                   "tolerance": 1e-10, # Newton iterations: displacement correction (m)
+                   "max_iterations": 10}
+
+
+def get_options(options = None):
+    
+    full_options = dict(default_options)
+    
+    if options is not None:
+        full_options.update(options)
+    
+    return full_options
+
+
+def get_sdof(model, dir, bilinear = None, options = None):
+    # {"building_id", "dir", "tau_factor", "equivalent_mass", "yield_force", "yield_displacement", "period",
+    #  "ultimate_displacement", "source"} of a model of model_builder.build_model
+    # bilinear: {"yield_shear", "yield_displacement", ["ultimate_displacement"]} of the building in this direction
+    
+    if dir not in ('X', 'Y'):
+        raise er.DirectionError(dir)
+    
+    options = get_options(options)
+    
+    source = "capacity_curve"
+    
+    if bilinear is None:
+        storeys = tr.get_shear_storeys(model, dir, options["cracked_stiffness_factor"])
+        omega2, shape, yield_shear, yield_displacement = tr.get_yield_point(storeys)
+        bilinear = {"yield_shear": yield_shear, "yield_displacement": yield_displacement}
+        source = "sections"
+    
+    tau_factor = model.tau_factor
+    equivalent_mass = model.equivalent_mass
+    
+    yield_force = bilinear["yield_shear"] / tau_factor
+    yield_displacement = bilinear["yield_displacement"] / tau_factor
+    
+    return {"building_id": model.building_id,
+            "dir": dir,
+            "tau_factor": tau_factor,
+            "equivalent_mass": equivalent_mass,
+            "yield_force": yield_force,
+            "yield_displacement": yield_displacement,
+            "period": 2.0 * math.pi * math.sqrt(equivalent_mass * yield_displacement / yield_force),
+            "ultimate_displacement": bilinear.get("ultimate_displacement"), # roof displacement (None: not known)
+            "source": source}
+
+
+def stack_records(records):
+    # records x steps matrix of ground accelerations (g), shorter records padded with zeros
+    
+    num_steps = max([len(record) for record in records])
+    matrix = np.zeros((len(records), num_steps))
+    
+    for i, record in enumerate(records):
+        matrix[i, :len(record)] = record
+    
+    return matrix
+
+
+def run_sdofs(sdofs, records, dt, scale = 1.0, options = None):
+    # peak absolute sdof displacements, buildings x records (records: list of acceleration lists or a records x steps
+    # matrix, in g; scale: float or one factor per record)
+    
+    options = get_options(options)
+    
+    if not isinstance(records, np.ndarray):
+        records = stack_records(records)
+    
+    ground = records * np.asarray(scale, dtype = float).reshape(-1, 1) * options["gravity"] # records x steps
+    
+    # per unit mass properties, buildings x 1 (broadcast against the records)
+    yield_force = np.array([sdof["yield_force"] / sdof["equivalent_mass"] for sdof in sdofs]).reshape(-1, 1)
+    stiffness = np.array([sdof["yield_force"] / (sdof["equivalent_mass"] * sdof["yield_displacement"]) for sdof in sdofs]).reshape(-1, 1)
+    
+    return integrate_bilinear(stiffness, yield_force, ground, dt, options)
+
+
+def integrate_bilinear(stiffness, yield_force, ground, dt, options = None):
+    # peak absolute displacements of unit mass bilinear oscillators, oscillators x records
+    # stiffness, yield_force: arrays broadcast to oscillators x records (e.g. oscillators x 1)
+    # ground: records x steps ground accelerations (m/s2)
+    
+    options = get_options(options)
+    
+    damping = 2.0 * options["damping_ratio"] * np.sqrt(stiffness)
+    
+    hardening_ratio = options["hardening_ratio"]
+    hardening_stiffness = hardening_ratio * stiffness
+    bound = (1.0 - hardening_ratio) * yield_force
+    
+    shape = np.broadcast(stiffness, yield_force, ground[:, 0]).shape
+    
+    u = np.zeros(shape)
+    v = np.zeros(shape)
+    a = np.zeros(shape)
+    force = np.zeros(shape)
+    peaks = np.zeros(shape)
+    
+    # Newmark average acceleration
+    gamma = 0.5
+    beta = 0.25
+    a_u = 1.0 / (beta * dt ** 2)
+    a_v = gamma / (beta * dt)
+    
+    unconverged_steps = 0
+    
+    for step in range(1, ground.shape[1]):
+        load = -ground[:, step] # per unit mass, broadcast over the buildings
+        
+        v_base = (1.0 - gamma / beta) * v + dt * (1.0 - gamma / (2.0 * beta)) * a
+        a_base = -v / (beta * dt) - (1.0 / (2.0 * beta) - 1.0) * a
+        
+        new_u = u.copy()
+        
+        for iteration in range(options["max_iterations"]):
+            # bilinear kinematic spring from the committed state
+            new_force = force + stiffness * (new_u - u)
+            upper_bound = hardening_stiffness * new_u + bound
+            lower_bound = hardening_stiffness * new_u - bound
+            
+            yielding = (new_force > upper_bound) | (new_force < lower_bound)
+            new_force = np.minimum(np.maximum(new_force, lower_bound), upper_bound)
+            tangent = np.where(yielding, hardening_stiffness, stiffness)
+            
+            new_v = a_v * (new_u - u) + v_base
+            new_a = a_u * (new_u - u) + a_base
+            
+            residual = load - new_a - damping * new_v - new_force
+            correction = residual / (tangent + a_u + a_v * damping)
+            new_u += correction
+            
+            if np.abs(correction).max() <= options["tolerance"]:
+                break
+        else:
+            unconverged_steps += 1
+        
+        # commit the step
+        new_force = force + stiffness * (new_u - u)
+        force = np.minimum(np.maximum(new_force, hardening_stiffness * new_u - bound), hardening_stiffness * new_u + bound)
+        
+        v = a_v * (new_u - u) + v_base
+        a = a_u * (new_u - u) + a_base
+        u = new_u
+        
+        np.maximum(peaks, np.abs(u), out = peaks)
+    
+    if unconverged_steps > 0:
+        logger.warning(str(unconverged_steps) + " steps without convergence of every oscillator")
+    
+    return peaks
+
+
+def summarise(sdofs, peaks, record_names = None):
+    # per building: roof displacement (sdof displacement x tau_factor) distribution over the records and the
+    # ductility demand; fraction of the records exceeding the ultimate displacement when it is known
+    
+    summaries = []
+    
+    for i, sdof in enumerate(sdofs):
+        roof = peaks[i] * sdof["tau_factor"]
+        ductility = peaks[i] / sdof["yield_displacement"]
+        
+        summary = {"building_id": sdof["building_id"],
+                   "dir": sdof["dir"],
+                   "period": round(sdof["period"], 4),
+                   "source": sdof["source"],
+                   "records": len(roof),
+                   "roof_displacement": {"median": float(np.median(roof)),
+                                         "p16": float(np.percentile(roof, 16)),
+                                         "p84": float(np.percentile(roof, 84)),
+                                         "max": float(roof.max()),
+                                         "beta": float(np.std(np.log(np.maximum(roof, 1e-12))))}, # lognormal dispersion
+                   "ductility": {"median": float(np.median(ductility)),
+                                 "max": float(ductility.max())},
+                   "exceedance": None}
+        
+        if sdof["ultimate_displacement"] is not None:
+            summary["exceedance"] = float((roof > sdof["ultimate_displacement"]).mean())
+        
+        if record_names is not None:
+            summary["max_record"] = record_names[int(np.argmax(roof))]
+        
+        summaries.append(summary)
+    
+    return summaries
+
+
+def load_records(records_folder):
+    # (names, acceleration lists) of every file of the folder, sorted by name
+    
+    names = []
+    records = []
+    
+    for fname in sorted(os.listdir(records_folder)):
+        if not os.path.isfile(os.path.join(records_folder, fname)):
+            continue
+        
+        names.append(fname.rsplit('.', 1)[0])
+        records.append(st.load_accelerations(os.path.join(records_folder, fname)))
+    
+    return names, records
+
+
+def load_predictions(fname):
+    # building_id --> bilinear prediction (output of: python surrogate.py predict)
+    
+    predictions = dict()
+    inf = open(fname)
+    
+    for line in inf:
+        if line.strip():
+            prediction = json.loads(line)
+            predictions[prediction["building_id"]] = prediction
+    
+    inf.close()
+    
+    return predictions
+
+
+def get_sdofs(base_folder, dir = 'X', capacity = None, options = None, cache = None):
+    # sdofs of every building of base_folder; capacity: surrogate predictions (dict), a folder of pushover recorders
+    # or None (section data estimate)
+    
+    if cache is None:
+        cache = dict()
+    
+    sdofs = []
+    
+    for typology, import_fname, import_json_obj in ai.iter_inputs(base_folder):
+        if import_json_obj is None:
+            import_file = open(import_fname)
+            import_json_obj = json.load(import_file)
+            import_file.close()
+        
+        building_id = ai.get_building_id(import_fname)
+        model = mb.build_model(import_json_obj, {"dir": dir}, building_id, cache)
+        
+        bilinear = None
+        
+        if isinstance(capacity, dict):
+            bilinear = capacity.get(building_id)
+        
+        elif capacity is not None:
+            try:
+                bilinear = st.get_pushover_bilinear(model, capacity)
+            except (IOError, OSError, ValueError):
+                logger.info(building_id + ' ' + dir + ": no pushover results, sdof from the section data")
+        
+        sdofs.append(get_sdof(model, dir, bilinear, options))
+    
+    return sdofs
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) in (6, 7, 8) and sys.argv[1] == "run":
+        capacity = None
+        
+        if len(sys.argv) >= 7:
+            capacity = load_predictions(sys.argv[6]) if sys.argv[6].endswith(".jsonl") else sys.argv[6]
+        
+        sdofs = get_sdofs(sys.argv[2], sys.argv[7] if len(sys.argv) == 8 else 'X', capacity)
+        record_names, records = load_records(sys.argv[3])
+        
+        peaks = run_sdofs(sdofs, records, float(sys.argv[4]))
+        summaries = summarise(sdofs, peaks, record_names)
+        
+        outf = open(sys.argv[5], 'w')
+        
+        for summary in summaries:
+            outf.write(json.dumps(summary, sort_keys = True) + '\n')
+        
+        outf.close()
+        
+        print(str(len(sdofs)) + " buildings x " + str(len(records)) + " records")
+    
+    else:
+        print("usage: python sdof_engine.py run buildings_folder records_folder dt summary.jsonl [capacity] [dir]")
+        sys.exit(1)
@@ -7,6 +7,9 @@ import fiber as fib
 import rebar as reb
 import patch as pat
 import math as m
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Section:
@@ -28,8 +31,7 @@ class Section:
         v = 0.2 # poisson ratio v = 0.2 for uncracked reinforced concrete -- REFERENCE?????
         self.g_mod = self.materials["unconfined_concrete"].properties["e_mod"] / (2.0 * (1 + v)) # --> Shear modulus -- REFERENCE?????
         
-        print("self.g_mod: " + str(self.g_mod))
-        print("self.e_mod: " + str(self.materials["unconfined_concrete"].properties["e_mod"]))
+        logger.debug("g_mod: " + str(self.g_mod) + ", e_mod: " + str(self.materials["unconfined_concrete"].properties["e_mod"]))
         
         self.patches = patches
         self.rebar_layers = rebar_layers
@@ -74,6 +76,20 @@ class Section:
             total_area += layer.num_bars * layer.area_bar
         
         return total_area
+    
+    
+    def get_num_fibers(self):
+        # patch subdivisions + rebar layer bars + single fibers
+        
+        num_fibers = len(self.fibers)
+        
+        for patch in self.patches:
+            num_fibers += patch.num_div_y * patch.num_div_z
+        
+        for layer in self.rebar_layers:
+            num_fibers += layer.num_bars
+        
+        return num_fibers
 
 
 def create_section(section_id, 
@@ -142,7 +158,10 @@ def get_bar_area(diam_mm):
     return round(area_m2, 5)
 
 
-def create_sections_dict(materials, sections_scheme, hinge_dist_percentage):
+def create_sections_dict(materials, sections_scheme, hinge_dist_percentage, patches_schemes = None):
+    
+    # patches_schemes: optional {section type: (num_div_y, num_div_z, div_mult)} overriding the default meshes 
+    # (see fiber_convergence.py)
     
     material_id = len(materials) + 100 # just to be sure there are no ids collisions
     
@@ -161,6 +180,9 @@ def create_sections_dict(materials, sections_scheme, hinge_dist_percentage):
     steel_material = materials["steel02_A400S_non_corrugated"]
     patches_scheme = (4, 6, 3) # (num_div_y, num_div_z, div_mult): div_mult is used to multiply the number of divisions
     
+    if patches_schemes is not None and type in patches_schemes:
+        patches_scheme = patches_schemes[type]
+    
     # rebar_scheme => num_bars, area_bar, cover, location = rebar_scheme[layer_name]
     
     rebar_scheme = {"TOP": (4, get_bar_area(16), 0.03, "TOP"),
@@ -199,6 +221,9 @@ def create_sections_dict(materials, sections_scheme, hinge_dist_percentage):
     steel_material = materials["steel02_A400S_non_corrugated"]
     patches_scheme = (4, 4, 3) # (num_div_y, num_div_z): div_mult is used to multiply the number of divisions
     
+    if patches_schemes is not None and type in patches_schemes:
+        patches_scheme = patches_schemes[type]
+    
     # rebar_scheme => num_bars, area_bar, cover, location = rebar_scheme[layer_name]
     
     rebar_scheme = {"TOP": (3, get_bar_area(12), 0.03, "TOP"),
@@ -237,6 +262,9 @@ def create_sections_dict(materials, sections_scheme, hinge_dist_percentage):
     steel_material = materials["steel02_A400S_non_corrugated"]
     patches_scheme = (4, 4, 3) # (num_div_y, num_div_z): div_mult is used to multiply the number of divisions
     
+    if patches_schemes is not None and type in patches_schemes:
+        patches_scheme = patches_schemes[type]
+    
     # rebar_scheme => num_bars, area_bar, cover, location = rebar_scheme[layer_name]
     
     # Note that Left and Right rebar layers have only 2 bars because the corner bars are taken by the Top and Bottom layers
@@ -0,0 +1,96 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Selective nonlinearity: members that are expected to remain elastic during a pushover
+# are written as elasticBeamColumn elements instead of forceBeamColumn fiber elements
+#
+# The prediction is a demand / capacity estimate from the section data (no opensees pre-analysis):
+# - with rigid diaphragms the lateral load only bends the columns and the beams parallel to the pushover direction,
+#   those members reach their capacity during the pushover and are always kept nonlinear
+# - beams perpendicular to the pushover direction carry (mostly) gravitational loads:
+#   they are downgraded when their gravitational moment is well below their yield moment
+#
+# The error against the all-fiber model is measured comparing both capacity curves
+# (see recorder_reader.get_capacity_curve_error)
+
+import errors as er
+
+
+def get_yield_moment(section):
+    # simplified yield moment of a rectangular section: My = As * fy * 0.9 * d
+    # As is the weakest of the top / bottom layers (the compression steel and the axial load are neglected, i.e. conservative)
+    
+    fy = section.materials["steel"].properties["fy"]
+    
+    layer_areas = [layer.num_bars * layer.area_bar for layer in section.rebar_layers if layer.location in ("TOP", "BOTTOM")]
+    
+    if len(layer_areas) == 0:
+        return 0
+    
+    cover = section.rebar_layers[0].cover # we are assuming all covers in all layers are the same
+    d = section.height - cover # effective depth
+    
+    return min(layer_areas) * fy * 0.9 * d
+
+
+def get_gravitational_moment(elem):
+    # fixed-end moment of a uniformly loaded beam: M = w * L^2 / 12
+    
+    if elem.uniform_load is None:
+        return 0
+    
+    return abs(elem.uniform_load[2]) * elem.length ** 2 / 12.0
+
+
+def is_perpendicular(elem, dir, tolerance = 0.1):
+    # True for horizontal elements whose axis is (almost) perpendicular to the pushover direction
+    
+    dir_index = None
+    if dir == 'X':
+        dir_index = 0
+    elif dir == 'Y':
+        dir_index = 1
+    else:
+        raise er.DirectionError(dir)
+    
+    delta = [elem.node2.coords[i] - elem.node1.coords[i] for i in range(3)]
+    
+    if abs(delta[2]) > tolerance * elem.length:
+        return False
+    
+    return abs(delta[dir_index]) <= tolerance * elem.length
+
+
+def select_elastic_elements(elements, dir, dc_threshold = 0.5):
+    # returns the ids of the elements that can be written as elastic elements and a short report
+    
+    elastic_element_ids = set()
+    
+    report = {"total": 0, "downgraded": 0, "max_dc_ratio": 0.0}
+    
+    yield_moments = dict() # sections are shared among elements
+    
+    for elem in elements:
+        report["total"] += 1
+        
+        if elem.type == "column" or not is_perpendicular(elem, dir):
+            continue
+        
+        if elem.section.id not in yield_moments:
+            yield_moments[elem.section.id] = get_yield_moment(elem.section)
+        
+        yield_moment = yield_moments[elem.section.id]
+        
+        if yield_moment <= 0:
+            continue
+        
+        dc_ratio = get_gravitational_moment(elem) / yield_moment
+        
+        if dc_ratio < dc_threshold:
+            elastic_element_ids.add(elem.id)
+            report["downgraded"] += 1
+            report[elem.type] = report.get(elem.type, 0) + 1
+            report["max_dc_ratio"] = max(report["max_dc_ratio"], round(dc_ratio, 3))
+    
+    return elastic_element_ids, report
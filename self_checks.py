@@ -0,0 +1,388 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Self checks (headless, no opensees nor Rhino needed): small deterministic checks of the numerics and file formats
+# of the batch modules, each against an independent reference (closed form solution, dense solve, file written by
+# hand, round trip), complementing golden_outputs.py which only covers the generated scripts.
+#
+# Every check runs in its own temporary folder and fails with an AssertionError (see expect).
+#
+# usage: python self_checks.py [check_name ...]  (default: all of them)
+
+import os
+import sys
+import json
+import struct
+import shutil
+import logging
+import tarfile
+import tempfile
+import itertools
+import traceback
+
+import numpy as np
+
+import recorder_reader as rr
+import script_archive as sa
+import checkpoint as cp
+import cost_model as cm
+import stick_model as st
+import sdof_engine as se
+import response_spectra as rs
+import errors as er
+
+
+def expect(condition, message):
+    
+    if not condition:
+        raise AssertionError(message)
+
+
+def expect_close(value, reference, rel_tol, message, abs_tol = 1e-12):
+    
+    value = np.asarray(value, dtype = float)
+    reference = np.asarray(reference, dtype = float)
+    
+    expect(value.shape == reference.shape, message + ": shape " + str(value.shape) + " instead of " + str(reference.shape))
+    
+    error = np.abs(value - reference).max() if value.size > 0 else 0.0
+    scale = np.abs(reference).max() if reference.size > 0 else 0.0
+    
+    expect(error <= rel_tol * scale + abs_tol, message + ": max difference " + repr(float(error)) + " (scale " + repr(float(scale)) + ")")
+
+
+def check_recorder_binary_rows(folder):
+    # binary recorder written like opensees BinaryFileStream (raw doubles + '\n' per row), with an incomplete last row
+    
+    rows = [[0.0, 1.5, -2.25], [0.1, 3.75, 4.125], [0.2, -5.5, 6.0625], [0.3, 7.25, -8.5], [0.4, 9.0, 10.5]]
+    
+    fname = os.path.join(folder, "recorder.bin")
+    outf = open(fname, 'wb')
+    
+    for row in rows:
+        outf.write(struct.pack("<3d", *row) + b'\n')
+    
+    outf.write(struct.pack("<2d", 0.5, 11.0)) # crashed run: row cut short
+    outf.close()
+    
+    data = rr.load_recorder(fname, 3)
+    expect_close(data, rows, 0.0, "binary rows")
+    
+    expect_close(rr.load_recorder(fname, 3, every = 2), rows[::2], 0.0, "binary rows, every 2 steps")
+    
+    text_fname = os.path.join(folder, "recorder.out")
+    np.savetxt(text_fname, np.array(rows))
+    expect(rr.check_binary_recorder(fname, text_fname, 3) < 1e-12, "binary / text round trip")
+    
+    try:
+        rr.load_recorder(fname, 2)
+    except er.RecorderError:
+        pass
+    else:
+        raise AssertionError("wrong number of columns not detected")
+    
+    del data # memory map released before the folder is removed
+
+
+def check_script_archive(folder):
+    # offsets of the index against the tar members read by tarfile, deduplication, shard roll over and an archive
+    # extended by a second run
+    
+    scripts = {("A", 'X'): "model basic -ndm 3 -ndf 6\n",
+               ("A", 'Y'): "x" * 512, # exactly one tar block
+               ("B", 'X'): "model basic -ndm 3 -ndf 6\n", # same as A X: deduplicated
+               ("B", 'Y'): "# \u00e9l\u00e9ment\n" + "y" * 1500} # several blocks, non ascii
+    
+    archive = sa.ScriptArchive(folder, max_shard_mb = 1.0 / 1024) # 1 KB shards: roll over after every script
+    bytes_added = dict()
+    
+    for key in sorted(scripts.keys()):
+        bytes_added[key] = archive.add(key[0], key[1], scripts[key])
+    
+    archive.close()
+    
+    expect(bytes_added[("B", 'X')] == 0, "duplicate script stored again")
+    expect(bytes_added[("A", 'Y')] == 2 * tarfile.BLOCKSIZE, "512 bytes script: " + str(bytes_added[("A", 'Y')]) + " bytes added")
+    
+    archive = sa.ScriptArchive(folder, max_shard_mb = 1.0 / 1024) # second run: extends the archive
+    expect(archive.add("C", 'X', scripts[("A", 'Y')]) == 0, "script of the previous run stored again")
+    archive.add("C", 'Y', "z\n")
+    archive.close()
+    
+    scripts[("C", 'X')] = scripts[("A", 'Y')]
+    scripts[("C", 'Y')] = "z\n"
+    
+    reader = sa.ScriptArchiveReader(folder)
+    
+    for key, text in scripts.items():
+        expect(reader.read(key[0], key[1]) == text, "script " + ' '.join(key) + " read back")
+    
+    shards = set()
+    
+    for record in reader.entries.values():
+        shards.add(record["shard"])
+        
+        shard = tarfile.open(os.path.join(folder, record["shard"]))
+        member = shard.getmember(record["sha1"] + ".tcl")
+        expect(member.offset_data == record["offset"] and member.size == record["size"], "offset / size of " + record["fname"])
+        shard.close()
+    
+    expect(len(shards) == 4, str(len(shards)) + " shards for 4 distinct scripts of 1 KB shards")
+
+
+def check_checkpoint_resume(folder):
+    # batch interrupted while writing: checkpoint line of C cut short, outputs of C written (C X) or cut (C Y)
+    
+    fname = os.path.join(folder, "checkpoint.jsonl")
+    tau_fname = os.path.join(folder, "tau_factors.csv")
+    metrics_fname = os.path.join(folder, "metrics.jsonl")
+    
+    outf = open(fname, 'w')
+    outf.write(json.dumps({"import_fname": "A.json", "building_id": "A", "status": "done", "script_fnames": ["A_X.tcl", "A_Y.tcl"]}) + '\n')
+    outf.write(json.dumps({"import_fname": "B.json", "building_id": "B", "status": "quarantined", "script_fnames": []}) + '\n')
+    outf.write(json.dumps({"import_fname": "D.json", "building_id": "D", "status": "done", "script_fnames": ["D_X.tcl"]}) + '\n')
+    outf.write(json.dumps({"import_fname": "C.json", "building_id": "C", "status": "done", "script_fnames": ["C_X.tcl"]})[:30])
+    outf.close()
+    
+    outf = open(tau_fname, 'w')
+    outf.write("A,tau_factor:1.5,equivalent_mass:80.0\nA,tau_factor:1.5,equivalent_mass:80.0\nD,tau_factor:1.25,equivalent_mass:40.0\n")
+    outf.write("C,tau_factor:1.75,equivalent_mass:90.0\nC,tau_fa")
+    outf.close()
+    
+    outf = open(metrics_fname, 'w')
+    
+    for building_id, dir in [("A", 'X'), ("A", 'Y'), ("D", 'X'), ("C", 'X')]:
+        outf.write(json.dumps({"building_id": building_id, "dir": dir}) + '\n')
+    
+    outf.write('{"building_id": "C", "di')
+    outf.close()
+    
+    checkpoint = cp.Checkpoint(fname)
+    
+    expect(checkpoint.resuming(), "interrupted batch not resumed")
+    expect([checkpoint.is_done(name) for name in ["A.json", "B.json", "C.json", "D.json"]] == [True, True, False, True], "buildings done")
+    expect(checkpoint.get_quarantined() == ["B"], "quarantined buildings")
+    
+    expect(checkpoint.keep_done_lines(tau_fname, cp.get_tau_building_id) == 2, "tau factors of C not dropped")
+    expect(checkpoint.keep_done_lines(metrics_fname, cp.get_metrics_building_id) == 2, "metrics of C not dropped")
+    expect(open(tau_fname).read().count('\n') == 3 and "C" not in open(tau_fname).read(), "tau factors kept")
+    expect([json.loads(line)["building_id"] for line in open(metrics_fname)] == ["A", "A", "D"], "metrics kept")
+    expect(checkpoint.keep_done_lines(tau_fname, cp.get_tau_building_id) == 0, "second resume drops lines")
+    
+    checkpoint.done("C.json", "C", ["C_X.tcl", "C_Y.tcl"]) # run again: appended after the cut line
+    checkpoint.close()
+    
+    checkpoint = cp.Checkpoint(fname)
+    expect(checkpoint.get_script_fnames() == ["A_X.tcl", "A_Y.tcl", "D_X.tcl", "C_X.tcl", "C_Y.tcl"], "scripts after the resume: " + str(checkpoint.get_script_fnames()))
+    
+    checkpoint.complete()
+    checkpoint.close()
+    
+    checkpoint = cp.Checkpoint(fname)
+    expect(not checkpoint.resuming() and not checkpoint.is_done("A.json"), "completed batch not started from scratch")
+    checkpoint.close()
+
+
+def get_optimal_makespan(costs, num_chunks):
+    # brute force over every assignment of the jobs to the chunks (small job sets only)
+    
+    makespan = None
+    
+    for assignment in itertools.product(range(num_chunks), repeat = len(costs)):
+        loads = [0.0] * num_chunks
+        
+        for cost, i in zip(costs, assignment):
+            loads[i] += cost
+        
+        makespan = max(loads) if makespan is None else min(makespan, max(loads))
+    
+    return makespan
+
+
+def check_partition_lpt(folder):
+    # every job in one chunk, chunk costs, longest chunks first, and the makespan against the optimal one
+    # (brute force): LPT is within 4/3 - 1/(3 m) of it, and reaches the bound on the classical worst case
+    
+    job_sets = [[3.1, 7.4, 2.2, 9.8, 5.5, 1.3, 6.6, 4.0, 8.7],
+                [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
+                [20.0, 1.5, 1.2, 0.9, 2.4, 0.3, 1.1],
+                [5.0, 5.0, 4.0, 4.0, 3.0, 3.0, 3.0]] # worst case of 3 chunks: 11 instead of 9
+    
+    for costs in job_sets:
+        for num_chunks in [2, 3]:
+            jobs = [("job_" + str(i), cost) for i, cost in enumerate(costs)]
+            chunks = cm.partition_lpt(jobs, num_chunks)
+            
+            names = sorted([name for chunk in chunks for name in chunk["jobs"]])
+            expect(names == sorted([name for name, cost in jobs]), "jobs lost or duplicated")
+            
+            for chunk in chunks:
+                expect_close(chunk["cost"], sum([dict(jobs)[name] for name in chunk["jobs"]]), 1e-12, "cost of a chunk")
+            
+            expect([chunk["cost"] for chunk in chunks] == sorted([chunk["cost"] for chunk in chunks], reverse = True), "chunks not longest first")
+            
+            optimal = get_optimal_makespan(costs, num_chunks)
+            bound = (4.0 / 3.0 - 1.0 / (3.0 * num_chunks)) * optimal
+            expect(chunks[0]["cost"] <= bound + 1e-9, "makespan " + repr(chunks[0]["cost"]) + " above the LPT bound " + repr(bound))
+    
+    expect_close(cm.partition_lpt([("job_" + str(i), cost) for i, cost in enumerate(job_sets[-1])], 3)[0]["cost"], 11.0, 0.0, "LPT worst case")
+    
+    expect(len(cm.partition_lpt([("a", 1.0), ("b", 2.0)], 5)) == 2, "more chunks than jobs")
+    expect(len(cm.partition_lpt([("a", 1.0), ("b", 2.0)], 0)) == 1, "no chunk")
+
+
+def check_solve_tridiagonal(folder):
+    # Thomas algorithm against a dense solve: stiffness matrices of shear buildings (get_tridiagonal) and a
+    # diagonally dominant non symmetric system
+    
+    random_state = np.random.RandomState(7)
+    systems = []
+    
+    for n in [1, 2, 5, 12]:
+        lower, diagonal, upper = st.get_tridiagonal(list(random_state.uniform(1e4, 1e6, n)))
+        systems.append((lower, diagonal, upper))
+    
+    n = 9
+    lower = [0.0] + list(random_state.uniform(-1.0, 1.0, n - 1))
+    upper = list(random_state.uniform(-1.0, 1.0, n - 1)) + [0.0]
+    systems.append((lower, list(random_state.uniform(3.0, 4.0, n)), upper))
+    
+    for lower, diagonal, upper in systems:
+        n = len(diagonal)
+        matrix = np.diag(diagonal) + np.diag(lower[1:], -1) + np.diag(upper[:-1], 1)
+        rhs = list(random_state.uniform(-1.0, 1.0, n))
+        
+        expect_close(st.solve_tridiagonal(lower, diagonal, upper, rhs), np.linalg.solve(matrix, rhs), 1e-10, "tridiagonal system of " + str(n) + " unknowns")
+
+
+def get_harmonic_response(omega, damping_ratio, amplitude, frequency, times):
+    # closed form displacement of a unit mass elastic oscillator at rest at t = 0 under the ground acceleration
+    # amplitude sin(frequency t): steady state + free vibration cancelling its initial displacement and velocity
+    
+    k = omega ** 2 - frequency ** 2
+    c = 2.0 * damping_ratio * omega * frequency
+    
+    sin_factor = -amplitude * k / (k ** 2 + c ** 2)
+    cos_factor = amplitude * c / (k ** 2 + c ** 2)
+    
+    damped_omega = omega * np.sqrt(1.0 - damping_ratio ** 2)
+    free_cos_factor = -cos_factor
+    free_sin_factor = (damping_ratio * omega * free_cos_factor - sin_factor * frequency) / damped_omega
+    
+    return (sin_factor * np.sin(frequency * times) + cos_factor * np.cos(frequency * times) +
+            np.exp(-damping_ratio * omega * times) * (free_cos_factor * np.cos(damped_omega * times) + free_sin_factor * np.sin(damped_omega * times)))
+
+
+harmonic_periods = [0.2, 0.5, 1.0, 2.0] # s
+harmonic_records = [(0.2, 1.3), (0.3, 0.4)] # (amplitude in g, frequency in Hz)
+
+
+def check_sdof_engine_elastic(folder):
+    # peaks of run_sdofs (Newmark average acceleration) for sdofs that never yield against the closed form under
+    # harmonic records: period elongation of about (omega dt)^2 / 12 per cycle
+    
+    dt = 0.002
+    times = np.arange(0.0, 8.0, dt)
+    gravity = se.default_options["gravity"]
+    
+    records = [amplitude * np.sin(2.0 * np.pi * frequency * times) for amplitude, frequency in harmonic_records]
+    
+    for damping_ratio in [0.0, 0.05]:
+        sdofs = []
+        
+        for period in harmonic_periods:
+            equivalent_mass = 150.0
+            stiffness = equivalent_mass * (2.0 * np.pi / period) ** 2
+            sdofs.append({"equivalent_mass": equivalent_mass, "yield_force": 1e9, "yield_displacement": 1e9 / stiffness})
+        
+        peaks = se.run_sdofs(sdofs, records, dt, options = {"damping_ratio": damping_ratio})
+        
+        reference = [[np.abs(get_harmonic_response(2.0 * np.pi / period, damping_ratio, amplitude * gravity, 2.0 * np.pi * frequency, times)).max()
+                      for amplitude, frequency in harmonic_records] for period in harmonic_periods]
+        
+        expect_close(peaks / np.array(reference), np.ones((len(harmonic_periods), len(harmonic_records))), 2e-3, "sdof peaks, damping ratio " + str(damping_ratio))
+
+
+def check_response_spectra_elastic(folder):
+    # peak displacements of get_elastic_displacements (piecewise exact, Nigam - Jennings) against the closed form:
+    # exact for a constant ground acceleration (piecewise linear), about (frequency dt)^2 / 12 for harmonic records
+    
+    dt = 0.002
+    times = np.arange(0.0, 8.0, dt)
+    gravity = 9.81
+    periods = np.array(harmonic_periods)
+    
+    for damping_ratio in [0.0, 0.05]:
+        omegas = 2.0 * np.pi / periods
+        damped_omegas = omegas * np.sqrt(1.0 - damping_ratio ** 2)
+        
+        # step: u = - ag / omega^2 (1 - e^(- damping_ratio omega t) (cos(damped_omega t) + damping_ratio omega / damped_omega sin(damped_omega t)))
+        reference = [np.abs(gravity / omega ** 2 * (1.0 - np.exp(-damping_ratio * omega * times) * (np.cos(damped_omega * times) + damping_ratio * omega / damped_omega * np.sin(damped_omega * times)))).max()
+                     for omega, damped_omega in zip(omegas, damped_omegas)]
+        
+        peaks = rs.get_elastic_displacements(np.full((1, len(times)), gravity), dt, periods, damping_ratio)
+        expect_close(peaks[0] / np.array(reference), np.ones(len(periods)), 1e-9, "constant ground acceleration, damping ratio " + str(damping_ratio))
+        
+        ground = np.array([amplitude * gravity * np.sin(2.0 * np.pi * frequency * times) for amplitude, frequency in harmonic_records])
+        peaks = rs.get_elastic_displacements(ground, dt, periods, damping_ratio)
+        
+        reference = [[np.abs(get_harmonic_response(omega, damping_ratio, amplitude * gravity, 2.0 * np.pi * frequency, times)).max()
+                      for omega in omegas] for amplitude, frequency in harmonic_records]
+        
+        expect_close(peaks / np.array(reference), np.ones((len(harmonic_records), len(periods))), 1e-4, "harmonic records, damping ratio " + str(damping_ratio))
+
+
+# (name, function of a temporary folder), in order
+checks = [("recorder_binary_rows", check_recorder_binary_rows),
+          ("script_archive", check_script_archive),
+          ("checkpoint_resume", check_checkpoint_resume),
+          ("partition_lpt", check_partition_lpt),
+          ("solve_tridiagonal", check_solve_tridiagonal),
+          ("sdof_engine_elastic", check_sdof_engine_elastic),
+          ("response_spectra_elastic", check_response_spectra_elastic)]
+
+
+def run_checks(names = None):
+    # {name: None (passed) or the error message}
+    
+    report = dict()
+    
+    for name, function in checks:
+        if names and name not in names:
+            continue
+        
+        folder = tempfile.mkdtemp(prefix = "simris_check_")
+        
+        try:
+            function(folder)
+            report[name] = None
+        except Exception:
+            report[name] = traceback.format_exc().strip().split('\n')[-1]
+        finally:
+            shutil.rmtree(folder, ignore_errors = True)
+    
+    return report
+
+
+if __name__ == "__main__":
+    
+    logging.basicConfig(level = logging.ERROR) # warnings expected by the checks (e.g. resuming a batch) not shown
+    
+    unknown = [name for name in sys.argv[1:] if name not in dict(checks)]
+    
+    if len(unknown) > 0:
+        print("unknown checks: " + ' '.join(unknown))
+        print("usage: python self_checks.py [" + ' | '.join([name for name, function in checks]) + " ...]")
+        sys.exit(1)
+    
+    report = run_checks(sys.argv[1:])
+    
+    for name, function in checks:
+        if name in report:
+            print(name.ljust(40) + ("ok" if report[name] is None else "FAILED"))
+            
+            if report[name] is not None:
+                print("    " + report[name])
+    
+    sys.exit(1 if len([error for error in report.values() if error is not None]) > 0 else 0)
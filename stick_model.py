@@ -0,0 +1,480 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Reduced order (stick) model of a building for fast nonlinear time-history analyses: the full 3D fiber model is
+# condensed into a shear building along one direction, one node per diaphragm (functions.calculate_diaphragms):
+#
+# - storey masses: the lumped masses of the nodes of every diaphragm (functions.calculate_nodal_masses)
+# - storey springs: bilinear kinematic shear - drift backbones, from the section data (see triage.get_shear_storeys:
+#   12 EI / h^3 per column with cracked stiffness, yield shear 2 My / h per column)
+# - calibration (optional): when the pushover of the full model has run, stiffnesses and yield shears are scaled so the
+#   first mode pushover of the stick has the yield point of the bilinearised capacity curve (surrogate.bilinearise)
+# - damping: Rayleigh, damping_ratio at the first mode and at three times its frequency
+#
+# The stick is either written as a tiny opensees model (zeroLength springs, Steel01, uniform excitation: one script per
+# building and record, any backend of emitters.py) or solved in-process (solve_time_history: Newmark average
+# acceleration with Newton iterations, the tridiagonal systems of the shear building solved directly), which takes a
+# fraction of a second per record instead of minutes for the fiber model.
+#
+# stick = get_stick(model, 'X')
+# response = solve_time_history(stick, accelerations, dt)  # accelerations in g
+#
+# usage: python stick_model.py tcl buildings_folder record_file dt output_folder [scale]
+#        python stick_model.py run buildings_folder record_file dt responses.jsonl [scale] [pushover_results_folder]
+#
+# (record_file: ground accelerations in g, whitespace separated, as read by the opensees Path time series)
+
+import sys
+import json
+import math
+import logging
+
+import model_builder as mb
+import archive_inputs as ai
+import write_tcl_source as w
+import triage as tr
+import emitters as em
+import errors as er
+
+try:
+    import recorder_reader as rr
+    import surrogate as sg
+except ImportError:
+    rr = None # IronPython: no calibration from the pushover recorders
+    sg = None
+
+
+logger = logging.getLogger(__name__)
+
+
+default_options = {"cracked_stiffness_factor": 0.5, # effective / gross flexural stiffness of the columns
+                   "hardening_ratio": 0.02, # post yield / elastic stiffness of the storey springs
+                   "damping_ratio": 0.05,
+                   "gravity": 9.81, # accelerations of the records in g
+                   "tolerance": 1e-8, # Newton iterations: norm of the displacement correction (m)
+                   "max_iterations": 20}
+
+
+def get_options(options = None):
+    
+    full_options = dict(default_options)
+    
+    if options is not None:
+        full_options.update(options)
+    
+    return full_options
+
+
+def get_stick(model, dir, options = None, bilinear = None):
+    # {"building_id", "dir", "storeys": [{"id", "height", "storey_height", "mass", "stiffness", "yield_shear"}],
+    #  "period", "hardening_ratio", "damping_ratio", "calibrated"} of a model of model_builder.build_model
+    # bilinear: {"yield_shear", "yield_displacement"} of the pushover of the full model in this direction (optional)
+    
+    if dir not in ('X', 'Y'):
+        raise er.DirectionError(dir)
+    
+    options = get_options(options)
+    
+    storeys = tr.get_shear_storeys(model, dir, options["cracked_stiffness_factor"])
+    
+    if bilinear is not None:
+        calibrate_storeys(storeys, bilinear)
+    
+    omega2, shape, yield_base_shear, yield_displacement = tr.get_yield_point(storeys)
+    
+    return {"building_id": model.building_id,
+            "dir": dir,
+            "storeys": storeys,
+            "period": 2.0 * math.pi / math.sqrt(omega2),
+            "hardening_ratio": options["hardening_ratio"],
+            "damping_ratio": options["damping_ratio"],
+            "calibrated": bilinear is not None}
+
+
+def calibrate_storeys(storeys, bilinear):
+    # scales the storey stiffnesses and yield shears (same distribution over the height) to the yield point of the
+    # full model: yield base shear and yield roof displacement under the first mode load pattern
+    
+    omega2, shape, yield_base_shear, yield_displacement = tr.get_yield_point(storeys)
+    
+    shear_factor = bilinear["yield_shear"] / yield_base_shear
+    stiffness_factor = shear_factor * yield_displacement / bilinear["yield_displacement"]
+    
+    for storey in storeys:
+        storey["stiffness"] *= stiffness_factor
+        storey["yield_shear"] *= shear_factor
+    
+    return storeys
+
+
+def get_pushover_bilinear(model, results_folder, case_name = None, binary = False):
+    # bilinear idealisation of the capacity curve of the model (recorders of its pushover in results_folder)
+    
+    if rr is None:
+        raise ImportError("numpy is needed to read the pushover recorders")
+    
+    summary = w.get_analysis_summary(model.nodes_dict, model.diaphragms)
+    
+    curve = rr.load_capacity_curve(results_folder, model.building_id, mb.get_case_name(model, case_name), model.max_storeys, len(summary["basal_node_ids"]), binary)
+    
+    return sg.bilinearise(curve[0], curve[1])
+
+
+def get_rayleigh_coefficients(period, damping_ratio):
+    # (mass, stiffness) proportional coefficients: damping_ratio at omega1 and 3 omega1 (about the second mode of a
+    # regular shear building)
+    
+    omega1 = 2.0 * math.pi / period
+    omega2 = 3.0 * omega1
+    
+    return (damping_ratio * 2.0 * omega1 * omega2 / (omega1 + omega2),
+            damping_ratio * 2.0 / (omega1 + omega2))
+
+
+def write_stick_script(outf, stick, record, building_id = None, options = None):
+    # opensees script of the stick under one record: {"name", "fname", "dt", "num_steps", "scale"}
+    # (fname: ground accelerations in g, one time series for the whole record)
+    # options: gravity and Newton test as in solve_time_history (see get_options)
+    
+    if building_id is None:
+        building_id = stick["building_id"]
+    
+    options = get_options(options)
+    
+    storeys = stick["storeys"]
+    alpha_m, beta_k = get_rayleigh_coefficients(stick["period"], stick["damping_ratio"])
+    
+    fname_base = building_id + "_stick_" + stick["dir"] + '_' + record["name"]
+    
+    outf.write("wipe" + '\n')
+    outf.write("model BasicBuilder -ndm 1 -ndf 1" + '\n')
+    
+    # zeroLength springs: every node at the same coordinate (the heights are only written as comments)
+    outf.write("\n#storey nodes and masses" + '\n')
+    outf.write("node 0 0.0" + '\n')
+    outf.write("fix 0 1" + '\n')
+    
+    for i, storey in enumerate(storeys):
+        outf.write("#diaphragm " + str(storey["id"]) + ", z = " + '%.2f' % storey["height"] + '\n')
+        outf.write("node " + str(i + 1) + " 0.0" + '\n')
+        outf.write("mass " + str(i + 1) + ' ' + repr(storey["mass"]) + '\n')
+    
+    outf.write("\n#storey springs (shear - drift)" + '\n')
+    
+    # -doRayleigh 1: without it zeroLength elements get no stiffness proportional damping (solve_time_history has it)
+    for i, storey in enumerate(storeys):
+        outf.write("uniaxialMaterial Steel01 " + str(i + 1) + ' ' + repr(storey["yield_shear"]) + ' ' + repr(storey["stiffness"]) + ' ' + repr(stick["hardening_ratio"]) + '\n')
+        outf.write("element zeroLength " + str(i + 1) + ' ' + str(i) + ' ' + str(i + 1) + " -mat " + str(i + 1) + " -dir 1 -doRayleigh 1" + '\n')
+    
+    outf.write("\nrayleigh " + repr(alpha_m) + " 0.0 " + repr(beta_k) + " 0.0" + '\n')
+    
+    outf.write("\n#ground motion" + '\n')
+    outf.write("timeSeries Path 1 -dt " + repr(record["dt"]) + " -filePath " + record["fname"] + " -factor " + repr(record.get("scale", 1.0) * options["gravity"]) + '\n')
+    outf.write("pattern UniformExcitation 1 1 -accel 1" + '\n')
+    
+    floor_ids = ' '.join([str(i + 1) for i in range(len(storeys))])
+    
+    outf.write("\n#recorders" + '\n')
+    outf.write("recorder Node -file results/stick/" + fname_base + "_floors.out -time -node " + floor_ids + " -dof 1 disp" + '\n')
+    outf.write("recorder Element -file results/stick/" + fname_base + "_springs.out -time -ele " + floor_ids + " force" + '\n')
+    
+    outf.write("\n#analysis" + '\n')
+    outf.write("constraints Plain" + '\n')
+    outf.write("numberer Plain" + '\n')
+    outf.write("system BandGeneral" + '\n')
+    outf.write("test NormDispIncr " + repr(options["tolerance"]) + ' ' + str(options["max_iterations"]) + '\n')
+    outf.write("algorithm Newton" + '\n')
+    outf.write("integrator Newmark 0.5 0.25" + '\n')
+    outf.write("analysis Transient" + '\n')
+    outf.write('\n' + "analyze " + str(int(record["num_steps"])) + ' ' + repr(record["dt"]) + '\n')
+    outf.write("wipe" + '\n')
+    
+    outf.flush()
+
+
+def get_stick_fname(stick, record, backend = "tcl"):
+    
+    return stick["building_id"] + "_stick_" + stick["dir"] + '_' + record["name"] + em.script_extensions[backend]
+
+
+def write_stick_file(stick, record, output_folder, backend = "tcl", options = None):
+    # writes output_folder/<building_id>_stick_<dir>_<record name>.tcl (.py with backend "openseespy")
+    
+    script_fname = get_stick_fname(stick, record, backend)
+    
+    outf = open(output_folder + script_fname, 'w')
+    
+    emitter = em.get_emitter(backend, outf)
+    write_stick_script(emitter, stick, record, options = options)
+    emitter.close()
+    
+    outf.close()
+    
+    return script_fname
+
+
+def solve_tridiagonal(lower, diagonal, upper, rhs):
+    # Thomas algorithm: lower[i] multiplies x[i - 1], upper[i] multiplies x[i + 1]
+    
+    n = len(diagonal)
+    c = [0.0] * n
+    d = [0.0] * n
+    
+    c[0] = upper[0] / diagonal[0]
+    d[0] = rhs[0] / diagonal[0]
+    
+    for i in range(1, n):
+        pivot = diagonal[i] - lower[i] * c[i - 1]
+        c[i] = upper[i] / pivot
+        d[i] = (rhs[i] - lower[i] * d[i - 1]) / pivot
+    
+    x = [0.0] * n
+    x[-1] = d[-1]
+    
+    for i in range(n - 2, -1, -1):
+        x[i] = d[i] - c[i] * x[i + 1]
+    
+    return x
+
+
+def get_tridiagonal(stiffnesses):
+    # (lower, diagonal, upper) of the stiffness matrix of a shear building
+    
+    n = len(stiffnesses)
+    
+    diagonal = [stiffnesses[i] + (stiffnesses[i + 1] if i + 1 < n else 0.0) for i in range(n)]
+    lower = [-stiffnesses[i] if i > 0 else 0.0 for i in range(n)]
+    upper = [-stiffnesses[i + 1] if i + 1 < n else 0.0 for i in range(n)]
+    
+    return lower, diagonal, upper
+
+
+def get_spring_force(drift, committed_drift, committed_force, stiffness, yield_shear, hardening_ratio):
+    # (force, tangent) of a bilinear kinematic spring (Steel01 without isotropic hardening) from its committed state
+    
+    force = committed_force + stiffness * (drift - committed_drift)
+    
+    hardening_stiffness = hardening_ratio * stiffness
+    upper_bound = hardening_stiffness * drift + (1.0 - hardening_ratio) * yield_shear
+    lower_bound = hardening_stiffness * drift - (1.0 - hardening_ratio) * yield_shear
+    
+    if force > upper_bound:
+        return upper_bound, hardening_stiffness
+    
+    if force < lower_bound:
+        return lower_bound, hardening_stiffness
+    
+    return force, stiffness
+
+
+def solve_time_history(stick, accelerations, dt, scale = 1.0, options = None, histories = False):
+    # nonlinear response of the stick to a ground motion (accelerations in g, time step dt)
+    # returns {"max_roof_displacement", "max_drifts" (per storey, drift / storey height), "max_drift",
+    #          "max_base_shear", "residual_roof_displacement", "unconverged_steps"} (+ "roof_displacement" history)
+    
+    options = get_options(options)
+    
+    storeys = stick["storeys"]
+    n = len(storeys)
+    
+    masses = [storey["mass"] for storey in storeys]
+    stiffnesses = [storey["stiffness"] for storey in storeys]
+    yield_shears = [storey["yield_shear"] for storey in storeys]
+    hardening_ratio = stick["hardening_ratio"]
+    
+    alpha_m, beta_k = get_rayleigh_coefficients(stick["period"], stick["damping_ratio"])
+    
+    # Newmark average acceleration
+    gamma = 0.5
+    beta = 0.25
+    a_u = 1.0 / (beta * dt ** 2)
+    a_v = gamma / (beta * dt)
+    
+    # damping: initial stiffness proportional, constant
+    c_lower, c_diagonal, c_upper = get_tridiagonal([beta_k * k for k in stiffnesses])
+    c_diagonal = [c_diagonal[i] + alpha_m * masses[i] for i in range(n)]
+    
+    def multiply_damping(v):
+        return [c_diagonal[i] * v[i] + (c_lower[i] * v[i - 1] if i > 0 else 0.0) + (c_upper[i] * v[i + 1] if i + 1 < n else 0.0) for i in range(n)]
+    
+    u = [0.0] * n
+    v = [0.0] * n
+    a = [0.0] * n
+    
+    drifts = [0.0] * n
+    forces = [0.0] * n
+    
+    max_drifts = [0.0] * n
+    max_roof_displacement = 0.0
+    max_base_shear = 0.0
+    unconverged_steps = 0
+    roof_displacement = []
+    
+    ground_factor = scale * options["gravity"]
+    
+    for step in range(1, len(accelerations)):
+        loads = [-masses[i] * accelerations[step] * ground_factor for i in range(n)]
+        
+        # displacement independent parts of the Newmark velocity and acceleration
+        v_base = [(1.0 - gamma / beta) * v[i] + dt * (1.0 - gamma / (2.0 * beta)) * a[i] for i in range(n)]
+        a_base = [-v[i] / (beta * dt) - (1.0 / (2.0 * beta) - 1.0) * a[i] for i in range(n)]
+        
+        new_u = list(u)
+        converged = False
+        
+        for iteration in range(options["max_iterations"]):
+            new_drifts = [new_u[i] - (new_u[i - 1] if i > 0 else 0.0) for i in range(n)]
+            
+            new_forces = []
+            tangents = []
+            
+            for i in range(n):
+                force, tangent = get_spring_force(new_drifts[i], drifts[i], forces[i], stiffnesses[i], yield_shears[i], hardening_ratio)
+                new_forces.append(force)
+                tangents.append(tangent)
+            
+            new_v = [a_v * (new_u[i] - u[i]) + v_base[i] for i in range(n)]
+            new_a = [a_u * (new_u[i] - u[i]) + a_base[i] for i in range(n)]
+            
+            damping_forces = multiply_damping(new_v)
+            
+            residual = [loads[i] - masses[i] * new_a[i] - damping_forces[i] - new_forces[i] + (new_forces[i + 1] if i + 1 < n else 0.0) for i in range(n)]
+            
+            lower, diagonal, upper = get_tridiagonal(tangents)
+            diagonal = [diagonal[i] + a_u * masses[i] + a_v * c_diagonal[i] for i in range(n)]
+            lower = [lower[i] + a_v * c_lower[i] for i in range(n)]
+            upper = [upper[i] + a_v * c_upper[i] for i in range(n)]
+            
+            correction = solve_tridiagonal(lower, diagonal, upper, residual)
+            new_u = [new_u[i] + correction[i] for i in range(n)]
+            
+            if max([abs(value) for value in correction]) <= options["tolerance"]:
+                converged = True
+                break
+        
+        if not converged:
+            unconverged_steps += 1
+        
+        # commit the step
+        new_drifts = [new_u[i] - (new_u[i - 1] if i > 0 else 0.0) for i in range(n)]
+        
+        for i in range(n):
+            forces[i] = get_spring_force(new_drifts[i], drifts[i], forces[i], stiffnesses[i], yield_shears[i], hardening_ratio)[0]
+        
+        v = [a_v * (new_u[i] - u[i]) + v_base[i] for i in range(n)]
+        a = [a_u * (new_u[i] - u[i]) + a_base[i] for i in range(n)]
+        u = new_u
+        drifts = new_drifts
+        
+        for i in range(n):
+            max_drifts[i] = max(max_drifts[i], abs(drifts[i]) / storeys[i]["storey_height"])
+        
+        max_roof_displacement = max(max_roof_displacement, abs(u[-1]))
+        max_base_shear = max(max_base_shear, abs(forces[0]))
+        
+        if histories:
+            roof_displacement.append(u[-1])
+    
+    if unconverged_steps > 0:
+        logger.warning(stick["building_id"] + " stick " + stick["dir"] + ": " + str(unconverged_steps) + " steps without convergence")
+    
+    response = {"max_roof_displacement": max_roof_displacement,
+                "max_drifts": max_drifts,
+                "max_drift": max(max_drifts),
+                "max_base_shear": max_base_shear,
+                "residual_roof_displacement": u[-1],
+                "unconverged_steps": unconverged_steps}
+    
+    if histories:
+        response["roof_displacement"] = roof_displacement
+    
+    return response
+
+
+def load_accelerations(fname):
+    # every value of the file in order (like the -filePath of an opensees Path time series)
+    
+    inf = open(fname)
+    accelerations = [float(token) for token in inf.read().split()]
+    inf.close()
+    
+    return accelerations
+
+
+def get_record(fname, dt, scale = 1.0, accelerations = None):
+    # record description of write_stick_script: named after its file
+    # num_steps: the Path time series starts at t = 0 with the first value, so the analysis stops at the last one
+    # after len - 1 steps (the steps of solve_time_history)
+    
+    if accelerations is None:
+        accelerations = load_accelerations(fname)
+    
+    name = fname.replace('\\', '/').split('/')[-1].rsplit('.', 1)[0]
+    
+    return {"name": name, "fname": fname, "dt": dt, "num_steps": len(accelerations) - 1, "scale": scale}
+
+
+def iter_sticks(base_folder, options = None, results_folder = None, cache = None):
+    # sticks (X and Y) of every building of base_folder, calibrated when results_folder has their pushover
+    
+    if cache is None:
+        cache = dict()
+    
+    for typology, import_fname, import_json_obj in ai.iter_inputs(base_folder):
+        if import_json_obj is None:
+            import_file = open(import_fname)
+            import_json_obj = json.load(import_file)
+            import_file.close()
+        
+        building_id = ai.get_building_id(import_fname)
+        
+        for dir in ('X', 'Y'):
+            model = mb.build_model(import_json_obj, {"dir": dir}, building_id, cache)
+            
+            bilinear = None
+            
+            if results_folder is not None:
+                try:
+                    bilinear = get_pushover_bilinear(model, results_folder)
+                except (IOError, OSError, ValueError):
+                    logger.info(building_id + ' ' + dir + ": no pushover results, stick from the section data")
+            
+            yield get_stick(model, dir, options, bilinear)
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) in (6, 7) and sys.argv[1] == "tcl":
+        record = get_record(sys.argv[3], float(sys.argv[4]), float(sys.argv[6]) if len(sys.argv) == 7 else 1.0)
+        output_folder = sys.argv[5] if sys.argv[5].endswith('/') else sys.argv[5] + '/'
+        
+        script_fnames = [write_stick_file(stick, record, output_folder) for stick in iter_sticks(sys.argv[2])]
+        
+        print(str(len(script_fnames)) + " stick scripts")
+    
+    elif len(sys.argv) in (6, 7, 8) and sys.argv[1] == "run":
+        accelerations = load_accelerations(sys.argv[3])
+        dt = float(sys.argv[4])
+        scale = float(sys.argv[6]) if len(sys.argv) >= 7 else 1.0
+        
+        outf = open(sys.argv[5], 'w')
+        count = 0
+        
+        for stick in iter_sticks(sys.argv[2], results_folder = sys.argv[7] if len(sys.argv) == 8 else None):
+            response = solve_time_history(stick, accelerations, dt, scale)
+            response["building_id"] = stick["building_id"]
+            response["dir"] = stick["dir"]
+            response["period"] = round(stick["period"], 4)
+            response["calibrated"] = stick["calibrated"]
+            outf.write(json.dumps(response, sort_keys = True) + '\n')
+            count += 1
+        
+        outf.close()
+        
+        print(str(count) + " stick responses")
+    
+    else:
+        print("usage: python stick_model.py tcl buildings_folder record_file dt output_folder [scale]")
+        print("       python stick_model.py run buildings_folder record_file dt responses.jsonl [scale] [pushover_results_folder]")
+        sys.exit(1)
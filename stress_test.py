@@ -0,0 +1,163 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# High-rise scaling stress test (headless, no Rhino needed)
+# Generates 20 - 40 storey synthetic buildings (10k - 100k elements), times every run_building stage,
+# fits the empirical scaling exponent of each stage (time ~ elements ^ k, least squares in log-log)
+# and fails when a stage scales super-linearly (k > max_exponent). Peak memory is reported as well
+#
+# usage: python stress_test.py [results.json]
+
+import sys
+import json
+import math as m
+import time
+import shutil
+import tempfile
+
+try:
+    import tracemalloc # python 3 only
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource # unix only
+except ImportError:
+    resource = None
+
+import benchmark as bm
+import synthetic_building as sb
+
+
+# (storeys, bays, spans) --> ~12k, ~24k, ~49k and ~97k elements
+default_sizes = [(20, 16, 12), (25, 20, 15), (30, 26, 20), (40, 30, 25)]
+
+# stages whose cost does not depend on the size of the building (e.g. sections) are not checked
+scaling_stages = ["import", "network", "diaphragms", "masses", "write"]
+
+
+def fit_exponent(sizes, times):
+    # least squares slope of log(time) vs log(size)
+    
+    xs = [m.log(s) for s in sizes]
+    ys = [m.log(max(t, 1e-9)) for t in times]
+    
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    
+    sxy = sum([(x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)])
+    sxx = sum([(x - x_mean) ** 2 for x in xs])
+    
+    return sxy / sxx
+
+
+def get_max_rss_mb():
+    # peak resident memory of the process so far (MB), monotonic: grows with the largest building run
+    
+    if resource is None:
+        return None
+    
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    if sys.platform == "darwin":
+        return max_rss / (1024.0 * 1024.0) # bytes
+    
+    return max_rss / 1024.0 # KB
+
+
+def run_stress_test(sizes = None, repeats = 1, trace_memory = True):
+    # best of repeats for every stage and size; memory is traced afterwards in separate runs
+    # (tracemalloc slows down allocation heavy stages and would distort the timings)
+    
+    if sizes is None:
+        sizes = default_sizes
+    
+    output_folder = tempfile.mkdtemp() + '/'
+    
+    results = []
+    
+    for storeys, bays, spans in sizes:
+        import_json_obj = sb.generate_building(storeys, bays, spans)
+        building_id = sb.get_building_id(storeys, bays, spans)
+        
+        best_timings = None
+        
+        for i in range(repeats):
+            timings = bm.run_stages(import_json_obj, building_id, 'X', output_folder)
+            
+            if best_timings is None:
+                best_timings = timings
+            else:
+                for stage in bm.stage_names:
+                    best_timings[stage] = min(best_timings[stage], timings[stage])
+        
+        results.append({"building_id": building_id,
+                        "storeys": storeys,
+                        "nodes": len(import_json_obj[0]),
+                        "elements": len(import_json_obj[1]),
+                        "timings": best_timings,
+                        "peak_traced_mb": None,
+                        "max_rss_mb": get_max_rss_mb()})
+        
+        import_json_obj = None
+    
+    if trace_memory and tracemalloc is not None:
+        for res, (storeys, bays, spans) in zip(results, sizes):
+            import_json_obj = sb.generate_building(storeys, bays, spans)
+            
+            tracemalloc.start()
+            bm.run_stages(import_json_obj, res["building_id"], 'X', output_folder)
+            res["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0), 2)
+            tracemalloc.stop()
+            
+            import_json_obj = None
+    
+    shutil.rmtree(output_folder)
+    
+    return results
+
+
+def check_scaling(results, max_exponent = 1.4, min_time = 0.01):
+    # scaling exponent of every stage, and the list of stages above max_exponent
+    # linear stages measure ~1.0 - 1.3 across this sweep (allocator / cache effects), per level
+    # lookups in lists, i.e. O(n * nodes per level), go above 1.4
+    # stages that always run faster than min_time seconds are not checked (timer noise)
+    
+    sizes = [res["elements"] for res in results]
+    
+    exponents = dict()
+    failures = []
+    
+    for stage in scaling_stages:
+        times = [res["timings"][stage] for res in results]
+        
+        exponents[stage] = round(fit_exponent(sizes, times), 3)
+        
+        if max(times) >= min_time and exponents[stage] > max_exponent:
+            failures.append(stage)
+    
+    return exponents, failures
+
+
+if __name__ == "__main__":
+    
+    results = run_stress_test(repeats = 3)
+    
+    bm.print_results(results)
+    
+    for res in results:
+        print(res["building_id"] + ": peak traced memory (MB): " + str(res["peak_traced_mb"]) + ", max rss (MB): " + str(res["max_rss_mb"]))
+    
+    exponents, failures = check_scaling(results)
+    
+    print("scaling exponents: " + str(exponents))
+    
+    if len(sys.argv) > 1:
+        outf = open(sys.argv[1], 'w')
+        json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results, "exponents": exponents, "failures": failures}, outf, indent = 1)
+        outf.close()
+    
+    if len(failures) > 0:
+        print("super-linear stages: " + str(failures))
+        sys.exit(1)
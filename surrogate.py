@@ -0,0 +1,334 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Surrogate of the pushover analysis: learns the bilinear capacity parameters (yield base shear, yield and ultimate
+# displacement) of the completed pushovers from the features of the imported structure and its sections
+# (archetypes.get_features), so new buildings with a confident prediction need no opensees run.
+#
+# - bilinearise: elastic - perfectly plastic idealisation of a capacity curve with the same energy up to the ultimate
+#   displacement (EC8 N2 method), the ultimate point being a 20% drop of the peak shear (or the end of the curve)
+# - the regression targets are scaled to the size of the building (shear / weight, displacement / height) and
+#   taken in log, so one model serves 1 to 12 storeys
+# - regression: ridge (numpy only) or, if scikit-learn is installed, gradient boosting (method "boosting")
+# - uncertainty: k-fold cross-validation residuals (log space) per target, inflated by the leverage of the building
+#   in the ridge feature space (buildings unlike the training set get a larger uncertainty)
+# - routing: a building whose relative uncertainty stays below max_uncertainty for every target takes the surrogate
+#   prediction instead of a full analysis (see surrogate_routing in main.py)
+#
+# usage: python surrogate.py train features.jsonl results_folder case_name surrogate.pkl [folds]
+#        python surrogate.py predict surrogate.pkl features.jsonl predictions.jsonl [max_uncertainty] [input_list]
+#
+# (features.jsonl: python archetypes.py features buildings_folder features.jsonl, results_folder: recorders of opensees,
+#  input_list: import file names of the buildings not routed to the surrogate, to be set as the input_list of main.py,
+#  which then generates only them; works from Rhino / IronPython, where numpy and so the routing of main.py are not
+#  available)
+
+import sys
+import json
+import math
+import pickle
+import random
+import logging
+
+import numpy as np
+
+import archetypes as at
+import recorder_reader as rr
+import errors as er
+
+try:
+    from sklearn.ensemble import GradientBoostingRegressor
+except ImportError:
+    GradientBoostingRegressor = None # numpy ridge only
+
+
+logger = logging.getLogger(__name__)
+
+
+targets = ["shear_coefficient", "yield_drift", "ultimate_drift"]
+
+
+def bilinearise(displacement, base_shear, drop = 0.2):
+    # {"yield_shear", "yield_displacement", "ultimate_displacement", "ductility"} of a capacity curve
+    
+    order = np.argsort(displacement, kind = "mergesort")
+    displacement = np.asarray(displacement)[order]
+    base_shear = np.asarray(base_shear)[order]
+    
+    peak_index = int(np.argmax(base_shear))
+    yield_shear = float(base_shear[peak_index])
+    
+    ultimate_index = len(displacement) - 1
+    dropped = np.nonzero(base_shear[peak_index:] < (1.0 - drop) * yield_shear)[0]
+    
+    if len(dropped) > 0:
+        ultimate_index = peak_index + int(dropped[0])
+    
+    ultimate_displacement = float(displacement[ultimate_index])
+    
+    # area under the curve up to the ultimate displacement
+    energy = float(np.sum((base_shear[1:ultimate_index + 1] + base_shear[:ultimate_index]) * np.diff(displacement[:ultimate_index + 1])) / 2.0)
+    
+    yield_displacement = 2.0 * (ultimate_displacement - energy / yield_shear)
+    yield_displacement = min(max(yield_displacement, 1e-6), ultimate_displacement)
+    
+    return {"yield_shear": yield_shear,
+            "yield_displacement": yield_displacement,
+            "ultimate_displacement": ultimate_displacement,
+            "ductility": ultimate_displacement / yield_displacement}
+
+
+def get_targets(bilinear, features):
+    # log of the size independent targets
+    
+    return [math.log(bilinear["yield_shear"] / features["weight"]),
+            math.log(bilinear["yield_displacement"] / features["height"]),
+            math.log(bilinear["ultimate_displacement"] / features["height"])]
+
+
+def get_bilinear(target_values, features):
+    # inverse of get_targets
+    
+    yield_displacement = math.exp(target_values[1]) * features["height"]
+    ultimate_displacement = math.exp(target_values[2]) * features["height"]
+    
+    return {"yield_shear": math.exp(target_values[0]) * features["weight"],
+            "yield_displacement": yield_displacement,
+            "ultimate_displacement": ultimate_displacement,
+            "ductility": ultimate_displacement / yield_displacement}
+
+
+class Surrogate:
+    def __init__(self, method = "ridge", ridge = 1.0, feature_names = None):
+        # method: "ridge" or "boosting" (scikit-learn)
+        
+        if method == "boosting" and GradientBoostingRegressor is None:
+            logger.warning("scikit-learn not available: ridge surrogate")
+            method = "ridge"
+        
+        self.method = method
+        self.ridge = ridge
+        self.feature_names = feature_names if feature_names is not None else at.feature_names
+        self.mean = None
+        self.std = None
+        self.coefficients = None # (num_features + 1) x num_targets
+        self.inverse_gram = None # (X'X + ridge I)^-1, leverage of new buildings
+        self.boosters = None
+        self.sigma = None # cross-validated residual std per target (log space)
+        self.cv_report = None
+    
+    
+    def get_matrix(self, features_list):
+        # standardised features with a column of ones
+        
+        x = np.array([[float(features[name]) for name in self.feature_names] for features in features_list])
+        x = (x - self.mean) / self.std
+        
+        return np.hstack([np.ones((x.shape[0], 1)), x])
+    
+    
+    def fit(self, features_list, targets_matrix):
+        
+        x = np.array([[float(features[name]) for name in self.feature_names] for features in features_list])
+        self.mean = x.mean(axis = 0)
+        self.std = x.std(axis = 0)
+        self.std[self.std == 0] = 1.0
+        
+        x = self.get_matrix(features_list)
+        y = np.asarray(targets_matrix)
+        
+        penalty = self.ridge * np.eye(x.shape[1])
+        penalty[0, 0] = 0.0 # intercept not penalised
+        
+        self.inverse_gram = np.linalg.inv(x.T.dot(x) + penalty)
+        self.coefficients = self.inverse_gram.dot(x.T.dot(y))
+        
+        if self.method == "boosting":
+            self.boosters = []
+            
+            for j in range(y.shape[1]):
+                booster = GradientBoostingRegressor(n_estimators = 200, max_depth = 3, learning_rate = 0.05, subsample = 0.8, random_state = 1)
+                booster.fit(x[:, 1:], y[:, j])
+                self.boosters.append(booster)
+        
+        if self.sigma is None:
+            # no cross-validation: training residuals (optimistic)
+            self.sigma = np.std(y - self.predict_targets(features_list), axis = 0)
+    
+    
+    def predict_targets(self, features_list):
+        
+        x = self.get_matrix(features_list)
+        
+        if self.boosters is not None:
+            return np.array([booster.predict(x[:, 1:]) for booster in self.boosters]).T
+        
+        return x.dot(self.coefficients)
+    
+    
+    def get_leverage(self, features_list):
+        
+        x = self.get_matrix(features_list)
+        
+        return np.einsum("ij,jk,ik->i", x, self.inverse_gram, x)
+    
+    
+    def predict(self, features):
+        # bilinear parameters of a building and the relative uncertainty of every target (1 sigma)
+        
+        target_values = self.predict_targets([features])[0]
+        leverage = self.get_leverage([features])[0]
+        
+        prediction = get_bilinear(target_values, features)
+        prediction["uncertainty"] = dict([(targets[j], round(math.exp(self.sigma[j] * math.sqrt(1.0 + leverage)) - 1.0, 4)) for j in range(len(targets))])
+        
+        return prediction
+    
+    
+    def save(self, fname):
+        
+        # the attributes only (the class is found by load_surrogate, also when trained from the command line)
+        
+        outf = open(fname, 'wb')
+        pickle.dump(self.__dict__, outf, 2)
+        outf.close()
+
+
+def load_surrogate(fname):
+    
+    inf = open(fname, 'rb')
+    attributes = pickle.load(inf)
+    inf.close()
+    
+    surrogate = Surrogate()
+    surrogate.__dict__.update(attributes)
+    
+    return surrogate
+
+
+def cross_validate(features_list, targets_matrix, folds = 5, method = "ridge", ridge = 1.0, seed = 1):
+    # (report, sigma): per target the mean relative error and the rmse (log space) of the k-fold predictions
+    
+    y = np.asarray(targets_matrix)
+    indices = list(range(len(features_list)))
+    random.Random(seed).shuffle(indices)
+    
+    folds = max(2, min(folds, len(indices)))
+    predictions = np.zeros(y.shape)
+    
+    for k in range(folds):
+        test = indices[k::folds]
+        test_set = set(test)
+        train = [i for i in indices if i not in test_set]
+        
+        surrogate = Surrogate(method, ridge)
+        surrogate.fit([features_list[i] for i in train], y[train])
+        predictions[test] = surrogate.predict_targets([features_list[i] for i in test])
+    
+    residuals = predictions - y
+    sigma = np.sqrt((residuals ** 2).mean(axis = 0))
+    
+    report = dict()
+    
+    for j, target in enumerate(targets):
+        report[target] = {"rmse_log": round(float(sigma[j]), 4),
+                          "mean_relative_error": round(float(np.abs(np.exp(residuals[:, j]) - 1.0).mean()), 4)}
+    
+    report["folds"] = folds
+    report["samples"] = len(indices)
+    
+    return report, sigma
+
+
+def load_training_data(features_list, results_folder, case_name, binary = False):
+    # (features, targets) of the buildings with a capacity curve in results_folder
+    
+    training_features = []
+    targets_matrix = []
+    
+    for features in features_list:
+        try:
+            curve = rr.load_capacity_curve(results_folder, features["building_id"], case_name, features["storeys"], features["num_basal_nodes"], binary)
+        except (IOError, OSError, ValueError):
+            continue # not analysed (yet)
+        
+        if len(curve[0]) < 3 or curve[1].max() <= 0:
+            continue
+        
+        training_features.append(features)
+        targets_matrix.append(get_targets(bilinearise(curve[0], curve[1]), features))
+    
+    return training_features, targets_matrix
+
+
+def train_surrogate(features_list, targets_matrix, folds = 5, method = "ridge", ridge = 1.0):
+    # surrogate fitted on every building, with the uncertainty of the cross-validation
+    
+    report, sigma = cross_validate(features_list, targets_matrix, folds, method, ridge)
+    
+    surrogate = Surrogate(method, ridge)
+    surrogate.sigma = sigma
+    surrogate.cv_report = report
+    surrogate.fit(features_list, targets_matrix)
+    
+    return surrogate
+
+
+def route(surrogate, features, max_uncertainty = 0.15):
+    # (True if the prediction can replace the analysis, prediction)
+    
+    prediction = surrogate.predict(features)
+    
+    return max(prediction["uncertainty"].values()) <= max_uncertainty, prediction
+
+
+if __name__ == "__main__":
+    
+    if len(sys.argv) in (6, 7) and sys.argv[1] == "train":
+        features_list, targets_matrix = load_training_data(at.load_jsonl(sys.argv[2]), sys.argv[3], sys.argv[4])
+        
+        surrogate = train_surrogate(features_list, targets_matrix, int(sys.argv[6]) if len(sys.argv) == 7 else 5,
+                                    "boosting" if GradientBoostingRegressor is not None else "ridge")
+        surrogate.save(sys.argv[5])
+        
+        print(surrogate.method + " surrogate, " + str(len(features_list)) + " pushovers")
+        print(json.dumps(surrogate.cv_report, indent = 4, sort_keys = True))
+    
+    elif len(sys.argv) in (5, 6, 7) and sys.argv[1] == "predict":
+        surrogate = load_surrogate(sys.argv[2])
+        max_uncertainty = float(sys.argv[5]) if len(sys.argv) >= 6 else 0.15
+        analysed_fnames = [] # import file names of the buildings needing an analysis
+        
+        outf = open(sys.argv[4], 'w')
+        routed = 0
+        
+        for features in at.load_jsonl(sys.argv[3]):
+            use_surrogate, prediction = route(surrogate, features, max_uncertainty)
+            prediction["building_id"] = features["building_id"]
+            prediction["use_surrogate"] = use_surrogate
+            outf.write(json.dumps(prediction, sort_keys = True) + '\n')
+            routed += int(use_surrogate)
+        
+            if len(sys.argv) == 7 and not use_surrogate:
+                if "import_fname" not in features:
+                    raise er.InputError("no import_fname in the features of " + features["building_id"] + ": extract them again with archetypes.py features")
+                
+                analysed_fnames.append(features["import_fname"])
+        
+        outf.close()
+        
+        if len(sys.argv) == 7:
+            outf = open(sys.argv[6], 'w')
+            
+            for import_fname in analysed_fnames:
+                outf.write(import_fname + '\n')
+            
+            outf.close()
+        
+        print(str(routed) + " buildings routed to the surrogate")
+    
+    else:
+        print("usage: python surrogate.py train features.jsonl results_folder case_name surrogate.pkl [folds]")
+        print("       python surrogate.py predict surrogate.pkl features.jsonl predictions.jsonl [max_uncertainty] [input_list]")
+        sys.exit(1)
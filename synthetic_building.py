@@ -0,0 +1,118 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Headless synthetic building generator (no Rhino needed)
+# Writes regular buildings in the importer format (see processing_importer.import_structure):
+# [nodes, elements] with
+# nodes: {"id", "coords", "fixes"}
+# elements: {"id", "node_id_1", "node_id_2", "type", "level", "load_area", "load_area_hint"}
+#
+# As in main.build_3D_structure: load bearing frames (beams) run along X and are
+# connected along Y by auxbeams, node ids start at 1 and are consecutive
+
+import os
+import json
+
+
+def generate_building(storeys, bays, spans, bay_length = 4.0, span_length = 5.0, storey_height = 3.0):
+    # storeys: number of levels above ground
+    # bays: number of bays of each frame (along X)
+    # spans: number of spans between frames (along Y), i.e. spans + 1 frames
+    
+    fixes = [1,1,1, 1,1,1]
+    free = [0,0,0, 0,0,0]
+    
+    nodes = []
+    elements = []
+    
+    node_ids = dict() # (level, i, j) --> node id
+    
+    node_id = 1
+    
+    for level in range(storeys + 1):
+        for j in range(spans + 1):
+            for i in range(bays + 1):
+                node_fixes = fixes if level == 0 else free
+                coords = [i * bay_length, j * span_length, level * storey_height]
+                
+                nodes.append({"id": node_id, "coords": coords, "fixes": list(node_fixes)})
+                node_ids[(level, i, j)] = node_id
+                node_id += 1
+    
+    elem_id = 1
+    
+    for level in range(1, storeys + 1):
+        
+        # columns (level of the slab they support)
+        for j in range(spans + 1):
+            for i in range(bays + 1):
+                elements.append({"id": elem_id,
+                                 "node_id_1": node_ids[(level - 1, i, j)],
+                                 "node_id_2": node_ids[(level, i, j)],
+                                 "type": "column",
+                                 "level": level,
+                                 "load_area": None,
+                                 "load_area_hint": "column"})
+                elem_id += 1
+        
+        # beams (load bearing frames along X): tributary area of half a span at each side
+        for j in range(spans + 1):
+            is_exterior = (j == 0 or j == spans)
+            tributary_width = span_length / 2.0 if is_exterior else span_length
+            
+            for i in range(bays):
+                elements.append({"id": elem_id,
+                                 "node_id_1": node_ids[(level, i, j)],
+                                 "node_id_2": node_ids[(level, i + 1, j)],
+                                 "type": "beam",
+                                 "level": level,
+                                 "load_area": bay_length * tributary_width,
+                                 "load_area_hint": "exterior" if is_exterior else "interior"})
+                elem_id += 1
+        
+        # auxbeams (non load bearing, along Y)
+        for i in range(bays + 1):
+            is_exterior = (i == 0 or i == bays)
+            
+            for j in range(spans):
+                elements.append({"id": elem_id,
+                                 "node_id_1": node_ids[(level, i, j)],
+                                 "node_id_2": node_ids[(level, i, j + 1)],
+                                 "type": "auxbeam",
+                                 "level": level,
+                                 "load_area": None,
+                                 "load_area_hint": "exterior" if is_exterior else "interior"})
+                elem_id += 1
+    
+    return [nodes, elements]
+
+
+def get_building_id(storeys, bays, spans):
+    
+    return "SYN" + str(storeys) + "S" + str(bays) + "B" + str(spans) + "P"
+
+
+def write_building(json_obj, fname):
+    
+    outf = open(fname, 'w')
+    json.dump(json_obj, outf)
+    outf.close()
+
+
+def generate_sweep(base_folder, sizes, typology = "S-type", **kwargs):
+    # writes one building per (storeys, bays, spans) into base_folder/typology/ (same layout as building_structure_results)
+    
+    folder = base_folder + '/' + typology
+    
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    
+    fnames = []
+    
+    for storeys, bays, spans in sizes:
+        fname = folder + '/' + get_building_id(storeys, bays, spans) + "_structure.json"
+        write_building(generate_building(storeys, bays, spans, **kwargs), fname)
+        fnames.append(fname)
+    
+    return fnames
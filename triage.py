@@ -0,0 +1,245 @@
+###########################################
+# All units to be input as KN, m, Kg, sec #
+###########################################
+
+# Quick triage of a building before its pushover (no opensees): the model is reduced to a shear building, one lumped
+# mass per diaphragm (calculate_nodal_masses) and one spring per storey (columns fixed at both ends, cracked stiffness),
+# which gives in a few microseconds:
+# - the fundamental period and mode shape (inverse power iteration)
+# - the roof yield displacement: load pattern of the first mode scaled until the weakest storey yields
+#   (storey yield shear: 2 My / h per column, My of selective_nonlinearity.get_yield_moment)
+# - the expected ultimate roof displacement: yield displacement x ductility, capped to a maximum drift of the height
+#
+# The pushover of the building then runs to a margin over the expected ultimate displacement, with a step size giving
+# steps_to_yield steps before yield, instead of the same 1 m / 1 mm for 1 to 12 storeys (see triage in main.get_run_config).
+# With a design peak ground acceleration (skip_ag, in g) a building whose yield shear coefficient exceeds the elastic
+# demand at its period, and without soft storey, is flagged as skippable: it stays elastic, no detailed analysis needed.
+
+import math
+
+import selective_nonlinearity as sn
+import errors as er
+
+
+default_options = {"enabled": False,
+                   "cracked_stiffness_factor": 0.5, # effective / gross flexural stiffness of the columns
+                   "ductility": 6.0, # expected ultimate / yield roof displacement
+                   "max_drift": 0.05, # cap of the expected ultimate roof displacement, fraction of the height
+                   "displacement_margin": 1.5, # pushover target / expected ultimate displacement
+                   "steps_to_yield": 25,
+                   "max_steps": 1000, # the step is not made smaller than target / max_steps
+                   "soft_storey_ratio": 0.7, # storey stiffness below this fraction of the storey above: soft storey
+                   "skip_ag": None, # design peak ground acceleration (g): None flags no building as skippable
+                   "spectrum_tc": 0.5, # corner period of the elastic demand plateau (s)
+                   "skip_flagged": False} # main.run_building: no script for the flagged buildings
+
+
+def get_options(options = None):
+    
+    full_options = dict(default_options)
+    
+    if options is not None:
+        full_options.update(options)
+    
+    return full_options
+
+
+def get_shear_storeys(model, dir, cracked_stiffness_factor = 0.5):
+    # [{"id", "height", "storey_height", "mass", "stiffness", "yield_shear"}] from the bottom storey up (id: diaphragm node)
+    
+    diaphragms = sorted(model.diaphragms.values(), key = lambda diaph: diaph["coords"][2])
+    levels = [diaph["coords"][2] for diaph in diaphragms]
+    
+    storeys = []
+    
+    for i, diaph in enumerate(diaphragms):
+        storeys.append({"id": diaph["id"],
+                        "height": levels[i],
+                        "storey_height": levels[i] - (levels[i - 1] if i > 0 else 0.0),
+                        "mass": sum([node.mass[0] for node in diaph["nodes"]]),
+                        "stiffness": 0.0,
+                        "yield_shear": 0.0})
+    
+    for elem in model.elements_dict.values():
+        if elem.type != "column":
+            continue
+        
+        top = max(elem.node1.coords[2], elem.node2.coords[2])
+        i = min(range(len(levels)), key = lambda k: abs(levels[k] - top))
+        
+        section = elem.section
+        e_mod = section.materials["unconfined_concrete"].properties["e_mod"]
+        inertia = section.i_z if dir == 'X' else section.i_y # square columns by default: same either way
+        
+        storeys[i]["stiffness"] += 12.0 * cracked_stiffness_factor * e_mod * inertia / elem.length ** 3
+        storeys[i]["yield_shear"] += 2.0 * sn.get_yield_moment(section) / elem.length
+    
+    # the shear building divides by the storey stiffnesses
+    for storey in storeys:
+        if storey["stiffness"] <= 0.0:
+            raise er.InputError("no columns below diaphragm " + str(storey["id"]) + " (level " + str(storey["height"]) + "): storey without lateral stiffness")
+    
+    return storeys
+
+
+def multiply_stiffness(stiffnesses, x):
+    # K x of a shear building (tridiagonal stiffness matrix)
+    
+    n = len(x)
+    result = []
+    
+    for i in range(n):
+        value = stiffnesses[i] * (x[i] - (x[i - 1] if i > 0 else 0.0))
+        
+        if i + 1 < n:
+            value -= stiffnesses[i + 1] * (x[i + 1] - x[i])
+        
+        result.append(value)
+    
+    return result
+
+
+def solve_stiffness(stiffnesses, loads):
+    # K x = loads of a shear building: storey shears from the top down, then drifts from the bottom up
+    
+    n = len(loads)
+    shears = [0.0] * n
+    shear = 0.0
+    
+    for i in range(n - 1, -1, -1):
+        shear += loads[i]
+        shears[i] = shear
+    
+    x = []
+    displacement = 0.0
+    
+    for i in range(n):
+        displacement += shears[i] / stiffnesses[i]
+        x.append(displacement)
+    
+    return x
+
+
+def get_fundamental_mode(masses, stiffnesses, iterations = 200, tolerance = 1e-10):
+    # (omega^2, mode shape with roof = 1) by inverse power iteration on K phi = omega^2 M phi
+    
+    shape = [float(i + 1) for i in range(len(masses))]
+    omega2 = None
+    
+    for iteration in range(iterations):
+        shape = solve_stiffness(stiffnesses, [masses[i] * shape[i] for i in range(len(masses))])
+        shape = [value / shape[-1] for value in shape]
+        
+        k_shape = multiply_stiffness(stiffnesses, shape)
+        new_omega2 = sum([shape[i] * k_shape[i] for i in range(len(shape))]) / sum([masses[i] * shape[i] ** 2 for i in range(len(shape))])
+        
+        if omega2 is not None and abs(new_omega2 - omega2) <= tolerance * new_omega2:
+            omega2 = new_omega2
+            break
+        
+        omega2 = new_omega2
+    
+    return omega2, shape
+
+
+def round_down(value, digits = 2):
+    # value rounded down to significant digits (readable tcl parameters)
+    
+    if value <= 0:
+        return value
+    
+    scale = 10 ** (digits - 1 - int(math.floor(math.log10(value))))
+    
+    return math.floor(value * scale) / scale
+
+
+def get_yield_point(storeys):
+    # (omega^2, mode shape, yield base shear, roof yield displacement) under the first mode load pattern
+    
+    masses = [storey["mass"] for storey in storeys]
+    stiffnesses = [storey["stiffness"] for storey in storeys]
+    
+    omega2, shape = get_fundamental_mode(masses, stiffnesses)
+    
+    # first mode load pattern: share of the base shear taken by every storey
+    loads = [masses[i] * shape[i] for i in range(len(masses))]
+    total_load = sum(loads)
+    shares = [sum(loads[i:]) / total_load for i in range(len(loads))]
+    
+    # base shear at which the weakest storey yields
+    yield_base_shear = min([storeys[i]["yield_shear"] / shares[i] for i in range(len(storeys))])
+    
+    displacement = 0.0
+    
+    for i in range(len(storeys)):
+        displacement += yield_base_shear * shares[i] / stiffnesses[i]
+    
+    return omega2, shape, yield_base_shear, displacement
+
+
+def triage_direction(model, dir, options):
+    
+    storeys = get_shear_storeys(model, dir, options["cracked_stiffness_factor"])
+    
+    masses = [storey["mass"] for storey in storeys]
+    stiffnesses = [storey["stiffness"] for storey in storeys]
+    
+    omega2, shape, yield_base_shear, displacement = get_yield_point(storeys)
+    period = 2.0 * math.pi / math.sqrt(omega2)
+    
+    height = storeys[-1]["height"]
+    ultimate_displacement = min(displacement * options["ductility"], options["max_drift"] * height)
+    weight = 9.81 * sum(masses)
+    
+    soft_storey = False
+    
+    for i in range(len(storeys) - 1):
+        if stiffnesses[i] < options["soft_storey_ratio"] * stiffnesses[i + 1]:
+            soft_storey = True
+    
+    return {"period": round(period, 4),
+            "yield_displacement": round(displacement, 5),
+            "yield_shear_coefficient": round(yield_base_shear / weight, 4),
+            "ultimate_displacement": round(ultimate_displacement, 5),
+            "ultimate_drift": round(ultimate_displacement / height, 5),
+            "soft_storey": soft_storey}
+
+
+def get_elastic_demand(period, ag, tc = 0.5):
+    # spectral acceleration (g) of a simplified elastic spectrum: plateau 2.5 ag up to tc, then 1 / T
+    
+    return 2.5 * ag * min(1.0, tc / period)
+
+
+def triage_model(model, options = None):
+    # triage of the pushover direction(s) of the model (both X and Y for multi case scripts) and the pushover range
+    
+    options = get_options(options)
+    
+    if model.config["load_cases"] is not None:
+        dirs = sorted(set([load_case[1] for load_case in model.config["load_cases"]]))
+    else:
+        dirs = [model.config["dir"]]
+    
+    results = dict([(dir, triage_direction(model, dir, options)) for dir in dirs])
+    
+    # one range for every case of the script: the largest target, the smallest step
+    ultimate_displacement = max([result["ultimate_displacement"] for result in results.values()])
+    yield_displacement = min([result["yield_displacement"] for result in results.values()])
+    
+    max_displ = round_down(ultimate_displacement * options["displacement_margin"], 3)
+    increment = max(yield_displacement / options["steps_to_yield"], max_displ / options["max_steps"])
+    
+    skip = False
+    
+    if options["skip_ag"] is not None:
+        skip = True
+        
+        for result in results.values():
+            if result["soft_storey"] or result["yield_shear_coefficient"] < get_elastic_demand(result["period"], options["skip_ag"], options["spectrum_tc"]):
+                skip = False
+    
+    return {"directions": results,
+            "pushover_max_displ": max_displ,
+            "pushover_increm": round_down(increment, 2),
+            "skip": skip}
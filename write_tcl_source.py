@@ -2,10 +2,28 @@
 # All units to be input as KN, m, Kg, sec #
 ###########################################
 
-import rhinoscriptsyntax as rs
+try:
+    import rhinoscriptsyntax as rs
+except ImportError:
+    rs = None # headless run (outside Rhino): drawing is not available
 import re
 import math as m
+import logging
 import functions as f
+import errors as er
+
+logger = logging.getLogger(__name__)
+
+elem_model_type = "hinge_integration" # one of: "distributed_plasticity", "hinge_integration" or "regularized_hinge_integration"
+
+# geometric transformations per element type: tag and vector in the local xz plane
+transf_type = "Linear"
+
+geomTransf_data = {
+                   "column" : {"tag_id" : 1, "str_vec" : " 0 1 0"},
+                   "beam" : {"tag_id" : 2, "str_vec" : " 0 0 1"},
+                   "auxbeam" : {"tag_id" : 3, "str_vec" : " 0 0 1"}
+                  }
 
 def write_nodes(outf, nodes):
     outf.write("\n#nodes coordinates" + '\n')
@@ -70,20 +88,6 @@ def write_nodal_masses(outf, nodes):
 def write_geom_transf(outf):
     outf.write("\n#transformation" + '\n')
     
-    vecs_xz = [None]*3
-    
-    vecs_xz[0] = " 0 1 0" #columns
-    vecs_xz[1] = " 0 0 1" #beams
-    vecs_xz[2] = " 0 0 1" #aux beams
-    
-    geomTransf_data = {
-                       "column" : {"tag_id" : 1, "str_vec" : vecs_xz[0]},
-                       "beam" : {"tag_id" : 2, "str_vec" : vecs_xz[1]},
-                       "auxbeam" : {"tag_id" : 3, "str_vec" : vecs_xz[2]}
-                      }
-                       
-    transf_type = "Linear"
-    
     for k, transf in geomTransf_data.items():
         g_tag = transf["tag_id"]
         str_vec = transf["str_vec"]
@@ -108,8 +112,7 @@ def write_sections(outf, sections):
     outf.write("\n#sections" + '\n')
     
     for key, sec in sections.items():
-        print("sec.g_mod: " + str(sec.g_mod))
-        print("sec.j: " + str(sec.j))
+        logger.debug("section " + str(sec.id) + " g_mod: " + str(sec.g_mod) + ", j: " + str(sec.j))
         str_section = sec.generate_fiber_section_string() + '\n'
         
         outf.write(str_section + '\n')
@@ -152,15 +155,20 @@ def write_beamWithHinges(outf, elements, geomTransf_data):
     outf.flush()
 
 
-def write_elements(outf, elements, geomTransf_data, num_integ_pts):
+def write_elements(outf, elements, geomTransf_data, num_integ_pts, elastic_element_ids = None):
     # element forceBeamColumn $eleTag $iNode $jNode $transfTag $integration <-mass $massDens> <-iter $maxIters $tol>
+    # elements in elastic_element_ids are written as elasticBeamColumn instead (see selective_nonlinearity.py)
     
     outf.write("\n#connectivity" + '\n')
     
-    elem_model_type = "hinge_integration" # one of: "distributed_plasticity", "hinge_integration" or "regularized_hinge_integration"
+    if elastic_element_ids is None:
+        elastic_element_ids = set()
     
     for elem in elements:
-        elem_str = elem.generate_element_string(geomTransf_data, elem_model_type, num_integ_pts)
+        if elem.id in elastic_element_ids:
+            elem_str = elem.generate_elastic_element_string(geomTransf_data)
+        else:
+            elem_str = elem.generate_element_string(geomTransf_data, elem_model_type, num_integ_pts)
         
         outf.write(elem_str + '\n')
         
@@ -225,56 +233,92 @@ def write_gravitational_loads(outf, elements):
     outf.flush()
 
 
-def write_pushover_loads(outf, diaphragms, dir, max_height, draw = False):
+def write_pushover_loads(outf, storeys, dir, max_height, draw = False, sign = 1.0, eccentricity_sign = 0, accidental_eccentricity = 0.05, loadPattern_tag = 2):
+    # storeys: diaphragm summaries (see get_analysis_summary)
+    # sign: 1.0 pushes towards the positive axis, -1.0 towards the negative one
+    # eccentricity_sign: 0 (no accidental eccentricity), 1 or -1 --> the storey force is shifted
+    # accidental_eccentricity times the plan dimension perpendicular to the load (EC8 4.3.2), i.e. a torsional moment is added
+    
     outf.write("\n#define pushover load pattern" + '\n')
     
-    loadPattern_tag = 2
     ts_type = "Linear"
     
     outf.write("pattern Plain " + str(loadPattern_tag) + ' ' + ts_type + " {" + '\n')
     
-    for diaph in diaphragms.values():
+    for diaph in storeys:
         storey_height = diaph["coords"][2]
-        total_weight = 9.81 * sum([node.mass[0] for node in diaph["nodes"]])
-        pushover_load = round(total_weight * storey_height / (max_height * 1.00), 2)
+        total_weight = diaph["weight"]
+        pushover_load = round(sign * total_weight * storey_height / (max_height * 1.00), 2)
+        
+        x_dim, y_dim = diaph["x_dim"], diaph["y_dim"]
         
         str_load = None
         if dir == 'X':
-            str_load = str(pushover_load) + " 0.0 0.0" + " 0.0 0.0 0.0"
+            # force along X applied at y = +/- e --> Mz = -Fx * e
+            torsional_moment = round(-pushover_load * eccentricity_sign * accidental_eccentricity * y_dim, 2)
+            str_load = str(pushover_load) + " 0.0 0.0" + " 0.0 0.0 " + str(torsional_moment if eccentricity_sign else 0.0)
             
             if draw:
                 rs.AddLine(diaph["coords"], [diaph["coords"][0] + pushover_load/10.0, diaph["coords"][1], diaph["coords"][2]])
                 
         elif dir == 'Y':
-            str_load = "0.0 " + str(pushover_load) + " 0.0" + " 0.0 0.0 0.0"
+            # force along Y applied at x = +/- e --> Mz = Fy * e
+            torsional_moment = round(pushover_load * eccentricity_sign * accidental_eccentricity * x_dim, 2)
+            str_load = "0.0 " + str(pushover_load) + " 0.0" + " 0.0 0.0 " + str(torsional_moment if eccentricity_sign else 0.0)
             
             if draw:
                 rs.AddLine(diaph["coords"], [diaph["coords"][0], diaph["coords"][1] + pushover_load/10.0, diaph["coords"][2]])
                 
         else:
-            print("Fatal error: no valid direction ('X' or 'Y') was passed to the function.")
-            raise BaseException
+            raise er.DirectionError(dir)
         
         outf.write("load " + str(diaph["id"]) + " " + str_load + '\n')
         
     outf.write("}\n\n")
 
 
-def write_recorders(outf, building_id, control_node_id, nodes, diaphragms, dir, max_storeys):
+def get_recorder_output_string(fname_base, recorder_options):
+    # recorder_options = {"binary": True / False, "dT": None or time interval between records}
+    # text recorders go to .out files, binary ones (raw doubles, see recorder_reader.py) to .bin files
+    # note that during the pushover (DisplacementControl) the time recorded by opensees is the load factor, 
+    # so dT decimates by load factor increments rather than by number of steps (every N steps: see recorder_reader.py)
+    
+    if recorder_options is None:
+        recorder_options = {"binary": False, "dT": None}
+    
+    if recorder_options.get("binary"):
+        output_str = "-binary " + fname_base + ".bin -time"
+    else:
+        output_str = "-file " + fname_base + ".out -time"
+    
+    if recorder_options.get("dT") is not None:
+        output_str += " -dT " + str(recorder_options["dT"])
+    
+    return output_str
+
+
+def write_recorders(outf, building_id, control_node_id, basal_node_ids, storeys, dir, max_storeys, case_name = None, region_tag = 1, recorder_options = None):
+    # basal_node_ids, storeys: fixed nodes and diaphragm summaries (see get_analysis_summary)
+    # case_name: tag used in the output file names (defaults to the direction)
+    
     outf.write("#recorders" + '\n')
     
+    if case_name is None:
+        case_name = dir
+    
+    fname_base = building_id + '_' + case_name + '_L' + str(max_storeys)
+    
     dof = None
     if dir == 'X':
         dof = 1
     elif dir == 'Y':
         dof = 2
     else:
-        print("Fatal error: no valid direction ('X' or 'Y') was passed to the function.")
-        raise BaseException
+        raise er.DirectionError(dir)
     
-    outf.write("recorder Node -file results/displacement/" + 
-               building_id + '_' + dir + '_L' + str(max_storeys) + 
-               "_control_node.out -time -node " +
+    outf.write("recorder Node " + 
+               get_recorder_output_string("results/displacement/" + fname_base + "_control_node", recorder_options) + 
+               " -node " +
                str(control_node_id) + 
                " -dof " + str(dof) + 
                " disp" + 
@@ -283,13 +327,13 @@ def write_recorders(outf, building_id, control_node_id, nodes, diaphragms, dir,
     
     diaph_nodes_ids = ''
     
-    for diaph in sorted(diaphragms.values(), key=lambda k: k['coords'][2]):
+    for diaph in sorted(storeys, key=lambda k: k['coords'][2]):
         diaph_nodes_ids += ' ' + diaph['id']
         #print("diaph_node_id " + diaph['id'] + ": " + str(diaph['coords'][2]) + "m")
         
-    outf.write("recorder Node -file results/slabs_displacement/" + 
-               building_id + '_' + dir + '_L' + str(max_storeys) + 
-               "_slabs.out -time -node" +
+    outf.write("recorder Node " + 
+               get_recorder_output_string("results/slabs_displacement/" + fname_base + "_slabs", recorder_options) + 
+               " -node" +
                str(diaph_nodes_ids) + 
                " -dof " + str(dof) + 
                " disp" + 
@@ -298,19 +342,16 @@ def write_recorders(outf, building_id, control_node_id, nodes, diaphragms, dir,
     
     basal_nodes_ids = ''
     
-    for n in nodes:
-        if n.fixes == [1,1,1, 1,1,1]:
-            basal_nodes_ids += ' ' + str(n.id)
-            #c = rs.AddCircle(n.coords, .5)
-            #rs.ObjectLayer(c, "Layer 05")
+    for node_id in basal_node_ids:
+        basal_nodes_ids += ' ' + str(node_id)
     
     # group all ground nodes into a region for easier handling
     outf.write("\n#group all ground nodes into a region for easier handling" + '\n')
-    outf.write("region 1 -nodeOnly" + basal_nodes_ids + '\n')
+    outf.write("region " + str(region_tag) + " -nodeOnly" + basal_nodes_ids + '\n')
     
-    outf.write("recorder Node -file results/shear/" + 
-               building_id + '_' + dir + '_L' + str(max_storeys) + 
-               "_basal_nodes.out -time -region 1" +
+    outf.write("recorder Node " + 
+               get_recorder_output_string("results/shear/" + fname_base + "_basal_nodes", recorder_options) + 
+               " -region " + str(region_tag) +
                " -dof " + str(dof) + 
                " reaction" + 
                '\n\n')
@@ -353,7 +394,7 @@ def write_gravitational_analysis(outf, dir, control_node_id, total_steps = 40):
     outf.flush()
 
 
-def write_pushover_analysis(outf, dir, control_node_id, max_displacement = 1.0, increment = 0.001):
+def write_pushover_analysis(outf, dir, control_node_id, max_displacement = 1.0, increment = 0.001, sign = 1.0, wipe = True):
     
     total_steps = max_displacement / increment
     
@@ -363,46 +404,106 @@ def write_pushover_analysis(outf, dir, control_node_id, max_displacement = 1.0,
     elif dir == 'Y':
         dof = 2
     else:
-        print("Fatal error: no valid direction ('X' or 'Y') was passed to the function.")
-        raise BaseException
+        raise er.DirectionError(dir)
     
     analysis_str = ("#pushover analysis" + '\n' + 
                     "integrator DisplacementControl " + 
                     str(control_node_id) + ' ' + 
                     str(dof) + ' ' + 
-                    str(increment) + '\n' +
+                    str(sign * increment) + '\n' +
                     '\n' + 
                     "analyze " + str(int(total_steps)) + '\n'
                     )
     
     outf.write(analysis_str)
-    outf.write("wipe\n") #clear the model and allow opensees writing the output files to disk
+    
+    if wipe:
+        outf.write("wipe\n") #clear the model and allow opensees writing the output files to disk
     
     outf.flush()
 
 
-def write_opensees_file(materials, 
-                        sections, 
-                        nodes_dict, 
-                        elements_dict, 
-                        diaphragms, 
-                        dir, 
-                        num_integ_pts, 
-                        building_id, 
-                        analysis_data, 
-                        max_storeys,
-                        bool_draw):
+def write_pushover_case(outf, building_id, analysis_summary, max_storeys, load_case, case_index, analysis_data, recorder_options = None):
+    # one pushover of a multi-case file: the gravity state is restored from the database,
+    # the case gets its own load pattern, region and recorder files, and everything is removed afterwards
     
+    case_name, dir, sign, eccentricity_sign = load_case
     grav_total_steps, pushover_max_displ, pushover_increm = analysis_data
+    control_node_id = analysis_summary["control_node_id"]
     
-    nodes = nodes_dict.values()
-    elements = elements_dict.values()
+    loadPattern_tag = case_index + 2 # pattern 1 is the gravitational one
+    region_tag = case_index + 1
     
-    #First sort lists by id
-    nodes.sort(key=lambda x: x.id, reverse=False)
-    elements.sort(key=lambda x: x.id, reverse=False)
+    outf.write("\n#load case " + case_name + '\n')
+    
+    if case_index > 0:
+        outf.write("restore 1" + '\n')
+    
+    write_pushover_loads(outf, analysis_summary["storeys"], dir, analysis_summary["max_height"], False, sign, eccentricity_sign, loadPattern_tag = loadPattern_tag)
+    
+    write_recorders(outf, building_id, control_node_id, analysis_summary["basal_node_ids"], analysis_summary["storeys"], dir, max_storeys, case_name, region_tag, recorder_options)
     
-    outf = open("test-bed/bin/tcl_files/" + building_id + "_" + dir + ".tcl", 'w')
+    write_analysis_settings(outf)
+    
+    outf.write("analysis Static" + '\n')
+    
+    write_pushover_analysis(outf, dir, control_node_id, pushover_max_displ, pushover_increm, sign, wipe = False)
+    
+    # closing the recorders flushes their files to disk
+    outf.write("remove recorders" + '\n')
+    outf.write("remove loadPattern " + str(loadPattern_tag) + '\n')
+    outf.write("wipeAnalysis" + '\n')
+    
+    outf.flush()
+
+
+def get_default_load_cases():
+    # (case_name, dir, sign, eccentricity_sign)
+    # case names are used in the recorder file names: 'X' and 'Y' keep the names of the single direction files
+    
+    load_cases = [("X", 'X', 1.0, 0),
+                  ("Xneg", 'X', -1.0, 0),
+                  ("Y", 'Y', 1.0, 0),
+                  ("Yneg", 'Y', -1.0, 0),
+                  ("X_ecc_pos", 'X', 1.0, 1),
+                  ("X_ecc_neg", 'X', 1.0, -1),
+                  ("Y_ecc_pos", 'Y', 1.0, 1),
+                  ("Y_ecc_neg", 'Y', 1.0, -1)
+                 ]
+    
+    return load_cases
+
+
+def get_analysis_summary(nodes_dict, diaphragms):
+    # everything the recorders and the analyses need from the model (json serialisable): 
+    # the analysis part of a script can be written from it alone (see model_builder.write_model_files)
+    
+    control_node_id, max_height = f.get_control_node(diaphragms)
+    
+    storeys = []
+    
+    for diaph in diaphragms.values():
+        x_dim, y_dim = f.get_diaphragm_dimensions(diaph)
+        
+        storeys.append({"id": diaph["id"],
+                        "coords": diaph["coords"],
+                        "weight": 9.81 * sum([node.mass[0] for node in diaph["nodes"]]),
+                        "x_dim": x_dim,
+                        "y_dim": y_dim})
+    
+    basal_node_ids = []
+    
+    for n in sorted(nodes_dict.values(), key=lambda x: x.id):
+        if n.fixes == [1,1,1, 1,1,1]:
+            basal_node_ids.append(n.id)
+    
+    return {"control_node_id": control_node_id,
+            "max_height": max_height,
+            "storeys": storeys,
+            "basal_node_ids": basal_node_ids}
+
+
+def write_model(outf, materials, sections, nodes, elements, diaphragms, num_integ_pts, elastic_element_ids = None):
     
     ndm = 3
     ndf = 6
@@ -431,18 +532,122 @@ def write_opensees_file(materials,
     write_sections(outf, sections)
     
     # Elements (beamWithHinges) and their connectivity
-    write_elements(outf, elements, geomTransf_data, num_integ_pts)
+    write_elements(outf, elements, geomTransf_data, num_integ_pts, elastic_element_ids)
     #write_elements2(outf, elements, geomTransf_data, num_integ_pts)
     #write_elements3(outf, elements, geomTransf_data, num_integ_pts)
     
     # Gravitational loads
     write_gravitational_loads(outf, elements)
     
-    # Get the control node
-    control_node_id, max_height = f.get_control_node(diaphragms)
+
+def write_opensees_file(materials,
+                        sections,
+                        nodes_dict,
+                        elements_dict,
+                        diaphragms,
+                        dir,
+                        num_integ_pts,
+                        building_id,
+                        analysis_data,
+                        max_storeys,
+                        bool_draw,
+                        output_folder = "test-bed/bin/tcl_files/",
+                        recorder_options = None,
+                        elastic_element_ids = None,
+                        case_name = None):
+    
+    # case_name: tag of the file and recorder names (defaults to the direction)
+    
+    if case_name is None:
+        case_name = dir
+    
+    tcl_fname = building_id + "_" + case_name + ".tcl"
+    
+    outf = open(output_folder + tcl_fname, 'w')
+    
+    write_opensees_script(outf, 
+                          materials, 
+                          sections, 
+                          nodes_dict, 
+                          elements_dict, 
+                          diaphragms, 
+                          dir, 
+                          num_integ_pts, 
+                          building_id, 
+                          analysis_data, 
+                          max_storeys, 
+                          bool_draw, 
+                          recorder_options, 
+                          elastic_element_ids, 
+                          case_name)
+    
+    outf.close()
+    
+    return tcl_fname
+
+
+def write_opensees_script(outf,
+                          materials,
+                          sections,
+                          nodes_dict,
+                          elements_dict,
+                          diaphragms,
+                          dir,
+                          num_integ_pts,
+                          building_id,
+                          analysis_data,
+                          max_storeys,
+                          bool_draw,
+                          recorder_options = None,
+                          elastic_element_ids = None,
+                          case_name = None):
+    
+    # single direction script written into outf (any object with write / flush, e.g. a file or a StringIO)
+    
+    # Model: nodes, diaphragms, materials, sections, elements and gravitational loads
+    write_model_script(outf, materials, sections, nodes_dict, elements_dict, diaphragms, num_integ_pts, elastic_element_ids)
+    
+    # Recorders and analyses
+    write_analysis_script(outf, building_id, get_analysis_summary(nodes_dict, diaphragms), dir, analysis_data, max_storeys, bool_draw, recorder_options, case_name)
+
+
+def write_model_script(outf, materials, sections, nodes_dict, elements_dict, diaphragms, num_integ_pts, elastic_element_ids = None):
+    
+    #First sort lists by id
+    nodes = sorted(nodes_dict.values(), key=lambda x: x.id, reverse=False)
+    elements = sorted(elements_dict.values(), key=lambda x: x.id, reverse=False)
+    
+    write_model(outf, materials, sections, nodes, elements, diaphragms, num_integ_pts, elastic_element_ids)
+
+
+def write_source_command(outf, model_fname):
+    # analysis file sourcing its model file from the same folder (wherever opensees is run from)
+    
+    outf.write("source [file join [file dirname [info script]] " + model_fname + "]" + '\n')
+
+
+def write_analysis_script(outf,
+                          building_id,
+                          analysis_summary,
+                          dir,
+                          analysis_data,
+                          max_storeys,
+                          bool_draw,
+                          recorder_options = None,
+                          case_name = None):
+    
+    # recorders and analyses of a single direction script (analysis_summary: see get_analysis_summary)
+    
+    grav_total_steps, pushover_max_displ, pushover_increm = analysis_data
+    
+    if case_name is None:
+        case_name = dir
+    
+    control_node_id = analysis_summary["control_node_id"]
+    max_height = analysis_summary["max_height"]
     
     # Recorders
-    write_recorders(outf, building_id, control_node_id, nodes, diaphragms, dir, max_storeys)
+    write_recorders(outf, building_id, control_node_id, analysis_summary["basal_node_ids"], analysis_summary["storeys"], dir, max_storeys, case_name, recorder_options = recorder_options)
     #write_interstoreyDrift_recorders(outf, building_id, diaphragms, nodes, dir)
     
     # Analysis settings
@@ -452,10 +657,169 @@ def write_opensees_file(materials,
     write_gravitational_analysis(outf, dir, control_node_id, grav_total_steps)
     
     # Pushover loads
-    write_pushover_loads(outf, diaphragms, dir, max_height, bool_draw)
+    write_pushover_loads(outf, analysis_summary["storeys"], dir, max_height, bool_draw)
     
     # Pushover analysis
     write_pushover_analysis(outf, dir, control_node_id, pushover_max_displ, pushover_increm)
     
+
+def write_opensees_multicase_file(materials,
+                                  sections,
+                                  nodes_dict,
+                                  elements_dict,
+                                  diaphragms,
+                                  load_cases,
+                                  num_integ_pts,
+                                  building_id,
+                                  analysis_data,
+                                  max_storeys,
+                                  output_folder = "test-bed/bin/tcl_files/",
+                                  recorder_options = None):
+    
+    # single opensees run for all the load cases of a building:
+    # the model is built and the gravitational analysis is run only once,
+    # the resulting state is saved into a database and restored before every pushover
+    
+    tcl_fname = building_id + "_cases.tcl"
+    
+    outf = open(output_folder + tcl_fname, 'w')
+    
+    write_opensees_multicase_script(outf, 
+                                    materials, 
+                                    sections, 
+                                    nodes_dict, 
+                                    elements_dict, 
+                                    diaphragms, 
+                                    load_cases, 
+                                    num_integ_pts, 
+                                    building_id, 
+                                    analysis_data, 
+                                    max_storeys, 
+                                    recorder_options)
+    
     outf.close()
+    
+    return tcl_fname
+
+
+def write_opensees_multicase_script(outf,
+                                    materials,
+                                    sections,
+                                    nodes_dict,
+                                    elements_dict,
+                                    diaphragms,
+                                    load_cases,
+                                    num_integ_pts,
+                                    building_id,
+                                    analysis_data,
+                                    max_storeys,
+                                    recorder_options = None):
+    
+    # multi case script written into outf (any object with write / flush, e.g. a file or a StringIO)
+    
+    # Model: nodes, diaphragms, materials, sections, elements and gravitational loads
+    write_model_script(outf, materials, sections, nodes_dict, elements_dict, diaphragms, num_integ_pts)
+    
+    # Gravity state and pushover cases
+    write_multicase_analysis_script(outf, building_id, get_analysis_summary(nodes_dict, diaphragms), load_cases, analysis_data, max_storeys, recorder_options)
 
+
+def write_multicase_analysis_script(outf,
+                                    building_id,
+                                    analysis_summary,
+                                    load_cases,
+                                    analysis_data,
+                                    max_storeys,
+                                    recorder_options = None):
+    
+    # analyses of a multi case script (analysis_summary: see get_analysis_summary)
+    # heads-up: the recorders of every case are defined after the gravity analysis (restored from the database), so
+    # unlike the single direction scripts their files have no gravity steps: the first row is the gravity state
+    
+    grav_total_steps, pushover_max_displ, pushover_increm = analysis_data
+    
+    control_node_id = analysis_summary["control_node_id"]
+    
+    # Analysis settings
+    outf.write('\n')
+    write_analysis_settings(outf)
+    
+    # Gravitational analysis (run once for all cases)
+    write_gravitational_analysis(outf, None, control_node_id, grav_total_steps)
+    
+    # Save the gravity state
+    outf.write("\n#save gravity state" + '\n')
+    outf.write("file mkdir results/database" + '\n') # not created by opensees
+    outf.write("database File results/database/" + building_id + '\n')
+    outf.write("save 1" + '\n')
+    outf.write("wipeAnalysis" + '\n')
+    
+    # Pushover cases
+    for case_index, load_case in enumerate(load_cases):
+        write_pushover_case(outf, building_id, analysis_summary, max_storeys, load_case, case_index, analysis_data, recorder_options)
+    
+    outf.write("wipe\n") #clear the model and allow opensees writing the output files to disk
+
+
+def write_batch_driver(outf, tcl_fnames, status_fname, model_folder = "tcl_files/"):
+    # driver script that runs several building models inside a single opensees process
+    # every model is isolated with catch (a failing building does not stop the batch) and 
+    # gets one status line: model_file,OK|FAILED,elapsed_seconds,error_message
+    # paths are relative to the folder opensees is run from (test-bed/bin)
+    
+    outf.write("# batch driver: " + str(len(tcl_fnames)) + " models in a single opensees process" + '\n')
+    outf.write("file mkdir [file dirname " + status_fname + "]" + '\n')
+    outf.write("set status_file [open " + status_fname + " w]" + '\n\n')
+    
+    outf.write("foreach model_file {" + '\n')
+    
+    for tcl_fname in tcl_fnames:
+        outf.write("    " + model_folder + tcl_fname + '\n')
+    
+    driver_str = ("} {" + '\n' + 
+                  "    wipe" + '\n' + 
+                  "    set start_time [clock milliseconds]" + '\n' + 
+                  "    if {[catch {source $model_file} error_msg]} {" + '\n' + 
+                  "        set status FAILED" + '\n' + 
+                  "    } else {" + '\n' + 
+                  "        set status OK" + '\n' + 
+                  "        set error_msg \"\"" + '\n' + 
+                  "    }" + '\n' + 
+                  "    wipe" + '\n' + 
+                  "    set elapsed [expr {([clock milliseconds] - $start_time) / 1000.0}]" + '\n' + 
+                  "    puts $status_file \"$model_file,$status,$elapsed,[string map {\"\\n\" \" \" \",\" \";\"} $error_msg]\"" + '\n' + 
+                  "    flush $status_file" + '\n' + 
+                  "}" + '\n\n' + 
+                  "close $status_file" + '\n'
+                 )
+    
+    outf.write(driver_str)
+    
+    outf.flush()
+
+
+def write_batch_drivers(tcl_fnames, chunk_size, output_folder = "test-bed/bin/tcl_files/", status_folder = "results/status/"):
+    # split the models into chunks of chunk_size buildings, one driver (one opensees process) per chunk: 
+    # larger chunks amortise the opensees / tcl startup better, smaller chunks lose less work if a process dies
+    
+    chunks = [tcl_fnames[i:i + chunk_size] for i in range(0, len(tcl_fnames), chunk_size)]
+    
+    return write_batch_driver_chunks(chunks, output_folder, status_folder)
+
+
+def write_batch_driver_chunks(chunks, output_folder = "test-bed/bin/tcl_files/", status_folder = "results/status/"):
+    # one driver per chunk (list of model file names), e.g. chunks balanced by cost_model.partition_lpt
+    
+    driver_fnames = []
+    
+    for i, chunk in enumerate(chunks):
+        chunk_id = str(i + 1).zfill(4)
+        driver_fname = "batch_" + chunk_id + ".tcl"
+        
+        outf = open(output_folder + driver_fname, 'w')
+        write_batch_driver(outf, chunk, status_folder + "batch_" + chunk_id + ".log")
+        outf.close()
+        
+        driver_fnames.append(driver_fname)
+    
+    return driver_fnames